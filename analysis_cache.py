@@ -0,0 +1,152 @@
+"""
+Cache disque des étapes d'analyse d'un fichier SRT.
+
+Chaque étape (sous-titres lus, candidats regroupés, sentiment, changements de sujet)
+est enregistrée séparément, sous une clé formée de l'empreinte du fichier SRT et des
+seuls paramètres qui influencent cette étape. Relancer l'analyse d'une transcription
+déjà vue avec un autre nombre de citations ou d'autres mots-clés ne refait donc que
+la sélection; changer l'écart maximal ne refait que le regroupement et le sentiment.
+
+Les entrées sont des fichiers pickle, gérés par disk_lru: la taille totale est bornée et
+les entrées les moins récemment utilisées sont supprimées en premier.
+"""
+import hashlib
+import os
+import pickle
+
+import srt
+
+from disk_lru import DiskLRU
+
+from extract_srt_quotes import (
+    TOPIC_ENGINES,
+    build_candidates,
+    evaluate_candidates,
+    get_sentiment_engine
+)
+
+# Étapes mises en cache
+STAGES = ('subtitles', 'candidates', 'sentiment', 'topics')
+
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+def content_hash(data):
+    """Empreinte SHA-256 du contenu d'un fichier (bytes)"""
+    return hashlib.sha256(data).hexdigest()
+
+class AnalysisCache(DiskLRU):
+    """
+    Stockage disque borné des étapes d'analyse (voir disk_lru.DiskLRU), avec le
+    nombre de succès et d'échecs par étape.
+    """
+    
+    def __init__(self, directory, max_bytes=DEFAULT_MAX_BYTES):
+        self.hits = dict.fromkeys(STAGES, 0)
+        self.misses = dict.fromkeys(STAGES, 0)
+        super().__init__(directory, max_bytes, '.pkl')
+    
+    @staticmethod
+    def make_key(stage, source_hash, *params):
+        """Nom de fichier d'une étape pour un fichier SRT et des paramètres donnés"""
+        digest = hashlib.blake2b(repr((source_hash, params)).encode('utf-8'), digest_size=16).hexdigest()
+        return f"{stage}-{digest}.pkl"
+    
+    def get(self, stage, key):
+        """Valeur en cache, ou None (compté comme un échec)"""
+        if self._known(key):
+            try:
+                with open(os.path.join(self.directory, key), 'rb') as f:
+                    value = pickle.load(f)
+            except (OSError, pickle.UnpicklingError, EOFError):
+                value = None
+            if value is not None:
+                self._touch(key)
+                with self._lock:
+                    self.hits[stage] += 1
+                return value
+            self._forget(key)
+        with self._lock:
+            self.misses[stage] += 1
+        return None
+    
+    def put(self, stage, key, value):
+        """Enregistre une valeur puis supprime les entrées les plus anciennes si besoin"""
+        temp_path = self._temp_path(key)
+        with open(temp_path, 'wb') as f:
+            pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+        self._commit(key, temp_path)
+    
+    def record(self, report):
+        """
+        Prend en compte une analyse faite par un autre processus qui partage le dossier:
+        succès et échecs de son rapport, puis nouvelle lecture du dossier.
+        """
+        with self._lock:
+            for stage, result in report.items():
+                if stage in self.hits:
+                    (self.hits if result == 'hit' else self.misses)[stage] += 1
+        self.reload()
+    
+    def stats(self):
+        """Succès et échecs par étape, nombre et taille des entrées"""
+        with self._lock:
+            return {'hits': dict(self.hits), 'misses': dict(self.misses), **self._usage()}
+
+def cached_extract_quotes(cache, srt_data, min_length=120, keywords=None, use_sentiment=False,
+                          topic_detection=False, group_subtitles=True, max_gap_seconds=3.0,
+                          topic_engine='jaccard', sentiment_engine=None, on_stage=None):
+    """
+    Équivalent de extract_quotes pour le contenu brut d'un fichier SRT, en réutilisant
+    les étapes déjà calculées pour ce contenu.
+    
+    Args:
+        cache: AnalysisCache
+        srt_data: Contenu du fichier SRT (bytes)
+        on_stage: Appelée avec (étape, 'start') au début de chaque étape utilisée, puis avec
+            (étape, 'hit' ou 'miss') quand elle est terminée
+    
+    Returns:
+        Tuple (citations, rapport) où le rapport indique pour chaque étape utilisée si
+        elle a été trouvée en cache ('hit') ou recalculée ('miss')
+    """
+    source_hash = content_hash(srt_data)
+    report = {}
+    
+    def stage(name, key, compute):
+        if on_stage:
+            on_stage(name, 'start')
+        value = cache.get(name, key)
+        report[name] = 'miss' if value is None else 'hit'
+        if value is None:
+            value = compute()
+            cache.put(name, key, value)
+        if on_stage:
+            on_stage(name, report[name])
+        return value
+    
+    # Les sous-titres ne sont lus que si une étape doit être recalculée
+    subtitles = []
+    
+    def load_subtitles():
+        if not subtitles:
+            subtitles.extend(stage('subtitles', cache.make_key('subtitles', source_hash),
+                                   lambda: list(srt.parse(srt_data.decode('utf-8')))))
+        return subtitles
+    
+    candidate_params = (group_subtitles, max_gap_seconds if group_subtitles else None)
+    candidates = stage('candidates', cache.make_key('candidates', source_hash, *candidate_params),
+                       lambda: build_candidates(load_subtitles(), group_subtitles, max_gap_seconds))
+    
+    sentiments = None
+    if use_sentiment:
+        engine = sentiment_engine or get_sentiment_engine()
+        sentiments = stage('sentiment', cache.make_key('sentiment', source_hash, engine.backend, *candidate_params),
+                           lambda: engine.analyze_batch([candidate[0] for candidate in candidates]))
+    
+    topic_changes = []
+    if topic_detection:
+        topic_changes = stage('topics', cache.make_key('topics', source_hash, topic_engine),
+                              lambda: TOPIC_ENGINES[topic_engine](load_subtitles()))
+    
+    quotes = evaluate_candidates(candidates, min_length, keywords, sentiments, topic_changes)
+    return quotes, report
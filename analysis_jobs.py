@@ -0,0 +1,256 @@
+"""
+Analyse des transcriptions envoyées, hors du processus web.
+
+L'analyse d'un fichier SRT (lecture, regroupement, sentiment, sujets, score, exports)
+occupe le processeur: elle est exécutée dans un pool de processus, pour ne pas bloquer
+les threads de Flask ni se disputer le GIL avec eux. La requête d'envoi rend la main
+tout de suite; une tâche de la file (jobs.JobQueue) attend le résultat du pool et publie
+l'avancement de chaque étape, que la page d'état reçoit en Server-Sent Events.
+
+Chaque processus du pool charge une fois son moteur de sentiment et partage le cache
+d'analyse sur disque (AnalysisCache) avec les autres processus. Avec une base de projets
+(project_store), le processus y enregistre lui-même les citations et les sous-titres.
+"""
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+
+import srt
+
+from analysis_cache import AnalysisCache, cached_extract_quotes
+from extract_srt_quotes import (
+    export_json_data,
+    export_quotes_to_file,
+    generate_ffmpeg_cut_file,
+    get_sentiment_engine,
+    iter_subtitles_from_srt
+)
+from jobs import POLL_INTERVAL, JobCancelled
+from project_store import ProjectStore
+from scoring import select_top_quotes
+
+# Étapes d'une analyse, dans l'ordre
+ANALYSIS_STAGES = ('parse', 'group', 'sentiment', 'topics', 'score', 'export')
+
+STAGE_LABELS = {
+    'parse': "Lecture des sous-titres",
+    'group': "Regroupement en passages",
+    'sentiment': "Analyse de sentiment",
+    'topics': "Changements de sujet",
+    'score': "Score et sélection",
+    'export': "Enregistrement des résultats"
+}
+
+# États d'une étape
+PENDING = 'pending'
+STARTED = 'start'
+DONE = 'done'
+SKIPPED = 'skipped'
+FINISHED_STAGE_STATES = ('hit', 'miss', DONE, SKIPPED)
+
+# Étapes du cache d'analyse -> étapes affichées
+_CACHE_STAGES = {'subtitles': 'parse', 'candidates': 'group', 'sentiment': 'sentiment', 'topics': 'topics'}
+
+DEFAULT_OPTIONS = {
+    'min_length': 120,
+    'num_quotes': 10,
+    'keywords': None,
+    'use_sentiment': False,
+    'topic_detection': False,
+    'topic_engine': 'jaccard',
+    'group_subtitles': True,
+    'max_gap': 3.0,
+    'generate_ffmpeg': False,
+    'padding': 1,
+    'add_subtitles': False,
+    'export_json': False
+}
+
+def analyze_transcript(srt_path, base_output, options, cache, sentiment_engine=None, report=None,
+                       store=None):
+    """
+    Analyse complète d'un fichier SRT, puis enregistrement des citations.
+    
+    Sans base de projets, les exports demandés sont écrits comme par la ligne de commande.
+    Avec une base (store), les citations, les sous-titres et les paramètres y sont
+    enregistrés sous le nom du projet (nom de base de base_output); les exports sont
+    générés à partir de la base quand on les demande.
+    
+    Args:
+        srt_path: Fichier SRT envoyé
+        base_output: Chemin des exports sans suffixe (<base>_quotes.txt, ...)
+        options: Paramètres du formulaire (voir DEFAULT_OPTIONS)
+        cache: AnalysisCache
+        sentiment_engine: Moteur de sentiment (par défaut: celui du processus)
+        report: Appelée avec (étape, état) à chaque changement d'état d'une étape
+        store: Base des projets (project_store.ProjectStore), ou None
+    
+    Returns:
+        Dictionnaire: nombre de citations, fichiers écrits, rapport du cache, état des étapes
+    """
+    options = {**DEFAULT_OPTIONS, **options}
+    stages = dict.fromkeys(ANALYSIS_STAGES, PENDING)
+    
+    def set_stage(stage, state):
+        stages[stage] = state
+        if report:
+            report(stage, state)
+    
+    with open(srt_path, 'rb') as f:
+        srt_data = f.read()
+    quotes, cache_report = cached_extract_quotes(
+        cache, srt_data, min_length=options['min_length'], keywords=options['keywords'],
+        use_sentiment=options['use_sentiment'], topic_detection=options['topic_detection'],
+        group_subtitles=options['group_subtitles'], max_gap_seconds=options['max_gap'],
+        topic_engine=options['topic_engine'], sentiment_engine=sentiment_engine or get_sentiment_engine(),
+        on_stage=lambda stage, state: set_stage(_CACHE_STAGES[stage], state))
+    # Étapes désactivées, ou inutiles parce que les suivantes étaient en cache
+    for stage in ('parse', 'group', 'sentiment', 'topics'):
+        if stages[stage] == PENDING:
+            set_stage(stage, SKIPPED)
+    
+    # Garder les citations les plus importantes (même score que la ligne de commande),
+    # dans l'ordre chronologique
+    set_stage('score', STARTED)
+    quotes = select_top_quotes(quotes, options['num_quotes'])
+    set_stage('score', DONE)
+    
+    set_stage('export', STARTED)
+    if store is not None:
+        store.save_analysis(os.path.basename(base_output), quotes, iter_subtitles_from_srt(srt_path), options)
+        set_stage('export', DONE)
+        return {
+            'quotes': len(quotes),
+            'files': {},
+            'cache': cache_report,
+            'stages': stages
+        }
+    files = {'text': f"{base_output}_quotes.txt"}
+    export_quotes_to_file(quotes, files['text'])
+    if options['generate_ffmpeg']:
+        files['ffmpeg'] = generate_ffmpeg_cut_file(quotes, f"{base_output}_ffmpeg.txt", options['padding'],
+                                                   options['add_subtitles'],
+                                                   subtitles=srt.parse(srt_data.decode('utf-8')))
+    if options['export_json']:
+        files['json'] = f"{base_output}_quotes.json"
+        export_json_data(quotes, files['json'])
+    set_stage('export', DONE)
+    
+    return {
+        'quotes': len(quotes),
+        'files': files,
+        'cache': cache_report,
+        'stages': stages
+    }
+
+# État d'un processus du pool
+_worker = {}
+
+def _init_worker(events, cache_dir, cache_max_bytes, store_path):
+    _worker['events'] = events
+    _worker['cache'] = AnalysisCache(cache_dir, cache_max_bytes)
+    _worker['store'] = ProjectStore(store_path) if store_path else None
+
+def _analyze_in_worker(job_id, srt_path, base_output, options):
+    events = _worker['events']
+    # Les autres processus ont pu ajouter ou évincer des entrées depuis la dernière analyse
+    _worker['cache'].reload()
+    return analyze_transcript(srt_path, base_output, options, _worker['cache'],
+                              report=lambda stage, state: events.put((job_id, stage, state)),
+                              store=_worker['store'])
+
+def stage_progress(stages):
+    """Part des étapes terminées (entre 0 et 1)"""
+    return sum(state in FINISHED_STAGE_STATES for state in stages.values()) / len(ANALYSIS_STAGES)
+
+class AnalysisPool:
+    """
+    Pool de processus d'analyse.
+    
+    Les processus sont créés au premier envoi (méthode 'spawn': pas de fork d'un
+    processus Flask qui a déjà des threads). Leurs messages d'avancement passent par une
+    file multiprocessing, lue par un thread qui met à jour les tâches concernées.
+    
+    Args:
+        processes: Nombre de processus d'analyse
+        cache_dir: Dossier du cache d'analyse partagé
+        cache_max_bytes: Taille maximale du cache d'analyse
+        store_path: Base des projets où les processus enregistrent les résultats, ou None
+            (exports écrits dans des fichiers)
+    """
+    
+    def __init__(self, processes, cache_dir, cache_max_bytes, store_path=None):
+        self.processes = max(1, processes)
+        self.cache_dir = cache_dir
+        self.cache_max_bytes = cache_max_bytes
+        self.store_path = store_path
+        self._executor = None
+        self._events = None
+        self._jobs = {}
+        self._lock = threading.Lock()
+    
+    def _start(self):
+        with self._lock:
+            if self._executor is None:
+                context = multiprocessing.get_context('spawn')
+                self._events = context.Queue()
+                self._executor = ProcessPoolExecutor(max_workers=self.processes, mp_context=context,
+                                                     initializer=_init_worker,
+                                                     initargs=(self._events, self.cache_dir, self.cache_max_bytes,
+                                                               self.store_path))
+                threading.Thread(target=self._dispatch_events, name='analysis-events', daemon=True).start()
+            return self._executor
+    
+    def _dispatch_events(self):
+        while True:
+            job_id, stage, state = self._events.get()
+            # Sous le verrou: run() retire la tâche avant de publier l'état final, qu'aucun
+            # message tardif ne peut donc écraser
+            with self._lock:
+                job = self._jobs.get(job_id)
+                if job is not None:
+                    self._publish(job, {**job.details.get('stages', {}), stage: state}, stage)
+    
+    @staticmethod
+    def _publish(job, stages, stage):
+        label = STAGE_LABELS[stage]
+        message = f"{label}..." if stages[stage] == STARTED else f"{label}: terminé"
+        job.update(message, stage_progress(stages), stages=stages, stage=stage)
+    
+    def run(self, job, srt_path, base_output, options):
+        """
+        Analyse le fichier dans un processus du pool et attend le résultat (appelée depuis
+        une tâche de la file).
+        
+        Raises:
+            JobCancelled: annulation demandée avant la fin (l'analyse en cours se termine
+                dans son processus, mais son résultat est ignoré)
+        """
+        executor = self._start()
+        job.update("En attente d'un processus d'analyse", 0.0,
+                   stages=dict.fromkeys(ANALYSIS_STAGES, PENDING), stage=None)
+        with self._lock:
+            self._jobs[job.id] = job
+        try:
+            future = executor.submit(_analyze_in_worker, job.id, srt_path, base_output, options)
+            while True:
+                try:
+                    result = future.result(timeout=POLL_INTERVAL)
+                    break
+                except FutureTimeoutError:
+                    if job.cancel_requested:
+                        future.cancel()
+                        raise JobCancelled()
+        finally:
+            with self._lock:
+                self._jobs.pop(job.id, None)
+        # Les derniers messages de la file peuvent arriver après le résultat
+        job.update("Analyse terminée", 1.0, stages=result['stages'], stage=None)
+        return result
+    
+    def shutdown(self, wait=True):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait, cancel_futures=True)
@@ -1,14 +1,24 @@
 import os
-from flask import Flask, render_template, request, redirect, url_for, flash, send_from_directory, jsonify
+from flask import Flask, render_template, request, redirect, url_for, flash, send_file, send_from_directory, jsonify, Response
 from werkzeug.utils import secure_filename
-import tempfile
 import json
 import srt
 from datetime import timedelta
-import subprocess
-import shutil
 import base64
-from extract_srt_quotes import extract_text_from_srt, extract_quotes, export_quotes_to_file, generate_ffmpeg_cut_file, export_json_data
+import hashlib
+import time
+from extract_srt_quotes import export_quotes_to_file, generate_ffmpeg_cut_file, export_json_data, load_json_data, iter_subtitles_from_srt, quote_from_json, quote_to_json, Quote, TOPIC_ENGINES
+from analysis_cache import AnalysisCache
+from analysis_jobs import ANALYSIS_STAGES, STAGE_LABELS, AnalysisPool
+from jobs import FAILED, FINISHED_STATES, SUCCEEDED, JobQueue, default_ffmpeg_limit
+from render import drawtext_filter, drawtext_text, ffmpeg_capabilities, plan_clips, render_clips, render_summary
+from ffmpeg_caps import subtitle_method, video_encoder
+from media_index import index_video, load_media_index
+from clip_cache import ClipCache
+from chunked_upload import ChunkedUploads
+from clip_subtitles import compose_ass
+from ffmpeg_progress import RenderProgress, SpeedHistory
+from project_store import ProjectStore, QuoteNotFound, VersionConflict
 import re
 
 app = Flask(__name__)
@@ -17,12 +27,59 @@
 app.config['OUTPUT_FOLDER'] = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'outputs')
 app.config['MAX_CONTENT_LENGTH'] = 2000 * 1024 * 1024  # 2 GB max upload (augmenté de 100 MB)
 app.config['VIDEO_FOLDER'] = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'videos')
+app.config['CACHE_FOLDER'] = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache')
+app.config['CACHE_MAX_BYTES'] = int(os.environ.get('CACHE_MAX_MB', 512)) * 1024 * 1024
+app.config['RENDER_WORKERS'] = int(os.environ.get('RENDER_WORKERS', os.cpu_count() or 1))
+app.config['MAX_FFMPEG_PROCESSES'] = int(os.environ.get('MAX_FFMPEG_PROCESSES', default_ffmpeg_limit()))
+app.config['RENDER_ENGINE'] = os.environ.get('RENDER_ENGINE', 'parallel')
+app.config['ANALYSIS_PROCESSES'] = int(os.environ.get('ANALYSIS_PROCESSES', max(1, (os.cpu_count() or 1) // 2)))
+app.config['CLIP_CACHE_MAX_BYTES'] = int(os.environ.get('CLIP_CACHE_MAX_MB', 4096)) * 1024 * 1024
+app.config['PROJECT_DATABASE'] = os.environ.get('PROJECT_DATABASE', os.path.join(app.config['OUTPUT_FOLDER'], 'projets.sqlite3'))
 
 # Créer les dossiers s'ils n'existent pas
 os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
 os.makedirs(app.config['OUTPUT_FOLDER'], exist_ok=True)
 os.makedirs(app.config['VIDEO_FOLDER'], exist_ok=True)
 
+# Projets (sous-titres, citations, options, historique des tâches) dans une base SQLite;
+# les exports texte, JSON, SRT et FFmpeg sont générés à partir de la base
+project_store = ProjectStore(app.config['PROJECT_DATABASE'])
+
+# Étapes d'analyse déjà calculées (sous-titres, passages, sentiment, sujets), par contenu
+# de fichier SRT et paramètres: ré-analyser une transcription ne refait que ce qui change
+analysis_cache = AnalysisCache(app.config['CACHE_FOLDER'], app.config['CACHE_MAX_BYTES'])
+
+# Extraits déjà rendus, par vidéo source, bornes et sous-titres: un nouveau rendu du
+# projet ne réencode que les extraits modifiés
+clip_cache = ClipCache(os.path.join(app.config['CACHE_FOLDER'], 'clips'), app.config['CLIP_CACHE_MAX_BYTES'])
+
+# Envois de vidéos par morceaux (reprise après coupure), dédupliqués par empreinte
+video_uploads = ChunkedUploads(os.path.join(app.config['VIDEO_FOLDER'], '.envois'),
+                               os.path.join(app.config['VIDEO_FOLDER'], '.empreintes'))
+
+# Analyses des transcriptions envoyées, dans des processus séparés; chacun charge son
+# moteur de sentiment une fois et partage le cache d'analyse sur disque
+analysis_pool = AnalysisPool(app.config['ANALYSIS_PROCESSES'], app.config['CACHE_FOLDER'],
+                             app.config['CACHE_MAX_BYTES'], app.config['PROJECT_DATABASE'])
+
+# Rendus vidéo exécutés en arrière-plan; le nombre de processus ffmpeg simultanés est
+# limité pour l'ensemble des projets
+render_jobs = JobQueue(workers=app.config['RENDER_WORKERS'], max_ffmpeg=app.config['MAX_FFMPEG_PROCESSES'],
+                       on_state_change=project_store.record_job)
+
+# Analyses: file séparée, un thread par processus du pool d'analyse (le thread ne fait
+# qu'attendre le résultat), pour que les analyses n'occupent pas les threads de rendu
+analysis_queue = JobQueue(workers=app.config['ANALYSIS_PROCESSES'], max_ffmpeg=1,
+                          on_state_change=project_store.record_job)
+
+# Vitesse de chaque encodage d'extrait, pour repérer les machines lentes et les
+# réglages mal choisis
+speed_history = SpeedHistory(os.path.join(app.config['CACHE_FOLDER'], 'ffmpeg', 'vitesses.jsonl'))
+
+# Server-Sent Events: intervalle de lecture de l'état des tâches, et de maintien de la connexion
+SSE_POLL_SECONDS = 0.25
+SSE_KEEPALIVE_SECONDS = 15
+
 ALLOWED_EXTENSIONS = {'srt'}
 ALLOWED_VIDEO_EXTENSIONS = {'mp4', 'webm', 'mov', 'avi', 'mkv'}
 
@@ -59,6 +116,9 @@ def upload_file():
         keywords = request.form.get('keywords', '').split(',') if request.form.get('keywords') else None
         use_sentiment = 'sentiment' in request.form
         topic_detection = 'topic_detection' in request.form
+        topic_engine = request.form.get('topic_engine', 'jaccard')
+        if topic_engine not in TOPIC_ENGINES:
+            topic_engine = 'jaccard'
         generate_ffmpeg = 'ffmpeg' in request.form
         padding = int(request.form.get('padding', 1))
         export_json = 'json' in request.form
@@ -70,68 +130,122 @@ def upload_file():
         # Nouveau paramètre pour l'incrustation des sous-titres
         add_subtitles = 'add_subtitles' in request.form
         
-        # Traiter le fichier SRT
-        try:
-            _, subtitles = extract_text_from_srt(filepath)
-            quotes = extract_quotes(subtitles, min_length=min_length, keywords=keywords, 
-                                   use_sentiment=use_sentiment, topic_detection=topic_detection,
-                                   group_subtitles=group_subtitles, max_gap_seconds=max_gap)
-            
-            # Trier les citations par importance et limiter au nombre demandé
-            quotes = sorted(quotes, key=lambda q: (
-                q.get('is_intense', False) * 3 +
-                q.get('has_keyword', False) * 2 +
-                q.get('is_topic_change', False) * 2 +
-                q.get('is_long', False)
-            ), reverse=True)[:num_quotes]
-            
-            # Trier par ordre chronologique
-            quotes = sorted(quotes, key=lambda q: q['start_time'])
-            
-            # Générer les fichiers de sortie
-            base_output = os.path.join(app.config['OUTPUT_FOLDER'], os.path.splitext(filename)[0])
-            
-            # Fichier texte principal
-            text_output = f"{base_output}_quotes.txt"
-            export_quotes_to_file(quotes, text_output)
-            
-            # Fichier FFmpeg si demandé
-            ffmpeg_script = None
-            if generate_ffmpeg:
-                ffmpeg_output = f"{base_output}_ffmpeg.txt"
-                ffmpeg_script = generate_ffmpeg_cut_file(quotes, ffmpeg_output, padding, add_subtitles)
-            
-            # Fichier JSON si demandé
-            json_output = None
-            if export_json:
-                json_output = f"{base_output}_quotes.json"
-                export_json_data(quotes, json_output)
-            
-            # Rediriger vers la page de résultats
-            return redirect(url_for('results', filename=os.path.splitext(filename)[0]))
-            
-        except Exception as e:
-            flash(f"Erreur lors du traitement du fichier: {str(e)}")
-            return redirect(url_for('index'))
+        # Analyse dans un processus du pool: la page d'état suit son avancement
+        base_name = os.path.splitext(filename)[0]
+        options = {
+            'min_length': min_length,
+            'num_quotes': num_quotes,
+            'keywords': keywords,
+            'use_sentiment': use_sentiment,
+            'topic_detection': topic_detection,
+            'topic_engine': topic_engine,
+            'group_subtitles': group_subtitles,
+            'max_gap': max_gap,
+            'generate_ffmpeg': generate_ffmpeg,
+            'padding': padding,
+            'add_subtitles': add_subtitles,
+            'export_json': export_json
+        }
+        job = analysis_queue.submit('analysis', base_name, analyze_upload, filepath,
+                                    os.path.join(app.config['OUTPUT_FOLDER'], base_name), options)
+        return redirect(url_for('analysis_status', job_id=job.id))
     
     flash('Type de fichier non autorisé. Veuillez télécharger un fichier SRT.')
     return redirect(url_for('index'))
 
+def analyze_upload(job, srt_path, base_output, options):
+    """Tâche de fond: analyse d'un fichier SRT envoyé, dans le pool de processus"""
+    result = analysis_pool.run(job, srt_path, base_output, options)
+    analysis_cache.record(result['cache'])
+    print("Cache d'analyse: " + ", ".join(f"{stage} {state}" for stage, state in result['cache'].items()))
+    return result
+
+def running_analysis(filename):
+    """Analyse en cours du projet, ou None"""
+    return next((job for job in analysis_queue.list(filename) if job.status not in FINISHED_STATES), None)
+
+def job_queue(job_id):
+    """File (analyses ou rendus) qui contient la tâche job_id, ou None"""
+    return next((queue for queue in (analysis_queue, render_jobs) if queue.get(job_id) is not None), None)
+
+def find_job(job_id):
+    """Tâche job_id, quelle que soit sa file, ou None"""
+    queue = job_queue(job_id)
+    return queue.get(job_id) if queue is not None else None
+
+@app.route('/analysis/<job_id>')
+def analysis_status(job_id):
+    """Page d'état d'une analyse: étapes mises à jour en direct, puis redirection vers les résultats"""
+    job = analysis_queue.get(job_id)
+    if job is None:
+        flash("Analyse inconnue ou expirée.")
+        return redirect(url_for('index'))
+    if job.status == SUCCEEDED:
+        return redirect(url_for('results', filename=job.label))
+    return render_template('analysis_status.html', job=job.to_dict(), stages=ANALYSIS_STAGES,
+                           stage_labels=STAGE_LABELS)
+
+def server_sent_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+def job_event_stream(job, done_data):
+    """
+    Réponse Server-Sent Events qui suit une tâche: 'progress' à chaque changement d'état,
+    puis 'done' (done_data) ou 'error'.
+    """
+    def stream():
+        last = None
+        last_sent = time.monotonic()
+        while True:
+            state = {key: value for key, value in job.to_dict().items()
+                     if key in ('status', 'message', 'progress', 'details')}
+            if state != last:
+                yield server_sent_event('progress', state)
+                last = state
+                last_sent = time.monotonic()
+            elif time.monotonic() - last_sent > SSE_KEEPALIVE_SECONDS:
+                # Commentaire: garde la connexion ouverte derrière les proxys
+                yield ": ping\n\n"
+                last_sent = time.monotonic()
+            if job.status == SUCCEEDED:
+                yield server_sent_event('done', done_data(job))
+                return
+            if job.status in FINISHED_STATES:
+                yield server_sent_event('error', {'status': job.status, 'message': job.error or job.message})
+                return
+            time.sleep(SSE_POLL_SECONDS)
+    
+    return Response(stream(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/analysis/<job_id>/events')
+def analysis_events(job_id):
+    """Avancement d'une analyse en Server-Sent Events (progress, puis done ou error)"""
+    job = analysis_queue.get(job_id)
+    if job is None:
+        return jsonify({'success': False, 'message': 'Analyse inconnue'}), 404
+    results_url = url_for('results', filename=job.label)
+    return job_event_stream(job, lambda job: {'url': results_url})
+
 @app.route('/results/<filename>')
 def results(filename):
-    base_path = os.path.join(app.config['OUTPUT_FOLDER'], filename)
+    # Analyse pas encore terminée: page d'état
+    job = running_analysis(filename)
+    if job is not None:
+        return redirect(url_for('analysis_status', job_id=job.id))
     
-    # Vérifier quels fichiers ont été générés
-    text_file = f"{base_path}_quotes.txt"
-    ffmpeg_file = f"{base_path}_ffmpeg.txt"
-    ffmpeg_script = f"{base_path}_ffmpeg.sh"
-    json_file = f"{base_path}_quotes.json"
+    project = load_project(filename)
+    if project is None:
+        flash("Projet introuvable. Veuillez d'abord télécharger un fichier SRT.")
+        return redirect(url_for('index'))
     
+    # Exports disponibles: générés à partir de la base quand on les télécharge
+    generate_ffmpeg = bool(project['options'].get('generate_ffmpeg'))
     files = {
-        'text': os.path.exists(text_file),
-        'ffmpeg': os.path.exists(ffmpeg_file),
-        'ffmpeg_script': os.path.exists(ffmpeg_script),
-        'json': os.path.exists(json_file)
+        'text': True,
+        'ffmpeg': generate_ffmpeg,
+        'ffmpeg_script': generate_ffmpeg,
+        'json': True
     }
     
     # Vérifier si des extraits vidéo ont été générés
@@ -149,130 +263,154 @@ def results(filename):
         # Trier les clips par nom pour les afficher dans l'ordre
         clips.sort(key=lambda x: x['name'])
     
-    # Lire le contenu du fichier texte pour l'afficher
-    quotes_content = None
-    if files['text']:
-        with open(text_file, 'r', encoding='utf-8') as f:
-            quotes_content = f.read()
-    
-    # Charger les données JSON si disponibles pour l'édition
-    quotes_data = None
-    if files['json']:
-        with open(json_file, 'r', encoding='utf-8') as f:
-            quotes_data = json.load(f)
+    # Contenu du fichier texte pour l'afficher, et citations pour l'édition
+    quotes = project_store.quotes(filename)
+    with open(project_export(filename, 'text')[0], 'r', encoding='utf-8') as f:
+        quotes_content = f.read()
+    quotes_data = [quote_to_json(quote) for quote in quotes]
     
     return render_template('results.html', filename=filename, files=files, 
                           quotes_content=quotes_content, quotes_data=quotes_data,
                           clips=clips)
 
-@app.route('/download/<filetype>/<filename>')
-def download(filetype, filename):
+# Exports d'un projet: suffixe du fichier généré dans le dossier de sortie
+PROJECT_EXPORTS = {
+    'text': '_quotes.txt',
+    'json': '_quotes.json',
+    'srt': '_edited.srt',
+    'ffmpeg': '_ffmpeg.txt',
+    'ffmpeg_script': '_ffmpeg.sh'
+}
+
+def load_project(filename):
+    """Projet de la base, ou None; un projet des versions précédentes (fichiers JSON) y est importé"""
+    project = project_store.get_project(filename)
+    if project is not None:
+        return project
+    json_file = os.path.join(app.config['OUTPUT_FOLDER'], f"{filename}_quotes.json")
+    if not os.path.exists(json_file):
+        return None
+    srt_path = os.path.join(app.config['UPLOAD_FOLDER'], f"{filename}.srt")
     base_path = os.path.join(app.config['OUTPUT_FOLDER'], filename)
+    project_store.save_analysis(filename, load_json_data(json_file),
+                                iter_subtitles_from_srt(srt_path) if os.path.exists(srt_path) else None,
+                                {'generate_ffmpeg': os.path.exists(f"{base_path}_ffmpeg.txt")})
+    subtitle_options_file = f"{base_path}_subtitle_options.json"
+    if os.path.exists(subtitle_options_file):
+        with open(subtitle_options_file, 'r', encoding='utf-8') as f:
+            project_store.set_subtitle_options(filename, json.load(f))
+    print(f"Projet {filename} importé dans la base depuis {json_file}")
+    return project_store.get_project(filename)
+
+def file_sha256(path):
+    """Empreinte SHA-256 du contenu d'un fichier"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def project_export(filename, filetype):
+    """
+    Export du projet, généré à partir de la base (citations, sous-titres, options) au
+    premier téléchargement, puis seulement s'il a été généré avant la dernière
+    modification du projet. Un export jamais demandé n'est jamais généré.
+    
+    Returns:
+        (chemin du fichier dans le dossier de sortie, export enregistré dans la base:
+        version, empreinte sha256 du contenu, date de son dernier changement)
+    """
+    project = project_store.get_project(filename)
+    path = os.path.join(app.config['OUTPUT_FOLDER'], filename + PROJECT_EXPORTS[filetype])
+    artifact = project_store.artifact(filename, filetype)
+    if (artifact is not None and artifact['version'] == project['version'] and artifact['sha256']
+            and os.path.exists(path)):
+        return path, artifact
     
+    quotes = project_store.quotes(filename)
     if filetype == 'text':
-        return send_from_directory(app.config['OUTPUT_FOLDER'], f"{filename}_quotes.txt", as_attachment=True)
-    elif filetype == 'ffmpeg':
-        return send_from_directory(app.config['OUTPUT_FOLDER'], f"{filename}_ffmpeg.txt", as_attachment=True)
-    elif filetype == 'ffmpeg_script':
-        return send_from_directory(app.config['OUTPUT_FOLDER'], f"{filename}_ffmpeg.sh", as_attachment=True)
+        export_quotes_to_file(quotes, path)
+        written = ['text']
     elif filetype == 'json':
-        return send_from_directory(app.config['OUTPUT_FOLDER'], f"{filename}_quotes.json", as_attachment=True)
+        export_json_data(quotes, path)
+        written = ['json']
     elif filetype == 'srt':
-        return send_from_directory(app.config['OUTPUT_FOLDER'], f"{filename}_edited.srt", as_attachment=True)
-    
-    return redirect(url_for('index'))
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(srt.compose([srt.Subtitle(index=i, start=quote['start_time'], end=quote['end_time'],
+                                              content=quote['content']) for i, quote in enumerate(quotes, 1)]))
+        written = ['srt']
+    else:
+        # Fichier de découpage et script bash, générés ensemble; avec un style de
+        # sous-titres enregistré dans l'éditeur vidéo, le script est celui qui applique ce style
+        options = project['options']
+        padding = options.get('padding', 1)
+        cut_file = os.path.join(app.config['OUTPUT_FOLDER'], filename + PROJECT_EXPORTS['ffmpeg'])
+        generate_ffmpeg_cut_file(quotes, cut_file, padding, options.get('add_subtitles', True),
+                                 subtitles=project_store.iter_subtitles(filename)
+                                 if project_store.has_subtitles(filename) else None)
+        if project['subtitle_options']:
+            generate_enhanced_ffmpeg_script(quotes, os.path.join(app.config['OUTPUT_FOLDER'],
+                                                                 filename + PROJECT_EXPORTS['ffmpeg_script']),
+                                            project['subtitle_options'], padding,
+                                            capabilities=get_ffmpeg_capabilities())
+        written = ['ffmpeg', 'ffmpeg_script']
+    # Version lue avant les citations: une modification faite entre-temps rendra
+    # l'export dépassé
+    for kind in written:
+        marked = project_store.mark_artifact(filename, kind, project['version'],
+                                             file_sha256(os.path.join(app.config['OUTPUT_FOLDER'],
+                                                                      filename + PROJECT_EXPORTS[kind])))
+        if kind == filetype:
+            artifact = marked
+    return path, artifact
+
+@app.route('/cache/stats')
+def cache_stats():
+    """Succès et échecs du cache d'analyse par étape, et du cache des extraits rendus"""
+    return jsonify({**analysis_cache.stats(), 'clips': clip_cache.stats()})
+
+@app.route('/download/<filetype>/<filename>')
+def download(filetype, filename):
+    if filetype not in PROJECT_EXPORTS or load_project(filename) is None:
+        return redirect(url_for('index'))
+    # Empreinte du contenu comme ETag: un export inchangé depuis le dernier téléchargement
+    # (même régénéré après une modification qui ne le concerne pas) est renvoyé en 304
+    path, artifact = project_export(filename, filetype)
+    return send_file(path, as_attachment=True, etag=artifact['sha256'], last_modified=artifact['modified_at'],
+                     conditional=True)
 
 @app.route('/edit/<filename>', methods=['GET'])
 def edit_quotes(filename):
-    json_file = os.path.join(app.config['OUTPUT_FOLDER'], f"{filename}_quotes.json")
-    
-    if not os.path.exists(json_file):
+    if load_project(filename) is None:
         flash("Fichier de citations non trouvé.")
         return redirect(url_for('index'))
     
-    with open(json_file, 'r', encoding='utf-8') as f:
-        quotes_data = json.load(f)
+    # Avec leur identifiant et leur version: l'éditeur n'envoie que les citations modifiées
+    quotes_data = project_store.quote_entries(filename)
     
     return render_template('edit.html', filename=filename, quotes=quotes_data)
 
 @app.route('/save_edits/<filename>', methods=['POST'])
 def save_edits(filename):
     try:
-        # Récupérer les données éditées
-        edited_quotes = request.json
-        
-        # Sauvegarder les modifications dans le fichier JSON
-        json_file = os.path.join(app.config['OUTPUT_FOLDER'], f"{filename}_quotes.json")
-        with open(json_file, 'w', encoding='utf-8') as f:
-            json.dump(edited_quotes, f, ensure_ascii=False, indent=2)
-        
-        # Mettre à jour le fichier texte
-        text_file = os.path.join(app.config['OUTPUT_FOLDER'], f"{filename}_quotes.txt")
-        with open(text_file, 'w', encoding='utf-8') as f:
-            f.write("# MOMENTS FORTS DU PODCAST (ÉDITÉS)\n\n")
-            
-            for i, quote in enumerate(edited_quotes, 1):
-                f.write(f"## Moment fort {i}\n")
-                f.write(f"- **Timecode**: {quote['formatted_start']} - {quote['formatted_end']}\n")
-                f.write(f"- **Durée**: {int(quote['duration_seconds'])} secondes\n")
-                f.write(f"- **Contenu**: {quote['content']}\n\n")
-        
-        # Générer un fichier SRT édité
-        srt_file = os.path.join(app.config['OUTPUT_FOLDER'], f"{filename}_edited.srt")
-        subtitles = []
+        # Seules les citations modifiées sont réécrites dans la base; les exports (texte,
+        # SRT édité, script FFmpeg) en sont générés au téléchargement
+        edited_quotes = [quote_from_json(quote) for quote in request.json]
+        changes = project_store.update_quotes(filename, edited_quotes)
         
-        for i, quote in enumerate(edited_quotes, 1):
-            start_time = timedelta(seconds=quote['start_time_seconds'])
-            end_time = timedelta(seconds=quote['end_time_seconds'])
-            
-            subtitle = srt.Subtitle(
-                index=i,
-                start=start_time,
-                end=end_time,
-                content=quote['content']
-            )
-            subtitles.append(subtitle)
-        
-        with open(srt_file, 'w', encoding='utf-8') as f:
-            f.write(srt.compose(subtitles))
-        
-        # Mettre à jour le script FFmpeg si nécessaire
-        ffmpeg_file = os.path.join(app.config['OUTPUT_FOLDER'], f"{filename}_ffmpeg.txt")
-        if os.path.exists(ffmpeg_file):
-            # Convertir les données JSON en format compatible avec generate_ffmpeg_cut_file
-            quotes_for_ffmpeg = []
-            for quote in edited_quotes:
-                start_time = timedelta(seconds=quote['start_time_seconds'])
-                end_time = timedelta(seconds=quote['end_time_seconds'])
-                
-                quote_data = {
-                    'content': quote['content'],
-                    'start_time': start_time,
-                    'end_time': end_time,
-                    'duration': end_time - start_time,
-                    'formatted_start': quote['formatted_start'],
-                    'formatted_end': quote['formatted_end'],
-                }
-                quotes_for_ffmpeg.append(quote_data)
-            
-            # Générer un nouveau script FFmpeg
-            generate_ffmpeg_cut_file(quotes_for_ffmpeg, ffmpeg_file, 1, True)
-        
-        return jsonify({'success': True, 'message': 'Modifications enregistrées avec succès.'})
+        return jsonify({'success': True, 'message': 'Modifications enregistrées avec succès.', 'changes': changes})
     
     except Exception as e:
         return jsonify({'success': False, 'message': f'Erreur: {str(e)}'})
 
 @app.route('/edit_video/<filename>', methods=['GET'])
 def edit_video(filename):
-    json_file = os.path.join(app.config['OUTPUT_FOLDER'], f"{filename}_quotes.json")
-    
-    if not os.path.exists(json_file):
+    project = load_project(filename)
+    if project is None:
         flash("Fichier de citations non trouvé.")
         return redirect(url_for('index'))
     
-    with open(json_file, 'r', encoding='utf-8') as f:
-        quotes_data = json.load(f)
+    quotes_data = project_store.quote_entries(filename)
     
     # Nettoyer les données pour éviter les problèmes de JSON
     for quote in quotes_data:
@@ -284,9 +422,8 @@ def edit_video(filename):
     quotes_json = json.dumps(quotes_data)
     quotes_base64 = base64.b64encode(quotes_json.encode('utf-8')).decode('utf-8')
     
-    # Vérifier si des options de sous-titres sont déjà enregistrées
-    subtitle_options_file = os.path.join(app.config['OUTPUT_FOLDER'], f"{filename}_subtitle_options.json")
-    subtitle_options = {
+    # Options de sous-titres déjà enregistrées, sinon options par défaut
+    subtitle_options = project['subtitle_options'] or {
         "font": "Arial",
         "size": "24",
         "color": "0xffffff",
@@ -294,10 +431,6 @@ def edit_video(filename):
         "opacity": "0.5"
     }
     
-    if os.path.exists(subtitle_options_file):
-        with open(subtitle_options_file, 'r', encoding='utf-8') as f:
-            subtitle_options = json.load(f)
-    
     # Encoder les options en base64
     options_json = json.dumps(subtitle_options)
     options_base64 = base64.b64encode(options_json.encode('utf-8')).decode('utf-8')
@@ -311,74 +444,15 @@ def save_video_edits(filename):
     try:
         # Récupérer les données éditées
         data = request.json
-        edited_quotes = data.get('quotes', [])
+        edited_quotes = [quote_from_json(quote) for quote in data.get('quotes', [])]
         subtitle_options = data.get('subtitleOptions', {})
         
-        # Sauvegarder les modifications dans le fichier JSON
-        json_file = os.path.join(app.config['OUTPUT_FOLDER'], f"{filename}_quotes.json")
-        with open(json_file, 'w', encoding='utf-8') as f:
-            json.dump(edited_quotes, f, ensure_ascii=False, indent=2)
-        
-        # Sauvegarder les options de sous-titres
-        subtitle_options_file = os.path.join(app.config['OUTPUT_FOLDER'], f"{filename}_subtitle_options.json")
-        with open(subtitle_options_file, 'w', encoding='utf-8') as f:
-            json.dump(subtitle_options, f, ensure_ascii=False, indent=2)
+        # Citations modifiées et style des sous-titres enregistrés dans la base; le script
+        # FFmpeg qui applique ce style en est généré au téléchargement
+        changes = project_store.update_quotes(filename, edited_quotes)
+        project_store.set_subtitle_options(filename, subtitle_options)
         
-        # Mettre à jour le fichier texte
-        text_file = os.path.join(app.config['OUTPUT_FOLDER'], f"{filename}_quotes.txt")
-        with open(text_file, 'w', encoding='utf-8') as f:
-            f.write("# MOMENTS FORTS DU PODCAST (ÉDITÉS)\n\n")
-            
-            for i, quote in enumerate(edited_quotes, 1):
-                f.write(f"## Moment fort {i}\n")
-                f.write(f"- **Timecode**: {quote['formatted_start']} - {quote['formatted_end']}\n")
-                f.write(f"- **Durée**: {int(quote['duration_seconds'])} secondes\n")
-                f.write(f"- **Contenu**: {quote['content']}\n\n")
-        
-        # Générer un fichier SRT édité
-        srt_file = os.path.join(app.config['OUTPUT_FOLDER'], f"{filename}_edited.srt")
-        subtitles = []
-        
-        for i, quote in enumerate(edited_quotes, 1):
-            start_time = timedelta(seconds=quote['start_time_seconds'])
-            end_time = timedelta(seconds=quote['end_time_seconds'])
-            
-            subtitle = srt.Subtitle(
-                index=i,
-                start=start_time,
-                end=end_time,
-                content=quote['content']
-            )
-            subtitles.append(subtitle)
-        
-        with open(srt_file, 'w', encoding='utf-8') as f:
-            f.write(srt.compose(subtitles))
-        
-        # Mettre à jour le script FFmpeg avec les nouvelles options de sous-titres
-        ffmpeg_file = os.path.join(app.config['OUTPUT_FOLDER'], f"{filename}_ffmpeg.txt")
-        ffmpeg_script = os.path.join(app.config['OUTPUT_FOLDER'], f"{filename}_ffmpeg.sh")
-        
-        if os.path.exists(ffmpeg_file):
-            # Convertir les données JSON en format compatible avec generate_ffmpeg_cut_file
-            quotes_for_ffmpeg = []
-            for quote in edited_quotes:
-                start_time = timedelta(seconds=quote['start_time_seconds'])
-                end_time = timedelta(seconds=quote['end_time_seconds'])
-                
-                quote_data = {
-                    'content': quote['content'],
-                    'start_time': start_time,
-                    'end_time': end_time,
-                    'duration': end_time - start_time,
-                    'formatted_start': quote['formatted_start'],
-                    'formatted_end': quote['formatted_end'],
-                }
-                quotes_for_ffmpeg.append(quote_data)
-            
-            # Générer un nouveau script FFmpeg avec les options de sous-titres
-            generate_enhanced_ffmpeg_script(quotes_for_ffmpeg, ffmpeg_script, subtitle_options, 1)
-        
-        return jsonify({'success': True, 'message': 'Modifications enregistrées avec succès.'})
+        return jsonify({'success': True, 'message': 'Modifications enregistrées avec succès.', 'changes': changes})
     
     except Exception as e:
         import traceback
@@ -405,26 +479,12 @@ def upload_video(filename):
         filepath = os.path.join(app.config['VIDEO_FOLDER'], video_filename)
         
         try:
+            # La vidéo précédente peut être liée à d'autres projets (déduplication): ne pas l'écraser
+            if os.path.lexists(filepath):
+                os.remove(filepath)
             file.save(filepath)
             print(f"Vidéo téléchargée avec succès: {filepath}")
-            
-            # Copier le fichier SRT correspondant s'il existe dans uploads/
-            srt_filename = f"{filename}.srt"
-            upload_srt_path = os.path.join(app.config['UPLOAD_FOLDER'], srt_filename)
-            video_srt_path = os.path.join(app.config['VIDEO_FOLDER'], f"{filename}_video.srt")
-            
-            if os.path.exists(upload_srt_path):
-                print(f"Copie du fichier SRT depuis {upload_srt_path} vers {video_srt_path}")
-                shutil.copy2(upload_srt_path, video_srt_path)
-                print(f"Fichier SRT copié avec succès")
-            else:
-                print(f"Aucun fichier SRT trouvé à {upload_srt_path}")
-            
-            return jsonify({
-                'success': True, 
-                'message': 'Vidéo téléchargée avec succès',
-                'video_url': url_for('get_video', filename=video_filename)
-            })
+            return jsonify(finish_video_upload(filename, video_filename))
         except Exception as e:
             print(f"Erreur lors de la sauvegarde du fichier vidéo: {str(e)}")
             return jsonify({'success': False, 'message': f'Erreur lors de la sauvegarde: {str(e)}'})
@@ -432,84 +492,427 @@ def upload_video(filename):
     print(f"Type de fichier non autorisé: {file.filename}")
     return jsonify({'success': False, 'message': 'Type de fichier non autorisé'})
 
+def finish_video_upload(filename, video_filename):
+    """Étapes qui suivent l'envoi d'une vidéo; renvoie la réponse JSON de l'envoi"""
+    filepath = os.path.join(app.config['VIDEO_FOLDER'], video_filename)
+    
+    # Sous-titres du projet à côté de la vidéo (lus par les scripts FFmpeg générés)
+    video_srt_path = os.path.join(app.config['VIDEO_FOLDER'], f"{filename}_video.srt")
+    if load_project(filename) is not None and project_store.has_subtitles(filename):
+        with open(video_srt_path, 'w', encoding='utf-8') as f:
+            f.write(srt.compose(project_store.iter_subtitles(filename), reindex=False))
+        print(f"Sous-titres du projet écrits dans {video_srt_path}")
+    else:
+        print(f"Aucun sous-titre enregistré pour le projet {filename}")
+    
+    # Index de la vidéo (images clés, durée, pistes), calculé une fois en arrière-plan
+    job = start_media_indexing(filename, filepath)
+    
+    return {
+        'success': True, 
+        'message': 'Vidéo téléchargée avec succès',
+        'video_url': url_for('get_video', filename=video_filename),
+        'index_job': job.to_dict(),
+        'index_url': url_for('media_index', filename=filename)
+    }
+
+def get_upload_session(filename, upload_id):
+    session = video_uploads.get(upload_id)
+    return session if session is not None and session.label == filename else None
+
+@app.route('/upload_video/<filename>/chunked', methods=['POST'])
+def start_chunked_upload(filename):
+    """Ouvre un envoi par morceaux (ou reprend l'envoi inachevé du même fichier: taille et empreinte client)"""
+    data = request.get_json(silent=True) or {}
+    try:
+        size = int(data.get('size', 0))
+    except (TypeError, ValueError):
+        size = 0
+    if data.get('name') and not allowed_video_file(data['name']):
+        return jsonify({'success': False, 'message': 'Type de fichier non autorisé'}), 400
+    if size > app.config['MAX_CONTENT_LENGTH']:
+        return jsonify({'success': False, 'message': 'Le fichier est trop volumineux'}), 413
+    try:
+        session = video_uploads.create(filename, size, data.get('fingerprint'))
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    return jsonify({
+        'success': True,
+        **session.to_dict(),
+        'upload_url': url_for('chunked_upload', filename=filename, upload_id=session.id)
+    }), 201
+
+@app.route('/upload_video/<filename>/chunked/<upload_id>', methods=['GET', 'PUT', 'DELETE'])
+def chunked_upload(filename, upload_id):
+    """
+    GET: décalage confirmé (reprise après une coupure)
+    PUT ?offset=N: morceau suivant, corps brut de la requête
+    DELETE: abandon de l'envoi
+    """
+    session = get_upload_session(filename, upload_id)
+    if session is None:
+        return jsonify({'success': False, 'message': 'Envoi inconnu'}), 404
+    if request.method == 'DELETE':
+        video_uploads.discard(session)
+        return jsonify({'success': True, 'message': 'Envoi abandonné'})
+    if request.method == 'PUT':
+        try:
+            video_uploads.write(session, request.args.get('offset', type=int), request.stream)
+        except ValueError as e:
+            # Le client reprend à partir du décalage confirmé
+            return jsonify({'success': False, 'message': str(e), **session.to_dict()}), 409
+    return jsonify({'success': True, **session.to_dict()})
+
+@app.route('/upload_video/<filename>/chunked/<upload_id>/finalize', methods=['POST'])
+def finalize_chunked_upload(filename, upload_id):
+    """Termine l'envoi: vérifie la taille (et l'empreinte si fournie) puis installe la vidéo"""
+    session = get_upload_session(filename, upload_id)
+    if session is None:
+        return jsonify({'success': False, 'message': 'Envoi inconnu'}), 404
+    data = request.get_json(silent=True) or {}
+    video_filename = secure_filename(f"{filename}_video.mp4")
+    try:
+        digest, deduplicated = video_uploads.finalize(session, os.path.join(app.config['VIDEO_FOLDER'], video_filename),
+                                                      data.get('sha256'))
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e), **session.to_dict()}), 409
+    print(f"Vidéo téléchargée par morceaux: {video_filename} (sha256 {digest}"
+          f"{', déjà stockée' if deduplicated else ''})")
+    return jsonify({**finish_video_upload(filename, video_filename), 'sha256': digest, 'deduplicated': deduplicated})
+
 @app.route('/videos/<filename>')
 def get_video(filename):
     return send_from_directory(app.config['VIDEO_FOLDER'], filename)
 
-@app.route('/generate_all_clips/<filename>')
+def index_uploaded_video(job, video_path):
+    """Tâche de fond: indexe la vidéo envoyée avec ffprobe"""
+    job.update("Indexation de la vidéo")
+    index = index_video(video_path)
+    return {'duration': index.duration, 'keyframes': len(index.keyframes_ms), 'streams': len(index.streams)}
+
+def latest_index_job(filename):
+    """Dernière tâche d'indexation du projet, ou None"""
+    return next((job for job in render_jobs.list(filename) if job.kind == 'index'), None)
+
+def start_media_indexing(filename, video_path):
+    """Lance l'indexation de la vidéo, sauf si elle est déjà en cours"""
+    job = latest_index_job(filename)
+    if job is not None and job.status not in FINISHED_STATES:
+        return job
+    return render_jobs.submit('index', filename, index_uploaded_video, video_path)
+
+@app.route('/media_index/<filename>')
+def media_index(filename):
+    """Index de la vidéo du projet (durée, pistes, images clés), lu par l'éditeur vidéo"""
+    video_path = os.path.join(app.config['VIDEO_FOLDER'], f"{filename}_video.mp4")
+    if not os.path.exists(video_path):
+        return jsonify({'success': False, 'message': 'Fichier vidéo non trouvé'}), 404
+    index = load_media_index(video_path)
+    if index is not None:
+        return jsonify({'success': True, 'status': 'ready', **index.to_dict()})
+    job = latest_index_job(filename)
+    if job is not None and job.status == FAILED:
+        # Pas de nouvel essai à chaque interrogation: un nouvel envoi relance l'indexation
+        return jsonify({'success': False, 'status': 'failed', 'message': job.error}), 500
+    # Pas encore indexée (ou index périmé): indexation en cours ou relancée
+    job = start_media_indexing(filename, video_path)
+    return jsonify({'success': True, 'status': 'pending', 'job': job.to_dict()}), 202
+
+def get_ffmpeg_capabilities():
+    """Capacités de ffmpeg, sondées une fois par version de ffmpeg (cache dans cache/ffmpeg)"""
+    return ffmpeg_capabilities(cache_dir=os.path.join(app.config['CACHE_FOLDER'], 'ffmpeg'))
+
+def render_all_clips(job, filename, video_path, output_dir):
+    """Tâche de fond: encode tous les extraits du projet, plusieurs à la fois"""
+    quotes = project_store.quotes(filename)
+    subtitles = project_store.iter_subtitles(filename) if project_store.has_subtitles(filename) else None
+    subtitle_options = project_store.get_project(filename)['subtitle_options']
+    
+    total = len(quotes)
+    done = []
+    progress = RenderProgress({clip['index']: clip['duration'].total_seconds()
+                               for clip in plan_clips(quotes, output_dir)})
+    job.update(f"Découpage de {total} extraits", 0.0, render=progress.to_dict())
+    
+    def clip_progress(index, snapshot):
+        progress.update(index, snapshot)
+        state = progress.to_dict()
+        job.update(progress=state['fraction'], render=state)
+    
+    def clip_done(result):
+        done.append(result)
+        progress.finish(result)
+        state = "terminé" if result['ok'] else "en échec"
+        if result['cache'] == 'hit':
+            state = "repris du cache"
+        elif result['speed']:
+            state += f" à {result['speed']:.2f}x"
+        render_state = progress.to_dict()
+        job.update(f"{len(done)}/{total} extraits (extrait {result['index']} {state})", render_state['fraction'],
+                   render=render_state)
+    
+    capabilities = get_ffmpeg_capabilities()
+    # Le sémaphore de la file borne de toute façon les encodages: autant en lancer
+    # autant que de processus ffmpeg autorisés
+    results = render_clips(video_path, quotes, output_dir, jobs=app.config['MAX_FFMPEG_PROCESSES'],
+                           subtitles=subtitles, subtitle_format='ass', subtitle_options=subtitle_options,
+                           engine=app.config['RENDER_ENGINE'], capabilities=capabilities,
+                           media_index=load_media_index(video_path), clip_cache=clip_cache,
+                           run=job.run_command, on_clip_done=clip_done, on_clip_progress=clip_progress)
+    job.check_cancelled()
+    speed_history.record(results, encoder=video_encoder(capabilities), mode='encode',
+                         engine=app.config['RENDER_ENGINE'], jobs=app.config['MAX_FFMPEG_PROCESSES'])
+    
+    summary = render_summary(results)
+    print(f"Tâche {job.id}: {summary['succeeded']}/{summary['clips']} extraits rendus "
+          f"(encodage cumulé: {summary['encode_seconds']:.1f} s, vitesse moyenne: "
+          f"{summary['mean_speed'] or 0:.2f}x, cache: {summary['cache_hits']} repris, "
+          f"{summary['cache_misses']} encodés)")
+    if results and not summary['succeeded']:
+        raise RuntimeError(f"aucun extrait n'a pu être rendu ({results[0]['error']})")
+    
+    return {
+        'output_dir': output_dir,
+        'clips': [os.path.basename(result['output']) for result in results if result['ok']],
+        'failed': [{'index': result['index'], 'error': result['error']} for result in results if not result['ok']],
+        'timings': {result['index']: result['seconds'] for result in results},
+        'speeds': {result['index']: result['speed'] for result in results},
+        'cache': {result['index']: result['cache'] for result in results},
+        **summary
+    }
+
+def wants_json():
+    return request.method == 'POST' or request.accept_mimetypes.best == 'application/json'
+
+@app.route('/generate_all_clips/<filename>', methods=['GET', 'POST'])
 def generate_all_clips(filename):
-    try:
-        # Vérifier si le fichier vidéo existe
-        video_filename = f"{filename}_video.mp4"
-        video_path = os.path.join(app.config['VIDEO_FOLDER'], video_filename)
-        
-        if not os.path.exists(video_path):
-            flash(f"Fichier vidéo non trouvé: {video_path}. Veuillez d'abord télécharger une vidéo.")
-            print(f"Erreur: Fichier vidéo non trouvé: {video_path}")
-            return redirect(url_for('edit_video', filename=filename))
-        
-        # S'assurer que le fichier SRT est disponible à côté de la vidéo
-        srt_filename = f"{filename}.srt"
-        upload_srt_path = os.path.join(app.config['UPLOAD_FOLDER'], srt_filename)
-        video_srt_path = os.path.join(app.config['VIDEO_FOLDER'], srt_filename)
-        
-        # Si le fichier SRT n'existe pas à côté de la vidéo mais existe dans uploads/,
-        # le copier à côté de la vidéo
-        if not os.path.exists(video_srt_path) and os.path.exists(upload_srt_path):
-            shutil.copy2(upload_srt_path, video_srt_path)
-            print(f"Fichier SRT copié de {upload_srt_path} vers {video_srt_path}")
-        
-        # Générer le script FFmpeg
-        quotes_file = os.path.join(app.config['UPLOAD_FOLDER'], f"{filename}_quotes.json")
-        if not os.path.exists(quotes_file):
-            flash(f"Fichier de citations non trouvé: {quotes_file}. Veuillez d'abord extraire des citations.")
-            print(f"Erreur: Fichier de citations non trouvé: {quotes_file}")
-            return redirect(url_for('edit_video', filename=filename))
-        
-        with open(quotes_file, 'r', encoding='utf-8') as f:
-            quotes = json.load(f)
-        
-        # Créer le dossier de sortie pour les clips
-        output_dir = os.path.join(app.config['OUTPUT_FOLDER'], f"{filename}_clips")
-        os.makedirs(output_dir, exist_ok=True)
-        
-        # Générer le script FFmpeg
-        script_path = os.path.join(app.config['BASE_DIR'], "quotes_output_ffmpeg.sh")
-        generate_ffmpeg_cut_file(quotes, script_path, add_subtitles=True)
-        
-        # Exécuter le script FFmpeg
-        cmd = f"bash {script_path} {video_path} {output_dir}"
-        print(f"Exécution de la commande: {cmd}")
-        
-        try:
-            subprocess.run(cmd, shell=True, check=True)
-            flash(f"Clips générés avec succès dans {output_dir}")
-        except subprocess.CalledProcessError as e:
-            flash(f"Erreur lors de la génération des clips: {str(e)}")
-            print(f"Erreur lors de la génération des clips: {str(e)}")
-        
-        return redirect(url_for('edit_video', filename=filename))
-    except Exception as e:
-        flash(f"Erreur lors de la génération des clips: {str(e)}")
-        print(f"Exception lors de la génération des clips: {str(e)}")
+    """Lance la génération de tous les extraits en arrière-plan et renvoie l'identifiant de la tâche"""
+    # Vérifier si le fichier vidéo existe
+    video_path = os.path.join(app.config['VIDEO_FOLDER'], f"{filename}_video.mp4")
+    project = load_project(filename)
+    
+    error = None
+    if not os.path.exists(video_path):
+        error = "Fichier vidéo non trouvé. Veuillez d'abord télécharger une vidéo."
+    elif project is None or not project['quotes']:
+        error = "Aucune citation pour ce projet. Veuillez d'abord extraire des citations."
+    if error:
+        print(f"Erreur: {error}")
+        if wants_json():
+            return jsonify({'success': False, 'message': error}), 404
+        flash(error)
         return redirect(url_for('edit_video', filename=filename))
+    
+    output_dir = os.path.join(app.config['OUTPUT_FOLDER'], f"{filename}_clips")
+    job = render_jobs.submit('clips', filename, render_all_clips, filename, video_path, output_dir)
+    
+    if wants_json():
+        return jsonify({
+            'success': True,
+            'message': 'Génération des extraits lancée',
+            'job': job.to_dict(),
+            'status_url': url_for('job_status', job_id=job.id)
+        }), 202
+    flash(f"Génération des extraits lancée (tâche {job.id})")
+    return redirect(url_for('edit_video', filename=filename))
+
+@app.route('/jobs')
+def list_jobs():
+    """Liste des tâches, éventuellement filtrée par projet (?filename=...)"""
+    filename = request.args.get('filename')
+    jobs = sorted(analysis_queue.list(filename) + render_jobs.list(filename),
+                  key=lambda job: job.created_at, reverse=True)
+    return jsonify([job.to_dict() for job in jobs])
+
+@app.route('/jobs/<job_id>')
+def job_status(job_id):
+    job = find_job(job_id)
+    if job is None:
+        return jsonify({'success': False, 'message': 'Tâche inconnue'}), 404
+    return jsonify(job.to_dict())
+
+@app.route('/jobs/<job_id>/events')
+def job_events(job_id):
+    """Avancement d'une tâche en Server-Sent Events (progress, puis done avec le résultat, ou error)"""
+    job = find_job(job_id)
+    if job is None:
+        return jsonify({'success': False, 'message': 'Tâche inconnue'}), 404
+    return job_event_stream(job, lambda job: {'result': job.result})
+
+@app.route('/projects/<filename>/jobs')
+def project_jobs(filename):
+    """Historique des tâches du projet enregistré dans la base (y compris avant un redémarrage)"""
+    return jsonify(project_store.jobs(filename, request.args.get('limit', 50, type=int)))
+
+def quote_edit(edit, status=200):
+    """
+    Réponse JSON d'une modification de citation: 404 si la citation n'existe plus, 409
+    (avec la citation enregistrée) si elle a été modifiée depuis la version envoyée.
+    """
+    try:
+        quote = edit()
+    except QuoteNotFound:
+        return jsonify({'success': False, 'message': 'Citation inconnue'}), 404
+    except VersionConflict as e:
+        return jsonify({'success': False, 'message': "Citation modifiée entre-temps, rechargez-la avant de la modifier",
+                        'quote': e.current}), 409
+    except (KeyError, TypeError, ValueError) as e:
+        return jsonify({'success': False, 'message': f'Citation invalide: {e}'}), 400
+    return jsonify({'success': True, 'quote': quote}), status
+
+def quote_version(data):
+    """Version de la citation lue par l'éditeur: champ version du corps, ou en-tête If-Match"""
+    version = data.get('version', request.headers.get('If-Match', '').strip('"') or None)
+    return int(version) if version is not None else None
+
+@app.route('/projects/<filename>/quotes', methods=['GET', 'POST'])
+def project_quotes(filename):
+    """
+    GET: citations du projet avec leur identifiant et leur version.
+    POST: insère une citation (format de l'export JSON, position facultative, par défaut à la fin).
+    """
+    project = load_project(filename)
+    if project is None:
+        return jsonify({'success': False, 'message': 'Projet inconnu'}), 404
+    if request.method == 'GET':
+        return jsonify({'version': project['version'], 'quotes': project_store.quote_entries(filename)})
+    data = request.get_json(silent=True) or {}
+    return quote_edit(lambda: project_store.insert_quote(filename, quote_from_json(data), data.get('position')), 201)
+
+@app.route('/projects/<filename>/quotes/<int:quote_id>', methods=['GET', 'PATCH', 'DELETE'])
+def project_quote(filename, quote_id):
+    """
+    Une citation, par identifiant. PATCH et DELETE demandent la version lue par l'éditeur
+    (champ version, ou en-tête If-Match); PATCH n'envoie que les champs modifiés.
+    """
+    if request.method == 'GET':
+        quote = project_store.get_quote(filename, quote_id)
+        if quote is None:
+            return jsonify({'success': False, 'message': 'Citation inconnue'}), 404
+        return jsonify(quote)
+    data = request.get_json(silent=True) or {}
+    version = quote_version(data)
+    if version is None:
+        return jsonify({'success': False, 'message': 'Version de la citation requise'}), 428
+    if request.method == 'DELETE':
+        return quote_edit(lambda: project_store.delete_quote(filename, quote_id, version))
+    fields = {key: value for key, value in data.items() if key not in ('id', 'version', 'position')}
+    return quote_edit(lambda: project_store.patch_quote(filename, quote_id, version, fields))
+
+@app.route('/projects/<filename>/quotes/<int:quote_id>/move', methods=['POST'])
+def move_project_quote(filename, quote_id):
+    """Déplace une citation à une autre position ({"version": ..., "position": ...})"""
+    data = request.get_json(silent=True) or {}
+    version = quote_version(data)
+    if version is None:
+        return jsonify({'success': False, 'message': 'Version de la citation requise'}), 428
+    if 'position' not in data:
+        return jsonify({'success': False, 'message': 'Position de la citation requise'}), 400
+    return quote_edit(lambda: project_store.move_quote(filename, quote_id, version, int(data['position'])))
+
+@app.route('/projects/<filename>/subtitle_options', methods=['PUT'])
+def project_subtitle_options(filename):
+    """Enregistre le style des sous-titres incrustés (éditeur vidéo)"""
+    if load_project(filename) is None:
+        return jsonify({'success': False, 'message': 'Projet inconnu'}), 404
+    project_store.set_subtitle_options(filename, request.get_json(silent=True) or {})
+    return jsonify({'success': True, 'message': 'Style des sous-titres enregistré'})
+
+@app.route('/search')
+def search_transcripts():
+    """
+    Recherche plein texte dans les sous-titres de tous les projets (?q=..., et ?project=,
+    ?limit=, ?context=), classée par pertinence
+    """
+    started = time.perf_counter()
+    try:
+        hits = project_store.search(request.args.get('q', ''), limit=request.args.get('limit', 20, type=int),
+                                    context=request.args.get('context', 2, type=int),
+                                    project=request.args.get('project') or None)
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    return jsonify({'query': request.args['q'], 'hits': hits, 'seconds': round(time.perf_counter() - started, 4)})
+
+@app.route('/search/quote', methods=['POST'])
+def search_hit_quote():
+    """
+    Ajoute un résultat de recherche aux citations de son projet ({"project": ...,
+    "position": ..., "context": ...}): le passage autour du sous-titre trouvé devient une
+    citation, insérée dans l'ordre chronologique
+    """
+    data = request.get_json(silent=True) or {}
+    try:
+        quote = project_store.passage_quote(data['project'], int(data['position']), int(data.get('context', 2)))
+    except (KeyError, TypeError, ValueError):
+        return jsonify({'success': False, 'message': 'Projet et position du résultat requis'}), 400
+    if quote is None:
+        return jsonify({'success': False, 'message': 'Sous-titre inconnu'}), 404
+    return quote_edit(lambda: project_store.insert_quote(data['project'], quote, chronological=True), 201)
+
+@app.route('/render/speeds')
+def render_speeds():
+    """Historique des vitesses d'encodage des extraits (?limit=...) et moyennes par machine et réglage"""
+    limit = request.args.get('limit', 100, type=int)
+    return jsonify({
+        'summary': speed_history.summary(),
+        'entries': speed_history.entries(limit)
+    })
+
+@app.route('/jobs/<job_id>/cancel', methods=['POST'])
+def cancel_job(job_id):
+    queue = job_queue(job_id)
+    if queue is None:
+        return jsonify({'success': False, 'message': 'Tâche inconnue'}), 404
+    if not queue.cancel(job_id):
+        return jsonify({'success': False, 'message': 'La tâche est déjà terminée'}), 409
+    return jsonify({'success': True, 'message': 'Annulation demandée'})
 
-def generate_enhanced_ffmpeg_script(quotes, output_file, subtitle_options, padding=1):
+def generate_enhanced_ffmpeg_script(quotes, output_file, subtitle_options, padding=1, capabilities=None):
     """
     Génère un script FFmpeg avancé pour extraire des segments vidéo avec sous-titres synchronisés
     
+    Les sous-titres de chaque extrait (texte de la citation découpé en segments répartis sur
+    sa durée) sont écrits en ASS, avec leur style, dans un dossier à côté du script. Si
+    ffmpeg n'a pas libass, le texte est affiché par drawtext: la méthode est choisie ici,
+    d'après les capacités de ffmpeg, et chaque extrait n'est encodé qu'une fois.
+    
     Args:
         quotes: Liste des citations à extraire
         output_file: Chemin du fichier de sortie pour le script
         subtitle_options: Options de formatage des sous-titres
         padding: Nombre de secondes à ajouter avant et après chaque extrait
+        capabilities: Capacités de ffmpeg (ffmpeg_caps), ou None si inconnues
     """
-    # Récupérer les options de sous-titres
-    font = subtitle_options.get('font', 'Arial')
-    font_size = subtitle_options.get('size', '36')
-    font_color = subtitle_options.get('color', '0xffffff')
-    bg_color = subtitle_options.get('backgroundColor', '0x000000')
-    bg_opacity = float(subtitle_options.get('opacity', '0.7'))
+    max_segment_length = int(subtitle_options.get('maxSegmentLength', '150'))
+    method = subtitle_method(capabilities)
+    encoder = video_encoder(capabilities)
+    encode_options = f"-c:v {encoder} " + ("-preset fast -crf 22 " if encoder == 'libx264' else "") + "-c:a aac -b:a 128k"
+    
+    # Sous-titres (ou texte pour drawtext) de tous les extraits, écrits avant le script
+    subtitle_dir = os.path.splitext(output_file)[0] + "_sous_titres"
+    os.makedirs(subtitle_dir, exist_ok=True)
+    clips = []
+    for i, quote in enumerate(quotes, 1):
+        start_seconds = max(0, quote['start_time'].total_seconds() - padding)
+        duration_seconds = quote['duration'].total_seconds() + (padding * 2)
+        content = quote['content'].replace('\n', ' ').replace('\r', ' ').strip()
+        
+        video_filter = None
+        if method == 'subtitles':
+            # Diviser le contenu en segments pour une meilleure synchronisation
+            segments = [segment.strip() or "..." for segment in split_content_into_segments(content, max_chars=max_segment_length)]
+            segment_duration = duration_seconds / max(1, len(segments))
+            events = [(timedelta(seconds=k * segment_duration), timedelta(seconds=(k + 1) * segment_duration), segment)
+                      for k, segment in enumerate(segments)]
+            with open(os.path.join(subtitle_dir, f"extrait_{i:03d}.ass"), 'w', encoding='utf-8') as f:
+                f.write(compose_ass(events, subtitle_options))
+            # Le style est dans le fichier ASS
+            video_filter = f"subtitles='$SUBTITLE_DIR/extrait_{i:03d}.ass'"
+        elif method == 'drawtext':
+            with open(os.path.join(subtitle_dir, f"extrait_{i:03d}.txt"), 'w', encoding='utf-8') as f:
+                f.write(drawtext_text(content))
+            video_filter = drawtext_filter(f"$SUBTITLE_DIR/extrait_{i:03d}.txt", capabilities['font_file'], subtitle_options)
+        clips.append((i, quote, start_seconds, duration_seconds, video_filter))
     
     with open(output_file, 'w', encoding='utf-8') as f:
         # Entête du script
@@ -521,188 +924,21 @@ def generate_enhanced_ffmpeg_script(quotes, output_file, subtitle_options, paddi
         f.write("fi\n\n")
         f.write("VIDEO_INPUT=$1\n")
         f.write("OUTPUT_DIR=$2\n")
+        f.write(f"SUBTITLE_DIR=\"$(cd \"$(dirname \"$0\")\" && pwd)/{os.path.basename(subtitle_dir)}\"\n")
         f.write("mkdir -p \"$OUTPUT_DIR\"\n\n")
+        if method is None:
+            f.write("echo \"Attention: ffmpeg n'a ni libass ni drawtext, les sous-titres ne seront pas incrustés.\"\n\n")
         
-        for i, quote in enumerate(quotes, 1):
-            start_seconds = quote['start_time'].total_seconds() - padding
-            if start_seconds < 0:
-                start_seconds = 0
-                
-            duration_seconds = quote['duration'].total_seconds() + (padding * 2)
-            
+        for i, quote, start_seconds, duration_seconds, video_filter in clips:
             # Format du timecode pour le nom de fichier
             timecode = quote['formatted_start'].replace(':', '_')
             
             f.write(f"# Extrait {i}: {quote['formatted_start']} - {quote['formatted_end']}\n")
             f.write(f"echo \"Génération de l'extrait {i}...\"\n")
-            
-            # Créer un fichier SRT temporaire pour cet extrait
-            temp_srt = f"temp_subtitle_{i}.srt"  # Utiliser un chemin relatif
-            temp_srt_path = f"\"$OUTPUT_DIR/{temp_srt}\""  # Ajouter des guillemets pour protéger le chemin
-            
-            # Vérifier que le répertoire existe
-            f.write(f"# Vérifier que le répertoire de sortie existe\n")
-            f.write(f"mkdir -p \"$OUTPUT_DIR\"\n\n")
-            
-            # Ajouter des commandes de débogage
-            f.write(f"# Débogage: afficher le répertoire courant et les permissions\n")
-            f.write(f"pwd\n")
-            f.write(f"ls -la \"$OUTPUT_DIR\"\n\n")
-            
-            # Utiliser un chemin absolu pour le fichier SRT temporaire
-            f.write(f"TEMP_SRT_PATH=\"$OUTPUT_DIR/{temp_srt}\"\n\n")
-            
-            # Écrire le contenu dans un fichier temporaire séparé
-            f.write(f"cat > \"$TEMP_SRT_PATH\" << 'EOF'\n")
-            
-            # Diviser le contenu en segments pour une meilleure synchronisation
-            content = quote['content']
-            # Nettoyer le contenu pour éviter les problèmes d'échappement
-            content = content.replace('\n', ' ').replace('\r', ' ')
-            content = content.replace('\\', '').replace('$', '\\$')
-            content = content.replace("\'", "'").replace('\"', '"')
-            content = content.strip()
-            
-            # Utiliser une taille de segment plus grande pour éviter trop de fragmentation
-            max_segment_length = int(subtitle_options.get('maxSegmentLength', '150'))
-            segments = split_content_into_segments(content, max_chars=max_segment_length)
-            
-            # Durée totale en secondes
-            total_duration = duration_seconds
-            segment_duration = total_duration / max(1, len(segments))
-            
-            for seg_idx, segment in enumerate(segments, 1):
-                start_time = (seg_idx - 1) * segment_duration
-                end_time = seg_idx * segment_duration
-                
-                # S'assurer que le segment n'est pas vide
-                segment = segment.strip()
-                if not segment:
-                    segment = "..."
-                
-                # Pas besoin d'échapper les caractères pour le heredoc avec des guillemets simples
-                f.write(f"{seg_idx}\n")
-                f.write(f"{format_timedelta_srt(timedelta(seconds=start_time))} --> {format_timedelta_srt(timedelta(seconds=end_time))}\n")
-                f.write(f"{segment}\n\n")
-            
-            f.write("EOF\n\n")
-            
-            # Ajouter des commandes de débogage pour vérifier le fichier SRT
-            f.write(f"# Débogage: vérifier que le fichier SRT a été créé\n")
-            f.write(f"ls -la \"$TEMP_SRT_PATH\"\n")
-            f.write(f"cat \"$TEMP_SRT_PATH\"\n\n")
-            
-            # S'assurer que le fichier est accessible
-            f.write(f"# S'assurer que le fichier SRT est accessible\n")
-            f.write(f"chmod 644 \"$TEMP_SRT_PATH\"\n\n")
-            
-            # Copier le fichier SRT dans le répertoire de travail courant
-            f.write(f"# Copier le fichier SRT dans le répertoire de travail courant\n")
-            f.write(f"cp \"$TEMP_SRT_PATH\" ./temp_subtitle_${i}.srt\n")
-            f.write(f"chmod 644 ./temp_subtitle_${i}.srt\n\n")
-            
-            # Débogage: écrire le contenu original dans un fichier log
-            f.write(f"# Contenu original: {content[:50]}...\n")
-            
-            # Débogage: écrire le nombre de segments
-            f.write(f"# Nombre de segments: {len(segments)}\n")
-            
-            # Méthode avec subtitles filter pour synchronisation
-            f.write("ffmpeg -y -i \"$VIDEO_INPUT\" ")
-            f.write(f"-ss {start_seconds} -t {duration_seconds} ")
-            
-            # Méthode principale avec filtre subtitles
-            f.write("# Méthode principale avec filtre subtitles\n")
-            
-            # Créer une variable pour le chemin complet
-            f.write("# Créer une variable pour le chemin complet du fichier SRT\n")
-            f.write("CURRENT_DIR=\"$(pwd)\"\n")
-            f.write("FULL_SRT_PATH=\"$CURRENT_DIR/$OUTPUT_DIR/temp_subtitle_${i}.srt\"\n\n")
-            
-            # Vérifier que le fichier existe
-            f.write("if [ -f \"$TEMP_SRT_PATH\" ]; then\n")
-            f.write("    echo \"Fichier SRT temporaire trouvé: $TEMP_SRT_PATH\"\n")
-            
-            # Utiliser le filtre subtitles avec le chemin absolu
-            f.write("    ffmpeg -y -i \"$VIDEO_INPUT\" ")
-            f.write(f"-ss {start_seconds} -t {duration_seconds} ")
-            f.write("-vf \"")
-            f.write("subtitles=temp_subtitle_${i}.srt:force_style='")
-            f.write(f"FontName={font},")
-            f.write(f"FontSize={font_size},")
-            f.write(f"PrimaryColour={font_color.replace('0x', '&H')},")
-            f.write(f"BackColour={bg_color.replace('0x', '&H')}{int(bg_opacity*255):02X},")
-            f.write(f"BorderStyle=4,")  # Style avec fond (box)
-            f.write(f"Outline=1,")
-            f.write(f"Alignment=2,")    # Centré en bas
-            f.write(f"MarginV=30")      # Marge verticale pour remonter les sous-titres
-            f.write("'\" ")
-            
-            # Paramètres de sortie
-            f.write("-c:v libx264 -preset fast -crf 22 -c:a aac -b:a 128k ")
-            f.write(f"\"$OUTPUT_DIR/extrait_{i:03d}_{timecode}.mp4\"\n")
-            
-            # Si le filtre subtitles échoue, utiliser drawtext
-            f.write("    if [ $? -ne 0 ]; then\n")
-            f.write("        echo \"Échec avec le filtre subtitles, tentative avec drawtext...\"\n")
-            f.write("        ffmpeg -y -i \"$VIDEO_INPUT\" ")
-            f.write(f"-ss {start_seconds} -t {duration_seconds} ")
-            f.write("-vf \"")
-            # Utiliser drawtext comme solution de repli
-            f.write(f"drawtext=fontfile=")
-            # Déterminer le chemin de la police selon le système d'exploitation
-            f.write("$(if [ \"$(uname)\" == \"Darwin\" ]; then ")
-            f.write("echo \"/System/Library/Fonts/Helvetica.ttc\"; ")
-            f.write("elif [ \"$(uname)\" == \"Linux\" ]; then ")
-            f.write("echo \"/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf\"; ")
-            f.write("else ")
-            f.write("echo \"/Windows/Fonts/arial.ttf\"; ")
-            f.write("fi):")
-            f.write(f"fontsize={font_size}:")
-            f.write(f"fontcolor={font_color}@1.0:")
-            f.write(f"box=1:boxcolor={bg_color}@{bg_opacity}:")
-            f.write("boxborderw=15:")
-            f.write("text='")
-            # Limiter le texte pour drawtext
-            short_text = content[:150].replace("'", "\\'").replace('"', '\\"')
-            f.write(f"{short_text}")
-            f.write("':")
-            f.write("x=(w-text_w)/2:y=h*0.75\" ")
-            f.write("-c:v libx264 -preset fast -crf 22 -c:a aac -b:a 128k ")
-            f.write(f"\"$OUTPUT_DIR/extrait_{i:03d}_{timecode}.mp4\"\n")
-            f.write("    fi\n")
-            f.write("else\n")
-            f.write("    echo \"Fichier SRT temporaire non trouvé: $TEMP_SRT_PATH, utilisation de drawtext...\"\n")
-            f.write("    ffmpeg -y -i \"$VIDEO_INPUT\" ")
-            f.write(f"-ss {start_seconds} -t {duration_seconds} ")
-            f.write("-vf \"")
-            # Utiliser drawtext directement si le fichier SRT n'existe pas
-            f.write(f"drawtext=fontfile=")
-            # Déterminer le chemin de la police selon le système d'exploitation
-            f.write("$(if [ \"$(uname)\" == \"Darwin\" ]; then ")
-            f.write("echo \"/System/Library/Fonts/Helvetica.ttc\"; ")
-            f.write("elif [ \"$(uname)\" == \"Linux\" ]; then ")
-            f.write("echo \"/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf\"; ")
-            f.write("else ")
-            f.write("echo \"/Windows/Fonts/arial.ttf\"; ")
-            f.write("fi):")
-            f.write(f"fontsize={font_size}:")
-            f.write(f"fontcolor={font_color}@1.0:")
-            f.write(f"box=1:boxcolor={bg_color}@{bg_opacity}:")
-            f.write("boxborderw=15:")
-            f.write("text='")
-            short_text = content[:150].replace("'", "\\'").replace('"', '\\"')
-            f.write(f"{short_text}")
-            f.write("':")
-            f.write("x=(w-text_w)/2:y=h*0.75\" ")
-            f.write("-c:v libx264 -preset fast -crf 22 -c:a aac -b:a 128k ")
-            f.write(f"\"$OUTPUT_DIR/extrait_{i:03d}_{timecode}.mp4\"\n")
-            f.write("fi\n\n")
-            
-            # Supprimer le fichier SRT temporaire
-            f.write("# Supprimer le fichier SRT temporaire\n")
-            f.write("rm -f \"$TEMP_SRT_PATH\"\n")
-            f.write("rm -f ./temp_subtitle_${i}.srt\n\n")
+            f.write(f"ffmpeg -y -ss {start_seconds} -i \"$VIDEO_INPUT\" -t {duration_seconds} ")
+            if video_filter:
+                f.write(f"-vf \"{video_filter}\" ")
+            f.write(f"{encode_options} \"$OUTPUT_DIR/extrait_{i:03d}_{timecode}.mp4\"\n\n")
         
         # Ajouter une commande pour combiner tous les extraits
         f.write("# Demander à l'utilisateur s'il souhaite combiner tous les extraits\n")
@@ -741,7 +977,7 @@ def split_content_into_segments(content, max_chars=100):
     
     # Nettoyer le contenu: supprimer les caractères d'échappement et les caractères spéciaux problématiques
     content = content.replace('\n', ' ').replace('\r', ' ')
-    content = content.replace('\\', '').replace('$', '\\$')
+    content = content.replace('\\', '')
     content = content.replace("\'", "'").replace('\"', '"')  # Normaliser les apostrophes et guillemets
     
     # Diviser le texte en phrases
@@ -805,15 +1041,6 @@ def split_content_into_segments(content, max_chars=100):
     
     return segments
 
-def format_timedelta_srt(td):
-    """Convertit un objet timedelta en format SRT (HH:MM:SS,mmm)"""
-    total_seconds = td.total_seconds()
-    hours = int(total_seconds // 3600)
-    minutes = int((total_seconds % 3600) // 60)
-    seconds = int(total_seconds % 60)
-    milliseconds = int((total_seconds - int(total_seconds)) * 1000)
-    return f"{hours:02d}:{minutes:02d}:{seconds:02d},{milliseconds:03d}"
-
 @app.route('/combine_clips/<filename>', methods=['POST'])
 def combine_clips(filename):
     try:
@@ -824,35 +1051,21 @@ def combine_clips(filename):
             return jsonify({'success': False, 'message': 'Sélectionnez au moins deux extraits à combiner'})
         
         # Charger les données des extraits
-        json_file = os.path.join(app.config['OUTPUT_FOLDER'], f"{filename}_quotes.json")
-        with open(json_file, 'r', encoding='utf-8') as f:
-            quotes = json.load(f)
+        quotes = project_store.quotes(filename)
         
         # Trier les indices pour les traiter dans l'ordre chronologique
-        selected_indices.sort(key=lambda i: quotes[i]['start_time_seconds'])
-        
-        # Créer un nouvel extrait combiné
-        combined_quote = {
-            'content': ' '.join([quotes[i]['content'] for i in selected_indices]),
-            'start_time_seconds': quotes[selected_indices[0]]['start_time_seconds'],
-            'end_time_seconds': quotes[selected_indices[-1]]['end_time_seconds'],
-            'formatted_start': quotes[selected_indices[0]]['formatted_start'],
-            'formatted_end': quotes[selected_indices[-1]]['formatted_end'],
-            'duration_seconds': quotes[selected_indices[-1]]['end_time_seconds'] - quotes[selected_indices[0]]['start_time_seconds']
-        }
-        
-        # Ajouter le nouvel extrait combiné
-        quotes.append(combined_quote)
+        selected_indices.sort(key=lambda i: quotes[i].start_ms)
         
-        # Sauvegarder les modifications
-        with open(json_file, 'w', encoding='utf-8') as f:
-            json.dump(quotes, f, ensure_ascii=False, indent=2)
+        # Créer un nouvel extrait combiné, ajouté à la fin de la liste (une seule ligne écrite)
+        combined_quote = Quote(' '.join([quotes[i].content for i in selected_indices]),
+                               quotes[selected_indices[0]].start_ms, quotes[selected_indices[-1]].end_ms)
+        new_quote = project_store.insert_quote(filename, combined_quote)
         
         return jsonify({
             'success': True, 
             'message': 'Extraits combinés avec succès',
-            'new_quote': combined_quote,
-            'new_index': len(quotes) - 1
+            'new_quote': new_quote,
+            'new_index': new_quote['position']
         })
         
     except Exception as e:
@@ -0,0 +1,89 @@
+"""
+Mesure du regroupement des sous-titres en passages.
+
+Compare l'algorithme d'origine (concaténation au fil de l'eau) au regroupement
+vectorisé de group_subtitles_into_passages et à la version en flux iter_passages,
+sur une transcription factice.
+
+Usage:
+    python benchmarks/bench_grouping.py [nombre_de_sous_titres] [longueur_max_des_passages]
+"""
+import os
+import random
+import sys
+import time
+from datetime import timedelta
+
+import srt
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from extract_srt_quotes import group_subtitles_into_passages, iter_passages
+
+
+def make_transcript(count, seed=0):
+    """Sous-titres de 20 à 80 caractères, avec un silence de plus de 3 s de temps en temps"""
+    rng = random.Random(seed)
+    words = "le la de radio musique culture économie sujet podcast invité question réponse".split()
+    subtitles = []
+    t = 0
+    for i in range(count):
+        duration = rng.randint(1500, 4000)
+        content = " ".join(rng.choice(words) for _ in range(rng.randint(3, 10)))
+        subtitles.append(srt.Subtitle(index=i + 1, start=timedelta(milliseconds=t),
+                                      end=timedelta(milliseconds=t + duration), content=content))
+        t += duration + (rng.randint(3500, 6000) if rng.random() < 0.02 else rng.randint(0, 500))
+    return subtitles
+
+
+def reference_grouping(subtitles, max_gap_seconds, min_passage_length, max_passage_length):
+    """Algorithme d'origine: le texte du passage est recopié à chaque sous-titre ajouté"""
+    passages = []
+    current = None
+    for sub in subtitles:
+        if current is None:
+            current = {'content': sub.content, 'end_time': sub.end}
+            continue
+        gap = (sub.start - current['end_time']).total_seconds()
+        if gap > max_gap_seconds or len(current['content']) + len(sub.content) > max_passage_length:
+            if len(current['content']) >= min_passage_length:
+                passages.append(current)
+            current = {'content': sub.content, 'end_time': sub.end}
+        else:
+            current['content'] += " " + sub.content
+            current['end_time'] = sub.end
+    if current is not None and len(current['content']) >= min_passage_length:
+        passages.append(current)
+    return passages
+
+
+def measure(label, function, repeat=3):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    print(f"{label:<32} {best * 1000:9.1f} ms  ({len(result)} passages)")
+    return result
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    max_length = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+    subtitles = make_transcript(count)
+    print(f"{count} sous-titres, passages de {max_length} caractères au plus\n")
+
+    reference = measure("Origine (concaténation)",
+                        lambda: reference_grouping(subtitles, 3.0, 500, max_length))
+    grouped = measure("group_subtitles_into_passages",
+                      lambda: group_subtitles_into_passages(subtitles, 3.0, 500, max_length))
+    measure("iter_passages (flux)",
+            lambda: list(iter_passages(iter(subtitles), 3.0, 500, max_length)))
+
+    if [p['content'] for p in grouped] != [p['content'] for p in reference]:
+        print("\nERREUR: les passages diffèrent de l'algorithme d'origine")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,235 @@
+"""
+Envoi des vidéos par morceaux, avec reprise.
+
+Le client ouvre un envoi (taille totale et empreinte du fichier local: nom et date de
+modification), envoie les octets par morceaux à partir d'un
+décalage, puis le termine. Chaque morceau est écrit directement dans le fichier de
+l'envoi (dans le dossier des vidéos, renommé à la fin, sans copie) pendant que son
+empreinte SHA-256 est calculée: le décalage confirmé est toujours le nombre d'octets
+écrits et pris en compte dans l'empreinte. Après une coupure, le client demande ce
+décalage et reprend à partir de là.
+
+Les vidéos identiques ne sont pas stockées deux fois: à la fin de l'envoi, une vidéo
+déjà connue (même empreinte) est liée (lien physique) depuis le dossier de stockage
+par empreinte au lieu d'être gardée en double.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+import uuid
+
+# Taille des morceaux conseillée au client
+CHUNK_SIZE = 8 * 1024 * 1024
+
+# Taille des blocs lus dans le corps d'une requête
+READ_BLOCK_SIZE = 1024 * 1024
+
+class UploadSession:
+    """Un envoi en cours: fichier partiel, décalage confirmé et empreinte des octets reçus"""
+    
+    def __init__(self, upload_id, label, size, directory, created_at=None, fingerprint=None):
+        self.id = upload_id
+        self.label = label
+        self.size = size
+        # Identifie le fichier local du client: seul le même fichier reprend cet envoi
+        self.fingerprint = fingerprint
+        self.part_path = os.path.join(directory, f"{upload_id}.part")
+        self.state_path = os.path.join(directory, f"{upload_id}.json")
+        self.created_at = created_at or time.time()
+        self.offset = 0
+        self.lock = threading.Lock()
+        self._hasher = hashlib.sha256()
+    
+    def _resume(self):
+        """Recalcule l'empreinte des octets déjà écrits (envoi repris après un redémarrage)"""
+        self.offset = 0
+        self._hasher = hashlib.sha256()
+        if not os.path.exists(self.part_path):
+            return
+        with open(self.part_path, 'rb') as f:
+            for block in iter(lambda: f.read(READ_BLOCK_SIZE), b''):
+                self._hasher.update(block)
+                self.offset += len(block)
+    
+    def to_dict(self):
+        return {
+            'upload_id': self.id,
+            'size': self.size,
+            'offset': self.offset,
+            'chunk_size': CHUNK_SIZE
+        }
+
+class ChunkedUploads:
+    """
+    Envois en cours, partagés entre les threads de l'application.
+    
+    Args:
+        directory: Dossier des fichiers partiels (sur le même système de fichiers que
+            les vidéos, pour les renommer sans copie)
+        store_dir: Dossier des vidéos par empreinte (déduplication)
+    """
+    
+    def __init__(self, directory, store_dir):
+        self.directory = directory
+        self.store_dir = store_dir
+        self._sessions = {}
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        os.makedirs(store_dir, exist_ok=True)
+        self._load_sessions()
+    
+    def _load_sessions(self):
+        for name in os.listdir(self.directory):
+            if not name.endswith('.json'):
+                continue
+            try:
+                with open(os.path.join(self.directory, name), 'r', encoding='utf-8') as f:
+                    state = json.load(f)
+                session = UploadSession(state['upload_id'], state['label'], state['size'], self.directory,
+                                        state.get('created_at'), state.get('fingerprint'))
+            except (OSError, ValueError, KeyError):
+                continue
+            session._resume()
+            self._sessions[session.id] = session
+    
+    def create(self, label, size, fingerprint=None):
+        """
+        Ouvre un envoi, ou renvoie l'envoi inachevé du même fichier (même projet, même
+        taille, même empreinte client). Les autres envois inachevés du projet sont
+        abandonnés: un autre fichier de même taille ne reprend jamais un fichier partiel.
+        
+        Args:
+            fingerprint: Empreinte du fichier local fournie par le client (nom, date de
+                modification...); sans empreinte, l'envoi n'est jamais repris
+        
+        Raises:
+            ValueError: taille invalide
+        """
+        if size <= 0:
+            raise ValueError("Taille de fichier invalide")
+        with self._lock:
+            for session in self._sessions.values():
+                if session.label == label and session.size == size and fingerprint \
+                        and session.fingerprint == fingerprint:
+                    return session
+            replaced = [session for session in self._sessions.values() if session.label == label]
+            session = UploadSession(uuid.uuid4().hex, label, size, self.directory, fingerprint=fingerprint)
+            self._sessions[session.id] = session
+        for old in replaced:
+            with old.lock:
+                self.discard(old)
+        with open(session.state_path, 'w', encoding='utf-8') as f:
+            json.dump({'upload_id': session.id, 'label': label, 'size': size, 'created_at': session.created_at,
+                       'fingerprint': fingerprint}, f)
+        open(session.part_path, 'wb').close()
+        return session
+    
+    def get(self, upload_id):
+        """Envoi en cours d'identifiant upload_id, ou None"""
+        with self._lock:
+            return self._sessions.get(upload_id)
+    
+    def write(self, session, offset, stream):
+        """
+        Écrit un morceau lu dans stream (objet fichier) à partir du décalage offset.
+        
+        Les octets sont écrits et ajoutés à l'empreinte au fil de la lecture: si la
+        connexion est coupée, le décalage confirmé est celui du dernier bloc écrit.
+        
+        Returns:
+            Nouveau décalage confirmé
+        
+        Raises:
+            ValueError: décalage différent du décalage confirmé, ou données au-delà de la taille annoncée
+        """
+        with session.lock:
+            if offset != session.offset:
+                raise ValueError(f"Décalage {offset} inattendu (attendu: {session.offset})")
+            with open(session.part_path, 'r+b') as f:
+                f.seek(session.offset)
+                try:
+                    for block in iter(lambda: stream.read(READ_BLOCK_SIZE), b''):
+                        if session.offset + len(block) > session.size:
+                            raise ValueError("Données au-delà de la taille annoncée")
+                        f.write(block)
+                        session._hasher.update(block)
+                        session.offset += len(block)
+                finally:
+                    # Un bloc refusé ou à moitié écrit n'est pas confirmé
+                    f.truncate(session.offset)
+            return session.offset
+    
+    def finalize(self, session, destination, expected_sha256=None):
+        """
+        Termine l'envoi: le fichier reçu devient destination, ou un lien vers une vidéo
+        identique déjà stockée.
+        
+        Returns:
+            (empreinte SHA-256, True si la vidéo était déjà stockée)
+        
+        Raises:
+            ValueError: envoi incomplet, ou empreinte différente de celle attendue (l'envoi
+                est alors abandonné)
+        """
+        with session.lock:
+            if session.offset != session.size:
+                raise ValueError(f"Envoi incomplet: {session.offset} octets reçus sur {session.size}")
+            digest = session._hasher.hexdigest()
+            if expected_sha256 and expected_sha256.lower() != digest:
+                self.discard(session)
+                raise ValueError("Empreinte SHA-256 différente de celle du fichier envoyé")
+            
+            # Ne jamais écrire dans un fichier existant: il peut être lié à d'autres projets
+            if os.path.lexists(destination):
+                os.remove(destination)
+            stored = os.path.join(self.store_dir, f"{digest}{os.path.splitext(destination)[1]}")
+            deduplicated = False
+            if os.path.exists(stored):
+                try:
+                    os.link(stored, destination)
+                    deduplicated = True
+                except OSError:
+                    pass
+            if deduplicated:
+                os.remove(session.part_path)
+            else:
+                os.replace(session.part_path, destination)
+                try:
+                    if not os.path.exists(stored):
+                        os.link(destination, stored)
+                except OSError:
+                    # Liens physiques non pris en charge: pas de déduplication
+                    pass
+            self._forget(session)
+        self.prune_store()
+        return digest, deduplicated
+    
+    def discard(self, session):
+        """Abandonne un envoi et supprime son fichier partiel"""
+        for path in (session.part_path, session.state_path):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        with self._lock:
+            self._sessions.pop(session.id, None)
+    
+    def _forget(self, session):
+        try:
+            os.remove(session.state_path)
+        except OSError:
+            pass
+        with self._lock:
+            self._sessions.pop(session.id, None)
+    
+    def prune_store(self):
+        """Supprime du stockage par empreinte les vidéos qu'aucun projet n'utilise plus"""
+        for name in os.listdir(self.store_dir):
+            path = os.path.join(self.store_dir, name)
+            try:
+                if os.stat(path).st_nlink <= 1:
+                    os.remove(path)
+            except OSError:
+                continue
@@ -0,0 +1,104 @@
+"""
+Cache disque des extraits rendus, adressé par contenu.
+
+La clé d'un extrait est l'empreinte de tout ce qui détermine le fichier produit: contenu
+de la vidéo source, bornes de l'extrait, mode de découpe et encodeur, texte et style des
+sous-titres incrustés. Relancer le rendu d'un projet après la modification d'une seule
+citation ne réencode donc que cet extrait: les autres sont liés (lien physique, sans
+copie) depuis le cache dans le dossier de sortie.
+
+La taille totale est bornée; les extraits les moins récemment utilisés sont retirés du
+cache en premier. Un extrait retiré du cache reste dans les dossiers de sortie qui le
+référencent.
+"""
+import hashlib
+import os
+import shutil
+import threading
+
+from disk_lru import DiskLRU
+
+DEFAULT_MAX_BYTES = 4 * 1024 * 1024 * 1024
+
+# Taille des blocs lus pour l'empreinte de la vidéo source
+HASH_CHUNK_SIZE = 1024 * 1024
+
+_source_hashes = {}
+_source_lock = threading.Lock()
+
+def source_hash(path):
+    """
+    Empreinte SHA-256 du contenu d'une vidéo.
+    
+    Le calcul lit tout le fichier: le résultat est gardé en mémoire tant que la taille et
+    la date de modification du fichier ne changent pas.
+    """
+    stat = os.stat(path)
+    memo_key = (os.path.realpath(path), stat.st_size, stat.st_mtime_ns)
+    with _source_lock:
+        if memo_key in _source_hashes:
+            return _source_hashes[memo_key]
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    with _source_lock:
+        _source_hashes[memo_key] = digest.hexdigest()
+    return _source_hashes[memo_key]
+
+def _link_or_copy(source, destination):
+    try:
+        os.link(source, destination)
+    except OSError:
+        # Autre système de fichiers, ou liens physiques non pris en charge
+        shutil.copy2(source, destination)
+
+class ClipCache(DiskLRU):
+    """
+    Extraits rendus, bornés en taille, avec éviction LRU (voir disk_lru.DiskLRU).
+    """
+    
+    def __init__(self, directory, max_bytes=DEFAULT_MAX_BYTES):
+        self.hits = 0
+        self.misses = 0
+        super().__init__(directory, max_bytes, '.mp4')
+    
+    @staticmethod
+    def make_key(source, *params):
+        """Nom de fichier d'un extrait rendu à partir d'une vidéo (empreinte) et de sa recette"""
+        digest = hashlib.blake2b(repr((source, params)).encode('utf-8'), digest_size=16).hexdigest()
+        return f"{digest}.mp4"
+    
+    def fetch(self, key, destination):
+        """
+        Place l'extrait en cache à l'emplacement destination (lien physique, ou copie).
+        
+        Returns:
+            True si l'extrait était en cache (succès), False sinon (échec)
+        """
+        if self._known(key):
+            try:
+                if os.path.lexists(destination):
+                    os.remove(destination)
+                _link_or_copy(os.path.join(self.directory, key), destination)
+            except OSError:
+                self._forget(key)
+            else:
+                self._touch(key)
+                with self._lock:
+                    self.hits += 1
+                return True
+        with self._lock:
+            self.misses += 1
+        return False
+    
+    def store(self, key, rendered_path):
+        """Ajoute un extrait rendu au cache puis retire les plus anciens si besoin"""
+        temp_path = self._temp_path(key)
+        _link_or_copy(rendered_path, temp_path)
+        self._commit(key, temp_path)
+    
+    def stats(self):
+        """Succès et échecs, nombre et taille des extraits en cache"""
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, **self._usage()}
@@ -0,0 +1,164 @@
+"""
+Fichiers de sous-titres des extraits, générés à partir de la transcription déjà lue.
+
+Pour chaque extrait, les sous-titres qui chevauchent sa fenêtre sont coupés aux bornes
+de l'extrait et leurs horaires ramenés au début de l'extrait (la vidéo découpée commence
+à 0). Tous les fichiers sont écrits en un seul parcours des sous-titres, avant le rendu:
+plus besoin d'un processus ffmpeg par extrait pour découper le SRT complet.
+
+Deux formats:
+- 'srt': le style est appliqué au rendu (force_style du filtre subtitles);
+- 'ass': le style (police, couleurs, fond) est inclus dans le fichier.
+"""
+import os
+from datetime import timedelta
+
+import srt
+
+SUBTITLE_FORMATS = ('srt', 'ass')
+
+# Options de l'éditeur vidéo (couleurs au format 0xRRGGBB)
+DEFAULT_SUBTITLE_OPTIONS = {
+    'font': 'Arial',
+    'size': '36',
+    'color': '0xffffff',
+    'backgroundColor': '0x000000',
+    'opacity': '0.7'
+}
+
+# Résolution de référence des styles: celle que libass utilise pour les fichiers SRT,
+# pour que les tailles de police soient les mêmes dans les deux formats
+PLAY_RES_X = 384
+PLAY_RES_Y = 288
+
+def ass_colour(value, opacity=1.0):
+    """
+    Couleur ASS (&HAABBGGRR) d'une couleur 0xRRGGBB ou #RRGGBB.
+    
+    En ASS, l'alpha mesure la transparence: 00 est opaque, FF invisible.
+    """
+    rgb = value.replace('0x', '').replace('#', '').rjust(6, '0')[-6:]
+    alpha = round((1 - min(1.0, max(0.0, float(opacity)))) * 255)
+    return f"&H{alpha:02X}{rgb[4:6]}{rgb[2:4]}{rgb[0:2]}".upper()
+
+def subtitle_force_style(options):
+    """Style force_style du filtre subtitles (sous-titres SRT) à partir des options de l'éditeur vidéo"""
+    options = {**DEFAULT_SUBTITLE_OPTIONS, **(options or {})}
+    return (f"FontName={options['font']},"
+            f"FontSize={options['size']},"
+            f"PrimaryColour={ass_colour(options['color'])},"
+            f"BackColour={ass_colour(options['backgroundColor'], options['opacity'])},"
+            "BorderStyle=4,Outline=1,Alignment=2,MarginV=30")
+
+# Style par défaut des sous-titres SRT incrustés
+DEFAULT_FORCE_STYLE = subtitle_force_style(None)
+
+def clip_window(clip):
+    """Début et fin (timedelta) de la fenêtre d'un extrait (index, start, duration)"""
+    return clip['start'], clip['start'] + clip['duration']
+
+def clip_events(subtitles, clips):
+    """
+    Sous-titres de chaque extrait, coupés à ses bornes et rebasés sur son début.
+    
+    Un seul parcours des sous-titres, qui doivent être dans l'ordre chronologique (ordre
+    du fichier): un générateur de iter_subtitles_from_srt convient. Un extrait n'est
+    gardé en mémoire que tant que des sous-titres peuvent encore le chevaucher.
+    
+    Returns:
+        Dictionnaire index de l'extrait -> liste de (début, fin, texte), horaires en timedelta
+    """
+    pending = sorted(clips, key=lambda clip: clip['start'])
+    events = {clip['index']: [] for clip in clips}
+    active = []
+    position = 0
+    for sub in subtitles:
+        # Extraits qui commencent avant la fin de ce sous-titre
+        while position < len(pending) and pending[position]['start'] < sub.end:
+            active.append(pending[position])
+            position += 1
+        # Les sous-titres suivants commencent plus tard: les extraits déjà finis sont complets
+        active = [clip for clip in active if clip_window(clip)[1] > sub.start]
+        if not active and position == len(pending):
+            break
+        for clip in active:
+            start, end = clip_window(clip)
+            if sub.start < end and sub.end > start:
+                events[clip['index']].append((max(sub.start, start) - start, min(sub.end, end) - start, sub.content))
+    return events
+
+def compose_srt(events):
+    """Contenu SRT d'une liste de (début, fin, texte)"""
+    return srt.compose([srt.Subtitle(index=i, start=start, end=end, content=text)
+                        for i, (start, end, text) in enumerate(events, 1)])
+
+def _ass_time(value):
+    centiseconds = round(value / timedelta(milliseconds=10))
+    hours, centiseconds = divmod(centiseconds, 360000)
+    minutes, centiseconds = divmod(centiseconds, 6000)
+    seconds, centiseconds = divmod(centiseconds, 100)
+    return f"{hours}:{minutes:02d}:{seconds:02d}.{centiseconds:02d}"
+
+def _ass_text(text):
+    # Accolades: blocs de balises ASS; retours à la ligne: \N
+    return text.replace('{', '(').replace('}', ')').replace('\r', '').replace('\n', '\\N')
+
+def compose_ass(events, options=None):
+    """Contenu ASS d'une liste de (début, fin, texte), avec le style des options de l'éditeur"""
+    options = {**DEFAULT_SUBTITLE_OPTIONS, **(options or {})}
+    primary = ass_colour(options['color'])
+    back = ass_colour(options['backgroundColor'], options['opacity'])
+    lines = [
+        "[Script Info]",
+        "ScriptType: v4.00+",
+        f"PlayResX: {PLAY_RES_X}",
+        f"PlayResY: {PLAY_RES_Y}",
+        "WrapStyle: 0",
+        "",
+        "[V4+ Styles]",
+        "Format: Name, Fontname, Fontsize, PrimaryColour, SecondaryColour, OutlineColour, BackColour, "
+        "Bold, Italic, Underline, StrikeOut, ScaleX, ScaleY, Spacing, Angle, BorderStyle, Outline, Shadow, "
+        "Alignment, MarginL, MarginR, MarginV, Encoding",
+        # BorderStyle 4 (fond opaque derrière le texte), comme force_style
+        f"Style: Default,{options['font']},{options['size']},{primary},{primary},{back},{back},"
+        "0,0,0,0,100,100,0,0,4,1,0,2,10,10,30,1",
+        "",
+        "[Events]",
+        "Format: Layer, Start, End, Style, Name, MarginL, MarginR, MarginV, Effect, Text"
+    ]
+    for start, end, text in events:
+        lines.append(f"Dialogue: 0,{_ass_time(start)},{_ass_time(end)},Default,,0,0,0,,{_ass_text(text)}")
+    return "\n".join(lines) + "\n"
+
+def write_clip_subtitles(subtitles, clips, directory, subtitle_format='srt', options=None, name=None):
+    """
+    Écrit le fichier de sous-titres de chaque extrait.
+    
+    Args:
+        subtitles: Sous-titres de la vidéo complète, dans l'ordre chronologique
+        clips: Extraits (dictionnaires index, start, duration)
+        directory: Dossier des fichiers de sous-titres
+        subtitle_format: 'srt' ou 'ass'
+        options: Style des sous-titres (format 'ass'), comme les options de l'éditeur vidéo
+        name: Fonction extrait -> nom du fichier sans extension (par défaut: segment_XX)
+    
+    Returns:
+        Dictionnaire index de l'extrait -> chemin du fichier; les extraits sans aucun
+        sous-titre n'ont pas de fichier
+    """
+    if subtitle_format not in SUBTITLE_FORMATS:
+        raise ValueError(f"Format de sous-titres inconnu: {subtitle_format} "
+                         f"(formats possibles: {', '.join(SUBTITLE_FORMATS)})")
+    name = name or (lambda clip: f"segment_{clip['index']:02d}")
+    os.makedirs(directory, exist_ok=True)
+    paths = {}
+    by_index = {clip['index']: clip for clip in clips}
+    for index, events in clip_events(subtitles, clips).items():
+        if not events:
+            continue
+        path = os.path.join(directory, f"{name(by_index[index])}.{subtitle_format}")
+        content = compose_ass(events, options) if subtitle_format == 'ass' else compose_srt(events)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(content)
+        paths[index] = path
+    return paths
@@ -0,0 +1,142 @@
+"""
+Dossier de fichiers borné en taille, avec éviction LRU.
+
+Base commune du cache d'analyse (analysis_cache) et du cache des extraits rendus
+(clip_cache): chaque entrée est un fichier du dossier; l'ordre d'utilisation est gardé
+en mémoire et reporté sur la date de modification des fichiers, pour être retrouvé au
+redémarrage. Une même instance peut être partagée entre plusieurs threads, et le dossier
+entre plusieurs processus.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+
+# Âge (secondes) au-delà duquel un fichier temporaire est considéré comme abandonné
+STALE_TEMP_SECONDS = 3600
+
+class DiskLRU:
+    """
+    Args:
+        directory: Dossier des entrées
+        max_bytes: Taille totale maximale des entrées
+        extension: Extension des fichiers d'entrée ('.pkl', '.mp4'...)
+    """
+    
+    def __init__(self, directory, max_bytes, extension):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.extension = extension
+        self._lock = threading.Lock()
+        # Nom de fichier -> taille, du moins au plus récemment utilisé
+        self._entries = OrderedDict()
+        self._size = 0
+        self.evictions = 0
+        os.makedirs(directory, exist_ok=True)
+        self._load_index()
+    
+    def _load_index(self):
+        entries = []
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            try:
+                if name.endswith('.tmp'):
+                    # Écriture interrompue; une écriture récente peut être en cours dans un autre processus
+                    if time.time() - os.path.getmtime(path) > STALE_TEMP_SECONDS:
+                        os.remove(path)
+                elif name.endswith(self.extension):
+                    stat = os.stat(path)
+                    entries.append((stat.st_mtime, name, stat.st_size))
+            except OSError:
+                # Supprimé entre-temps par un autre processus
+                continue
+        with self._lock:
+            for _, name, size in sorted(entries):
+                self._entries[name] = size
+                self._size += size
+        # La limite a pu être abaissée depuis le dernier lancement
+        self._remove_files(self._evict())
+    
+    def reload(self):
+        """Nouvelle lecture du dossier (entrées ajoutées ou supprimées par d'autres processus)"""
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+        self._load_index()
+    
+    def _evict(self):
+        """Retire de l'index les entrées les plus anciennes tant que la limite est dépassée"""
+        evicted = []
+        with self._lock:
+            while self._size > self.max_bytes and len(self._entries) > 1:
+                old_key, old_size = self._entries.popitem(last=False)
+                self._size -= old_size
+                self.evictions += 1
+                evicted.append(old_key)
+        return evicted
+    
+    def _remove_files(self, keys):
+        for key in keys:
+            try:
+                os.remove(os.path.join(self.directory, key))
+            except OSError:
+                pass
+    
+    def _known(self, key):
+        """Entrée présente; une entrée écrite depuis par un autre processus est ajoutée à l'index"""
+        with self._lock:
+            if key in self._entries:
+                return True
+        try:
+            size = os.path.getsize(os.path.join(self.directory, key))
+        except OSError:
+            return False
+        with self._lock:
+            if key not in self._entries:
+                self._entries[key] = size
+                self._size += size
+        return True
+    
+    def _touch(self, key):
+        """Marque une entrée comme la plus récemment utilisée"""
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+        try:
+            os.utime(os.path.join(self.directory, key))
+        except OSError:
+            pass
+    
+    def _temp_path(self, key):
+        """Fichier temporaire où écrire une entrée avant _commit (propre au processus et au thread)"""
+        return f"{os.path.join(self.directory, key)}.{os.getpid()}.{threading.get_ident()}.tmp"
+    
+    def _commit(self, key, temp_path):
+        """Remplace l'entrée par le fichier temporaire écrit, puis supprime les plus anciennes si besoin"""
+        size = os.path.getsize(temp_path)
+        os.replace(temp_path, os.path.join(self.directory, key))
+        with self._lock:
+            self._size += size - self._entries.pop(key, 0)
+            self._entries[key] = size
+        self._remove_files(self._evict())
+    
+    def _forget(self, key):
+        with self._lock:
+            self._size -= self._entries.pop(key, 0)
+    
+    def _usage(self):
+        """Nombre et taille des entrées, évictions (sous le verrou)"""
+        return {
+            'evictions': self.evictions,
+            'entries': len(self._entries),
+            'bytes': self._size,
+            'max_bytes': self.max_bytes
+        }
+    
+    def clear(self):
+        """Supprime toutes les entrées"""
+        with self._lock:
+            keys = list(self._entries)
+            self._entries.clear()
+            self._size = 0
+        self._remove_files(keys)
@@ -1,10 +1,25 @@
 import srt
 import sys
+import os
+import glob
+import time
+import hashlib
+import unicodedata
+import threading
 from pathlib import Path
 import argparse
 from datetime import timedelta
 import json
 import re
+from bisect import bisect_left, bisect_right
+import textwrap
+from collections import OrderedDict, deque
+from collections.abc import Mapping
+from itertools import accumulate, islice
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from clip_subtitles import DEFAULT_FORCE_STYLE, write_clip_subtitles
+from scoring import parse_weights, select_top_quotes
 
 def extract_text_from_srt(file_path):
     with open(file_path, 'r', encoding='utf-8') as f:
@@ -12,6 +27,40 @@ def extract_text_from_srt(file_path):
     full_text = " ".join(sub.content for sub in subtitles)
     return full_text, subtitles
 
+# Ligne de timecode SRT ("00:00:01,000 --> 00:00:02,000") et ligne d'index qui la précède
+SRT_TIMING_LINE = re.compile(r'^\s*[0-9]+[,.:][0-9]+[,.:][0-9]+[,.:]?[0-9]* *-[ -] *>')
+SRT_INDEX_LINE = re.compile(r'^\s*-?[0-9]+\.?[0-9]*\s*$')
+
+def iter_subtitles_from_srt(file_path):
+    """
+    Lit un fichier SRT ligne par ligne et produit les sous-titres au fur et à mesure.
+    
+    Contrairement à extract_text_from_srt, le fichier n'est jamais chargé en entier:
+    seul le bloc en cours de lecture est conservé en mémoire.
+    
+    Args:
+        file_path: Chemin vers le fichier SRT
+    
+    Yields:
+        Objets srt.Subtitle, dans l'ordre du fichier
+    """
+    pending = []
+    has_timing = False
+    with open(file_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if SRT_TIMING_LINE.match(line):
+                if has_timing:
+                    # Un nouveau bloc commence: tout ce qui précède sa ligne d'index est complet
+                    split_at = len(pending)
+                    if split_at and SRT_INDEX_LINE.match(pending[-1]):
+                        split_at -= 1
+                    yield from srt.parse("".join(pending[:split_at]))
+                    del pending[:split_at]
+                has_timing = True
+            pending.append(line)
+    if pending:
+        yield from srt.parse("".join(pending))
+
 def format_timecode(time):
     """Convertit un objet timedelta en format HH:MM:SS"""
     total_seconds = int(time.total_seconds())
@@ -36,72 +85,469 @@ def format_timecode_srt(time):
     milliseconds = int((total_seconds - int(total_seconds)) * 1000)
     return f"{hours:02d}:{minutes:02d}:{seconds:02d},{milliseconds:03d}"
 
-def analyze_sentiment(text):
-    """Analyse basique du sentiment d'un texte"""
-    try:
-        # Essayer d'utiliser TextBlob si disponible (installation: pip install textblob)
-        from textblob import TextBlob
-        blob = TextBlob(text)
+# Les sous-titres SRT sont à la milliseconde: les temps internes sont des entiers
+ONE_MILLISECOND = timedelta(milliseconds=1)
+
+def to_milliseconds(time):
+    """Convertit un timedelta en nombre entier de millisecondes"""
+    return time // ONE_MILLISECOND
+
+def from_milliseconds(milliseconds):
+    """Convertit un nombre de millisecondes en timedelta"""
+    return timedelta(milliseconds=milliseconds)
+
+def _keyword_sentiment(text):
+    """Analyse basique basée sur des mots-clés si TextBlob n'est pas disponible"""
+    positive_words = ['excellent', 'incroyable', 'fantastique', 'génial', 'super', 'important', 
+                      'crucial', 'essentiel', 'clé', 'révolutionnaire', 'extraordinaire', 'remarquable']
+    negative_words = ['terrible', 'horrible', 'catastrophique', 'désastreux', 'problématique', 
+                      'difficile', 'critique', 'grave', 'inquiétant', 'alarmant']
+    emphasis_words = ['très', 'extrêmement', 'absolument', 'totalement', 'complètement', 'vraiment']
+    
+    text_lower = text.lower()
+    positive_count = sum(1 for word in positive_words if word in text_lower)
+    negative_count = sum(1 for word in negative_words if word in text_lower)
+    emphasis_count = sum(1 for word in emphasis_words if word in text_lower)
+    
+    total_words = len(re.findall(r'\b\w+\b', text_lower))
+    polarity = (positive_count - negative_count) / max(1, total_words) * 5
+    intensity = (positive_count + negative_count + emphasis_count) / max(1, total_words) * 5
+    
+    return {
+        'polarity': max(-1, min(1, polarity)),  # Limiter entre -1 et 1
+        'subjectivity': intensity,
+        'is_intense': polarity > 0.3 or intensity > 0.3
+    }
+
+class SentimentEngine:
+    """
+    Analyse de sentiment réutilisable.
+    
+    Le backend (TextBlob si disponible, sinon l'analyse par mots-clés) est chargé une
+    seule fois. Les résultats sont gardés dans un cache LRU borné, indexé par une
+    empreinte du texte, si bien qu'une nouvelle extraction avec d'autres paramètres ne
+    ré-analyse pas les passages déjà vus. Le temps passé est cumulé dans `stats()`.
+    
+    Une même instance peut être partagée entre plusieurs threads (application Flask).
+    """
+    
+    def __init__(self, cache_size=10000):
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.texts = 0
+        self.cache_hits = 0
+        self.seconds = 0.0
+        self.last_call_seconds = 0.0
+        try:
+            # Essayer d'utiliser TextBlob si disponible (installation: pip install textblob)
+            from textblob.sentiments import PatternAnalyzer
+            self._analyzer = PatternAnalyzer()
+            self.backend = 'textblob'
+        except ImportError:
+            self._analyzer = None
+            self.backend = 'keywords'
+    
+    def _score(self, text):
+        if self._analyzer is None:
+            return _keyword_sentiment(text)
+        sentiment = self._analyzer.analyze(text)
         return {
-            'polarity': blob.sentiment.polarity,  # -1 à 1 (négatif à positif)
-            'subjectivity': blob.sentiment.subjectivity,  # 0 à 1 (objectif à subjectif)
-            'is_intense': abs(blob.sentiment.polarity) > 0.3 or blob.sentiment.subjectivity > 0.6
+            'polarity': sentiment.polarity,  # -1 à 1 (négatif à positif)
+            'subjectivity': sentiment.subjectivity,  # 0 à 1 (objectif à subjectif)
+            'is_intense': abs(sentiment.polarity) > 0.3 or sentiment.subjectivity > 0.6
         }
-    except ImportError:
-        # Analyse basique basée sur des mots-clés si TextBlob n'est pas disponible
-        positive_words = ['excellent', 'incroyable', 'fantastique', 'génial', 'super', 'important', 
-                          'crucial', 'essentiel', 'clé', 'révolutionnaire', 'extraordinaire', 'remarquable']
-        negative_words = ['terrible', 'horrible', 'catastrophique', 'désastreux', 'problématique', 
-                          'difficile', 'critique', 'grave', 'inquiétant', 'alarmant']
-        emphasis_words = ['très', 'extrêmement', 'absolument', 'totalement', 'complètement', 'vraiment']
+    
+    def analyze(self, text):
+        """Analyse un seul texte"""
+        return self.analyze_batch([text])[0]
+    
+    def analyze_batch(self, texts):
+        """
+        Analyse une liste de textes en un appel.
         
-        text_lower = text.lower()
-        positive_count = sum(1 for word in positive_words if word in text_lower)
-        negative_count = sum(1 for word in negative_words if word in text_lower)
-        emphasis_count = sum(1 for word in emphasis_words if word in text_lower)
+        Returns:
+            Liste de dictionnaires (polarity, subjectivity, is_intense), dans l'ordre de `texts`
+        """
+        started = time.perf_counter()
+        keys = [hashlib.blake2b(text.encode('utf-8'), digest_size=16).digest() for text in texts]
+        results = [None] * len(texts)
+        missing = {}
+        with self._lock:
+            for i, key in enumerate(keys):
+                cached = self._cache.get(key)
+                if cached is not None:
+                    self._cache.move_to_end(key)
+                    results[i] = cached
+                    self.cache_hits += 1
+                else:
+                    missing.setdefault(key, []).append(i)
         
-        total_words = len(re.findall(r'\b\w+\b', text_lower))
-        polarity = (positive_count - negative_count) / max(1, total_words) * 5
-        intensity = (positive_count + negative_count + emphasis_count) / max(1, total_words) * 5
+        # Les textes identiques d'un même lot ne sont analysés qu'une fois
+        computed = {key: self._score(texts[indices[0]]) for key, indices in missing.items()}
         
+        with self._lock:
+            for key, sentiment_data in computed.items():
+                for i in missing[key]:
+                    results[i] = sentiment_data
+                self._cache[key] = sentiment_data
+                self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+            
+            self.calls += 1
+            self.texts += len(texts)
+            self.last_call_seconds = time.perf_counter() - started
+            self.seconds += self.last_call_seconds
+        # Chaque appelant reçoit sa propre copie des résultats mis en cache
+        return [dict(result) for result in results]
+    
+    def stats(self):
+        """Compteurs cumulés depuis la création du moteur"""
         return {
-            'polarity': max(-1, min(1, polarity)),  # Limiter entre -1 et 1
-            'subjectivity': intensity,
-            'is_intense': polarity > 0.3 or intensity > 0.3
+            'backend': self.backend,
+            'calls': self.calls,
+            'texts': self.texts,
+            'cache_hits': self.cache_hits,
+            'cache_size': len(self._cache),
+            'seconds': self.seconds,
+            'last_call_seconds': self.last_call_seconds
         }
 
-def detect_topic_changes(subtitles, window_size=5):
-    """Détecte les changements de sujet dans les sous-titres"""
-    if len(subtitles) < window_size * 2:
+_default_sentiment_engine = None
+
+def get_sentiment_engine():
+    """Moteur de sentiment partagé par défaut (créé au premier appel)"""
+    global _default_sentiment_engine
+    if _default_sentiment_engine is None:
+        _default_sentiment_engine = SentimentEngine()
+    return _default_sentiment_engine
+
+def analyze_sentiment(text):
+    """Analyse basique du sentiment d'un texte"""
+    return get_sentiment_engine().analyze(text)
+
+WORD_PATTERN = re.compile(r'\b\w+\b')
+
+def tokenize_subtitle(content):
+    """Ensemble des mots (en minuscules) d'un sous-titre"""
+    return set(WORD_PATTERN.findall(content.lower()))
+
+class SlidingVocabulary:
+    """
+    Vocabulaire de deux fenêtres adjacentes de sous-titres (avant / après).
+    
+    Chaque fenêtre compte, pour chaque mot, le nombre de sous-titres qui le contiennent.
+    Le nombre de mots communs aux deux fenêtres est tenu à jour à chaque entrée ou
+    sortie d'un sous-titre, si bien que la différence de Jaccard s'obtient en O(1)
+    et qu'un pas de glissement ne coûte que le nombre de mots des sous-titres déplacés.
+    """
+    
+    def __init__(self):
+        self.before = {}
+        self.after = {}
+        self.common = 0
+    
+    def _add(self, window, other, words):
+        for word in words:
+            count = window.get(word, 0)
+            window[word] = count + 1
+            if count == 0 and word in other:
+                self.common += 1
+    
+    def _remove(self, window, other, words):
+        for word in words:
+            count = window[word] - 1
+            if count:
+                window[word] = count
+            else:
+                del window[word]
+                if word in other:
+                    self.common -= 1
+    
+    def add_before(self, words):
+        self._add(self.before, self.after, words)
+    
+    def add_after(self, words):
+        self._add(self.after, self.before, words)
+    
+    def slide(self, leaving_before, crossing, entering_after):
+        """Avance les deux fenêtres d'un sous-titre"""
+        self._remove(self.before, self.after, leaving_before)
+        self._remove(self.after, self.before, crossing)
+        self._add(self.before, self.after, crossing)
+        self._add(self.after, self.before, entering_after)
+    
+    def difference_ratio(self):
+        """1 - Jaccard des deux vocabulaires, ou None si une fenêtre est vide"""
+        if not self.before or not self.after:
+            return None
+        all_words = len(self.before) + len(self.after) - self.common
+        return 1 - (self.common / all_words)
+
+def iter_topic_flags(subtitles, window_size=5, threshold=0.7):
+    """
+    Détecte les changements de sujet au fil des sous-titres.
+    
+    Chaque sous-titre est découpé en mots une seule fois; les vocabulaires des fenêtres
+    avant/après sont mis à jour par SlidingVocabulary au lieu d'être recalculés. Seuls
+    les 2 * window_size + 1 derniers sous-titres sont gardés en mémoire.
+    
+    Args:
+        subtitles: Itérable de sous-titres
+        window_size: Nombre de sous-titres de chaque fenêtre
+        threshold: Différence de vocabulaire au-delà de laquelle on signale un changement
+    
+    Yields:
+        Tuples (sous-titre, is_topic_change), dans l'ordre d'entrée
+    """
+    vocabulary = SlidingVocabulary()
+    # Chaque entrée est [sous-titre, mots, is_topic_change]. Quand le buffer est plein,
+    # l'entrée en position window_size est celle dont on peut décider
+    buffer = deque()
+    for sub in subtitles:
+        words = tokenize_subtitle(sub.content)
+        if len(buffer) == 2 * window_size:
+            ratio = vocabulary.difference_ratio()
+            buffer[window_size][2] = ratio is not None and ratio > threshold
+            vocabulary.slide(buffer[0][1], buffer[window_size][1], words)
+            # Le plus ancien sous-titre ne servira plus à aucune fenêtre
+            oldest = buffer.popleft()
+            yield oldest[0], oldest[2]
+        elif len(buffer) < window_size:
+            vocabulary.add_before(words)
+        else:
+            vocabulary.add_after(words)
+        buffer.append([sub, words, False])
+    
+    # Les derniers sous-titres n'ont pas de fenêtre complète après eux
+    while buffer:
+        oldest = buffer.popleft()
+        yield oldest[0], oldest[2]
+
+def detect_topic_changes(subtitles, window_size=5, threshold=0.7):
+    """
+    Détecte les changements de sujet dans les sous-titres
+    
+    Returns:
+        Liste triée des indices des sous-titres qui ouvrent un nouveau sujet
+    """
+    return [i for i, (_, is_change) in enumerate(iter_topic_flags(subtitles, window_size, threshold)) if is_change]
+
+def has_topic_change(topic_changes, start_index, end_index):
+    """Indique si un indice de la liste triée topic_changes est compris dans [start_index, end_index]"""
+    position = bisect_left(topic_changes, start_index)
+    return position < len(topic_changes) and topic_changes[position] <= end_index
+
+def detect_topic_changes_tfidf(subtitles, window_size=10, smoothing=3, min_depth=0.1):
+    """
+    Détecte les changements de sujet par similarité TF-IDF (méthode TextTiling).
+    
+    Une seule matrice TF-IDF creuse est construite pour tous les sous-titres. Les vecteurs
+    des fenêtres avant/après chaque position sont obtenus par un produit avec une matrice
+    de fenêtrage, puis leurs similarités cosinus sont calculées en une opération. La
+    courbe est lissée et les frontières sont les creux dont la profondeur (écart aux
+    sommets voisins) se détache nettement de celle des autres creux.
+    
+    Nécessite numpy et scikit-learn; sans eux, revient à detect_topic_changes.
+    
+    Args:
+        subtitles: Liste des sous-titres (ou de passages, tout objet avec .content)
+        window_size: Nombre de sous-titres de chaque fenêtre
+        smoothing: Largeur de la moyenne glissante appliquée à la courbe de similarité
+        min_depth: Profondeur minimale d'un creux pour être retenu
+    
+    Returns:
+        Liste triée des indices des sous-titres qui ouvrent un nouveau sujet
+    """
+    try:
+        import numpy as np
+        from scipy import sparse
+        from sklearn.feature_extraction.text import TfidfVectorizer
+    except ImportError:
+        print("Note: scikit-learn n'est pas installé, utilisation de la détection par vocabulaire")
+        return detect_topic_changes(subtitles)
+    
+    n = len(subtitles)
+    if n < window_size * 2 + 1:
         return []
     
-    topic_changes = []
+    try:
+        matrix = TfidfVectorizer(token_pattern=r'(?u)\b\w+\b', sublinear_tf=True).fit_transform(
+            [sub.content for sub in subtitles])
+    except ValueError:
+        # Aucun mot dans toute la transcription
+        return []
     
-    for i in range(window_size, len(subtitles) - window_size):
-        # Texte avant et après la position actuelle
-        before_text = " ".join(sub.content for sub in subtitles[i-window_size:i])
-        after_text = " ".join(sub.content for sub in subtitles[i:i+window_size])
-        
-        # Mots uniques avant et après
-        before_words = set(re.findall(r'\b\w+\b', before_text.lower()))
-        after_words = set(re.findall(r'\b\w+\b', after_text.lower()))
+    # Positions évaluées, comme detect_topic_changes: window_size <= i < n - window_size
+    positions = np.arange(window_size, n - window_size)
+    rows = np.repeat(np.arange(len(positions)), window_size)
+    offsets = np.tile(np.arange(window_size), len(positions))
+    ones = np.ones(len(rows))
+    shape = (len(positions), n)
+    before = sparse.csr_matrix((ones, (rows, np.repeat(positions - window_size, window_size) + offsets)), shape=shape) @ matrix
+    after = sparse.csr_matrix((ones, (rows, np.repeat(positions, window_size) + offsets)), shape=shape) @ matrix
+    
+    dots = np.asarray(before.multiply(after).sum(axis=1)).ravel()
+    norms = np.sqrt(np.asarray(before.multiply(before).sum(axis=1)).ravel() *
+                    np.asarray(after.multiply(after).sum(axis=1)).ravel())
+    # Une fenêtre sans aucun mot n'indique pas de changement
+    similarity = np.divide(dots, norms, out=np.ones_like(dots), where=norms > 0)
+    if smoothing > 1:
+        similarity = np.convolve(np.pad(similarity, smoothing // 2, mode='edge'),
+                                 np.ones(smoothing) / smoothing, mode='valid')[:len(positions)]
+    
+    # Profondeur de chaque point: écart aux sommets des voisinages gauche et droit
+    padded = np.pad(similarity, window_size, mode='edge')
+    windows = np.lib.stride_tricks.sliding_window_view(padded, 2 * window_size + 1)
+    depth = windows[:, :window_size + 1].max(axis=1) + windows[:, window_size:].max(axis=1) - 2 * similarity
+    
+    is_valley = np.ones(len(similarity), dtype=bool)
+    is_valley[1:] &= similarity[1:] <= similarity[:-1]
+    is_valley[:-1] &= similarity[:-1] <= similarity[1:]
+    valley_depths = depth[is_valley]
+    cutoff = max(valley_depths.mean() + valley_depths.std(), min_depth)
+    candidates = np.flatnonzero(is_valley & (depth > cutoff))
+    
+    # Garder le creux le plus profond quand plusieurs sont à moins d'une fenêtre d'écart
+    kept = []
+    for candidate in candidates[np.argsort(-depth[candidates], kind='stable')]:
+        if all(abs(candidate - other) >= window_size for other in kept):
+            kept.append(candidate)
+    
+    return sorted(int(positions[i]) for i in kept)
+
+TOPIC_ENGINES = {
+    'jaccard': detect_topic_changes,
+    'tfidf': detect_topic_changes_tfidf
+}
+
+class Passage(Mapping):
+    """
+    Passage de sous-titres consécutifs.
+    
+    Les temps sont des millisecondes entières et les sous-titres ne sont pas copiés: le
+    passage garde la plage d'indices [start_index, end_index] dans la séquence `source`
+    (la liste complète des sous-titres, ou en flux la seule liste des sous-titres du
+    passage, dont le premier a l'indice `offset`). Les clés historiques du dictionnaire
+    ('start_time', 'subtitles', ...) restent accessibles et sont calculées à la demande.
+    """
+    __slots__ = ('content', 'start_ms', 'end_ms', 'start_index', 'end_index', 'source', 'offset')
+    
+    def __init__(self, content, start_ms, end_ms, start_index, end_index, source, offset=0):
+        self.content = content
+        self.start_ms = start_ms
+        self.end_ms = end_ms
+        self.start_index = start_index
+        self.end_index = end_index
+        self.source = source
+        self.offset = offset
+    
+    @property
+    def subtitles(self):
+        return self.source[self.start_index - self.offset:self.end_index - self.offset + 1]
+    
+    def __getitem__(self, key):
+        try:
+            return _PASSAGE_FIELDS[key](self)
+        except KeyError:
+            raise KeyError(key) from None
+    
+    def __iter__(self):
+        return iter(_PASSAGE_FIELDS)
+    
+    def __len__(self):
+        return len(_PASSAGE_FIELDS)
+    
+    def __repr__(self):
+        return f"Passage({self.start_index}-{self.end_index}, {self.start_ms}-{self.end_ms} ms, {self.content[:30]!r})"
+
+_PASSAGE_FIELDS = {
+    'content': lambda p: p.content,
+    'start_time': lambda p: from_milliseconds(p.start_ms),
+    'end_time': lambda p: from_milliseconds(p.end_ms),
+    'start_index': lambda p: p.start_index,
+    'end_index': lambda p: p.end_index,
+    'subtitles': lambda p: p.subtitles
+}
+
+def iter_passages(subtitles, max_gap_seconds=3.0, min_passage_length=500, max_passage_length=2000,
+                  on_discard=None):
+    """
+    Version en flux de group_subtitles_into_passages.
+    
+    Accepte n'importe quel itérable de sous-titres et produit chaque passage dès qu'il
+    est terminé, sans conserver les passages précédents.
+    
+    Args:
+        on_discard: Appelée avec chaque passage terminé mais écarté (trop court)
+    """
+    # Avec une liste, les passages référencent directement ses éléments
+    source = subtitles if isinstance(subtitles, list) else None
+    max_gap = timedelta(seconds=max_gap_seconds)
+    current_passage = None
+    # Texte et dernier sous-titre du passage en cours: le texte est joint une seule fois
+    parts = []
+    passage_length = 0
+    last_sub = None
+    
+    def close(passage):
+        passage.content = " ".join(parts)
+        passage.end_ms = to_milliseconds(last_sub.end)
+        return passage
+    
+    for index, current_sub in enumerate(subtitles):
+        if current_passage is None:
+            current_passage = _new_passage(current_sub, index, source)
+            parts = [current_sub.content]
+            passage_length = len(current_sub.content)
+            last_sub = current_sub
+            continue
         
-        # Calculer la différence entre les ensembles de mots
-        if len(before_words) > 0 and len(after_words) > 0:
-            common_words = before_words.intersection(after_words)
-            all_words = before_words.union(after_words)
-            difference_ratio = 1 - (len(common_words) / len(all_words))
+        # Si l'écart est trop grand ou si le passage devient trop long, on termine le passage actuel
+        if current_sub.start - last_sub.end > max_gap or passage_length + len(current_sub.content) > max_passage_length:
+            # Ne garder le passage que s'il est assez long
+            if passage_length >= min_passage_length:
+                yield close(current_passage)
+            elif on_discard:
+                on_discard(current_passage)
             
-            # Si la différence est significative, c'est peut-être un changement de sujet
-            if difference_ratio > 0.7:  # Seuil ajustable
-                topic_changes.append(i)
+            # Commencer un nouveau passage
+            current_passage = _new_passage(current_sub, index, source)
+            parts = [current_sub.content]
+            passage_length = len(current_sub.content)
+        else:
+            # Ajouter au passage actuel
+            parts.append(current_sub.content)
+            passage_length += 1 + len(current_sub.content)
+            current_passage.end_index = index
+            if source is None:
+                current_passage.source.append(current_sub)
+        last_sub = current_sub
     
-    return topic_changes
+    # Ajouter le dernier passage s'il est assez long
+    if current_passage is not None and passage_length >= min_passage_length:
+        yield close(current_passage)
+    elif current_passage is not None and on_discard:
+        on_discard(current_passage)
+
+def _new_passage(sub, index, source=None):
+    if source is None:
+        # En flux, le passage ne garde que ses propres sous-titres
+        return Passage(sub.content, to_milliseconds(sub.start), to_milliseconds(sub.end), index, index, [sub], index)
+    return Passage(sub.content, to_milliseconds(sub.start), to_milliseconds(sub.end), index, index, source)
 
 def group_subtitles_into_passages(subtitles, max_gap_seconds=3.0, min_passage_length=500, max_passage_length=2000):
     """
     Regroupe les sous-titres consécutifs en passages plus longs et cohérents.
     
+    Les écarts entre sous-titres et les longueurs cumulées (sommes préfixes) sont calculés
+    une fois pour toute la liste: les coupures dues aux écarts sont trouvées en un seul
+    parcours, celles dues à la longueur maximale par une recherche dichotomique dans les
+    longueurs cumulées, et le texte de chaque passage n'est joint qu'une fois. Le
+    résultat est identique à celui de iter_passages.
+    
     Args:
         subtitles: Liste des sous-titres
         max_gap_seconds: Écart maximal en secondes entre deux sous-titres pour les considérer comme faisant partie du même passage
@@ -109,156 +555,348 @@ def group_subtitles_into_passages(subtitles, max_gap_seconds=3.0, min_passage_le
         max_passage_length: Longueur maximale en caractères pour un passage
     
     Returns:
-        Liste de passages, chaque passage étant un dictionnaire avec le contenu et les timecodes
+        Liste de passages (Passage, lisibles comme des dictionnaires) avec le contenu, les
+        timecodes et les indices (start_index, end_index) de leurs sous-titres
     """
-    if not subtitles:
+    subtitles = subtitles if isinstance(subtitles, list) else list(subtitles)
+    n = len(subtitles)
+    if n == 0:
         return []
     
-    passages = []
-    current_passage = {
-        'content': subtitles[0].content,
-        'start_time': subtitles[0].start,
-        'end_time': subtitles[0].end,
-        'subtitles': [subtitles[0]]
-    }
+    contents = [sub.content for sub in subtitles]
+    # cumulative[i]: longueur des i premiers textes, chacun suivi d'un séparateur
+    cumulative = list(accumulate(map(len, contents), lambda total, length: total + length + 1, initial=0))
     
-    for i in range(1, len(subtitles)):
-        current_sub = subtitles[i]
-        gap = (current_sub.start - current_passage['end_time']).total_seconds()
-        
-        # Si l'écart est trop grand ou si le passage devient trop long, on termine le passage actuel
-        passage_length = len(current_passage['content'])
-        if gap > max_gap_seconds or passage_length + len(current_sub.content) > max_passage_length:
-            # Ne garder le passage que s'il est assez long
-            if passage_length >= min_passage_length:
-                passages.append(current_passage)
+    # Sous-titres qui suivent un écart trop grand: ils ouvrent toujours un passage
+    max_gap = timedelta(seconds=max_gap_seconds)
+    gap_breaks = [i for i, (previous, sub) in enumerate(zip(subtitles, islice(subtitles, 1, None)), 1)
+                  if sub.start - previous.end > max_gap]
+    gap_breaks.append(n)
+    
+    passages = []
+    start = 0
+    for segment_end in gap_breaks:
+        while start < segment_end:
+            # Le sous-titre i (> start) ferme le passage si la longueur de [start, i) plus la
+            # sienne dépasse le maximum, soit cumulative[i + 1] - cumulative[start] - 2 > max
+            end = bisect_right(cumulative, cumulative[start] + max_passage_length + 2) - 1
+            end = min(max(end, start + 1), segment_end)
             
-            # Commencer un nouveau passage
-            current_passage = {
-                'content': current_sub.content,
-                'start_time': current_sub.start,
-                'end_time': current_sub.end,
-                'subtitles': [current_sub]
-            }
+            if cumulative[end] - cumulative[start] - 1 >= min_passage_length:
+                passages.append(Passage(" ".join(contents[start:end]), to_milliseconds(subtitles[start].start),
+                                        to_milliseconds(subtitles[end - 1].end), start, end - 1, subtitles))
+            start = end
+    
+    return passages
+
+class _FoldTable(dict):
+    """
+    Table de str.translate qui met en minuscules et retire les accents, caractère par
+    caractère et sans changer la longueur du texte (les positions restent valables).
+    Chaque caractère n'est calculé qu'une fois.
+    """
+    
+    def __missing__(self, code):
+        char = chr(code)
+        lower = char.lower()
+        base = "".join(c for c in unicodedata.normalize('NFKD', lower) if not unicodedata.combining(c))
+        if len(base) == 1:
+            folded = base
+        elif len(lower) == 1:
+            folded = lower
         else:
-            # Ajouter au passage actuel
-            current_passage['content'] += " " + current_sub.content
-            current_passage['end_time'] = current_sub.end
-            current_passage['subtitles'].append(current_sub)
+            folded = char
+        self[code] = folded
+        return folded
+
+_FOLD_TABLE = _FoldTable()
+
+def fold_text(text):
+    """Texte en minuscules et sans accents, de même longueur que l'original"""
+    return text.translate(_FOLD_TABLE)
+
+class KeywordMatcher:
+    """
+    Index de mots-clés construit une fois par extraction.
     
-    # Ajouter le dernier passage s'il est assez long
-    if len(current_passage['content']) >= min_passage_length:
-        passages.append(current_passage)
+    Tous les mots-clés sont compilés en une seule expression régulière (alternative,
+    du plus long au plus court) appliquée au texte sans accents ni majuscules: chaque
+    passage est parcouru une seule fois, quel que soit le nombre de mots-clés. Les
+    correspondances respectent les limites de mots et les espaces d'un mot-clé
+    composé acceptent n'importe quel blanc (retour à la ligne d'un sous-titre).
+    """
     
-    return passages
+    def __init__(self, keywords):
+        # Forme normalisée -> mot-clé tel que saisi (le premier l'emporte en cas de doublon)
+        self.keywords = {}
+        for keyword in keywords:
+            normalized = " ".join(fold_text(keyword).split())
+            if normalized and normalized not in self.keywords:
+                self.keywords[normalized] = keyword.strip()
+        
+        alternatives = [r'\s+'.join(re.escape(part) for part in normalized.split())
+                        for normalized in sorted(self.keywords, key=len, reverse=True)]
+        self.pattern = re.compile(r'(?<!\w)(?:' + '|'.join(alternatives) + r')(?!\w)') if alternatives else None
+    
+    def find(self, text):
+        """
+        Cherche tous les mots-clés dans `text`.
+        
+        Returns:
+            Liste de tuples (mot-clé, début, fin), positions dans `text`, dans l'ordre du texte
+        """
+        if self.pattern is None:
+            return []
+        return [(self.keywords[" ".join(match.group().split())], match.start(), match.end())
+                for match in self.pattern.finditer(fold_text(text))]
 
-def extract_quotes(subtitles, min_length=120, keywords=None, use_sentiment=False, topic_detection=False, group_subtitles=True, max_gap_seconds=3.0):
-    """Extrait les citations importantes avec leurs timecodes"""
-    quotes = []
-    topic_changes = []
+def build_keyword_matcher(keywords):
+    """KeywordMatcher pour une liste de mots-clés, ou None si la liste est vide"""
+    if isinstance(keywords, KeywordMatcher):
+        return keywords
+    if not keywords:
+        return None
+    matcher = KeywordMatcher(keywords)
+    return matcher if matcher.pattern is not None else None
+
+class Quote(Mapping):
+    """
+    Citation retenue par extract_quotes.
     
-    if topic_detection:
-        topic_changes = detect_topic_changes(subtitles)
+    Enregistrement compact (temps en millisecondes entières, critères optionnels dans
+    `extra`) qui se lit comme l'ancien dictionnaire: quote['start_time'],
+    quote['formatted_start'], quote.get('is_intense')... Les timedelta et les timecodes
+    ne sont calculés qu'à la lecture, donc uniquement pour les citations exportées.
+    """
+    __slots__ = ('content', 'start_ms', 'end_ms', 'is_long', 'has_keyword', 'is_topic_change', 'extra')
+    
+    def __init__(self, content, start_ms, end_ms, is_long=False, has_keyword=False, is_topic_change=False, extra=None):
+        self.content = content
+        self.start_ms = start_ms
+        self.end_ms = end_ms
+        self.is_long = is_long
+        self.has_keyword = has_keyword
+        self.is_topic_change = is_topic_change
+        # Clés présentes seulement si l'option correspondante est active (mots-clés, sentiment)
+        self.extra = extra
+    
+    @property
+    def duration_ms(self):
+        return self.end_ms - self.start_ms
+    
+    def __getitem__(self, key):
+        field = _QUOTE_FIELDS.get(key)
+        if field is not None:
+            return field(self)
+        if self.extra and key in self.extra:
+            return self.extra[key]
+        raise KeyError(key)
     
+    def __iter__(self):
+        yield from _QUOTE_FIELDS
+        if self.extra:
+            yield from self.extra
+    
+    def __len__(self):
+        return len(_QUOTE_FIELDS) + (len(self.extra) if self.extra else 0)
+    
+    def to_dict(self):
+        """Dictionnaire complet, comme le renvoyaient les versions précédentes"""
+        return dict(self)
+    
+    def __repr__(self):
+        return f"Quote({self.start_ms}-{self.end_ms} ms, {self.content[:30]!r})"
+
+_QUOTE_FIELDS = {
+    'content': lambda q: q.content,
+    'start_time': lambda q: from_milliseconds(q.start_ms),
+    'end_time': lambda q: from_milliseconds(q.end_ms),
+    'duration': lambda q: from_milliseconds(q.end_ms - q.start_ms),
+    'formatted_start': lambda q: format_timecode(from_milliseconds(q.start_ms)),
+    'formatted_end': lambda q: format_timecode(from_milliseconds(q.end_ms)),
+    'ffmpeg_start': lambda q: format_ffmpeg_time(from_milliseconds(q.start_ms)),
+    'ffmpeg_end': lambda q: format_ffmpeg_time(from_milliseconds(q.end_ms)),
+    'is_long': lambda q: q.is_long,
+    'has_keyword': lambda q: q.has_keyword,
+    'is_topic_change': lambda q: q.is_topic_change
+}
+
+def _evaluate_candidate(content, start_ms, end_ms, min_length, keyword_matcher, sentiment_data, is_topic_change):
+    """
+    Applique les critères de sélection à un texte candidat.
+    
+    Args:
+        start_ms, end_ms: Début et fin du candidat en millisecondes
+        keyword_matcher: KeywordMatcher de l'extraction, ou None sans mots-clés
+        sentiment_data: Résultat de SentimentEngine pour ce texte, ou None sans analyse de sentiment
+    
+    Returns:
+        La citation (Quote) si au moins un critère est rempli, sinon None
+    """
+    # Critères de sélection
+    is_long_enough = len(content) > min_length
+    keyword_matches = keyword_matcher.find(content) if keyword_matcher else []
+    has_keyword = bool(keyword_matches)
+    
+    is_intense = bool(sentiment_data and sentiment_data['is_intense'])
+    
+    # Sélectionner si au moins un critère est rempli
+    if not (is_long_enough or has_keyword or is_intense or is_topic_change):
+        return None
+    
+    extra = None
+    
+    if keyword_matcher:
+        matched_keywords = {}
+        for keyword, _, _ in keyword_matches:
+            matched_keywords[keyword] = matched_keywords.get(keyword, 0) + 1
+        extra = {
+            'keyword_hits': len(keyword_matches),
+            'matched_keywords': matched_keywords,
+            'keyword_spans': [[start, end] for _, start, end in keyword_matches]
+        }
+    
+    if sentiment_data:
+        if extra is None:
+            extra = {}
+        extra.update({
+            'sentiment_polarity': sentiment_data['polarity'],
+            'sentiment_subjectivity': sentiment_data['subjectivity'],
+            'is_intense': is_intense
+        })
+    
+    return Quote(content, start_ms, end_ms, is_long_enough, has_keyword, is_topic_change, extra)
+
+def build_candidates(subtitles, group_subtitles=True, max_gap_seconds=3.0):
+    """
+    Textes candidats à l'extraction: les passages regroupés, ou chaque sous-titre.
+    
+    Returns:
+        Liste de tuples (contenu, début en ms, fin en ms, indice du premier sous-titre,
+        indice du dernier sous-titre)
+    """
     # Si on regroupe les sous-titres, on travaille sur des passages plutôt que des sous-titres individuels
     if group_subtitles:
         passages = group_subtitles_into_passages(subtitles, max_gap_seconds=max_gap_seconds)
-        
-        for passage in passages:
-            content = passage['content'].strip()
-            
-            # Critères de sélection
-            is_long_enough = len(content) > min_length
-            has_keyword = False
-            if keywords:
-                has_keyword = any(keyword.lower() in content.lower() for keyword in keywords)
-            
-            is_intense = False
-            sentiment_data = None
-            if use_sentiment:
-                sentiment_data = analyze_sentiment(content)
-                is_intense = sentiment_data['is_intense']
-            
-            # Vérifier si le passage contient un changement de sujet
-            is_topic_change = any(i in topic_changes for i in range(len(passage['subtitles'])))
-            
-            # Sélectionner si au moins un critère est rempli
-            if is_long_enough or has_keyword or is_intense or is_topic_change:
-                quote_data = {
-                    'content': content,
-                    'start_time': passage['start_time'],
-                    'end_time': passage['end_time'],
-                    'duration': passage['end_time'] - passage['start_time'],
-                    'formatted_start': format_timecode(passage['start_time']),
-                    'formatted_end': format_timecode(passage['end_time']),
-                    'ffmpeg_start': format_ffmpeg_time(passage['start_time']),
-                    'ffmpeg_end': format_ffmpeg_time(passage['end_time']),
-                    'is_long': is_long_enough,
-                    'has_keyword': has_keyword,
-                    'is_topic_change': is_topic_change
-                }
-                
-                if sentiment_data:
-                    quote_data.update({
-                        'sentiment_polarity': sentiment_data['polarity'],
-                        'sentiment_subjectivity': sentiment_data['subjectivity'],
-                        'is_intense': is_intense
-                    })
-                
-                quotes.append(quote_data)
-    else:
-        # Méthode originale: traiter chaque sous-titre individuellement
-        for i, sub in enumerate(subtitles):
-            content = sub.content.strip()
-            
-            # Critères de sélection
-            is_long_enough = len(content) > min_length
-            has_keyword = False
-            if keywords:
-                has_keyword = any(keyword.lower() in content.lower() for keyword in keywords)
-            
-            is_intense = False
-            sentiment_data = None
-            if use_sentiment:
-                sentiment_data = analyze_sentiment(content)
-                is_intense = sentiment_data['is_intense']
-            
-            is_topic_change = i in topic_changes
-            
-            # Sélectionner si au moins un critère est rempli
-            if is_long_enough or has_keyword or is_intense or is_topic_change:
-                quote_data = {
-                    'content': content,
-                    'start_time': sub.start,
-                    'end_time': sub.end,
-                    'duration': sub.end - sub.start,
-                    'formatted_start': format_timecode(sub.start),
-                    'formatted_end': format_timecode(sub.end),
-                    'ffmpeg_start': format_ffmpeg_time(sub.start),
-                    'ffmpeg_end': format_ffmpeg_time(sub.end),
-                    'is_long': is_long_enough,
-                    'has_keyword': has_keyword,
-                    'is_topic_change': is_topic_change
-                }
-                
-                if sentiment_data:
-                    quote_data.update({
-                        'sentiment_polarity': sentiment_data['polarity'],
-                        'sentiment_subjectivity': sentiment_data['subjectivity'],
-                        'is_intense': is_intense
-                    })
-                
-                quotes.append(quote_data)
+        return [(passage.content.strip(), passage.start_ms, passage.end_ms, passage.start_index, passage.end_index)
+                for passage in passages]
+    # Méthode originale: traiter chaque sous-titre individuellement
+    return [(sub.content.strip(), to_milliseconds(sub.start), to_milliseconds(sub.end), i, i)
+            for i, sub in enumerate(subtitles)]
+
+def evaluate_candidates(candidates, min_length=120, keywords=None, sentiments=None, topic_changes=()):
+    """
+    Applique les critères de sélection à des candidats de build_candidates.
+    
+    Args:
+        sentiments: Analyses de sentiment des candidats (même ordre), ou None
+        topic_changes: Liste triée des indices de sous-titres qui ouvrent un nouveau sujet
+    
+    Returns:
+        Liste des citations (Quote) retenues
+    """
+    if sentiments is None:
+        sentiments = [None] * len(candidates)
+    
+    keyword_matcher = build_keyword_matcher(keywords)
+    quotes = []
+    for (content, start_ms, end_ms, start_index, end_index), sentiment_data in zip(candidates, sentiments):
+        # Vérifier si l'un des sous-titres du candidat ouvre un nouveau sujet
+        is_topic_change = has_topic_change(topic_changes, start_index, end_index)
+        quote_data = _evaluate_candidate(content, start_ms, end_ms, min_length, keyword_matcher,
+                                         sentiment_data, is_topic_change)
+        if quote_data:
+            quotes.append(quote_data)
     
     return quotes
 
+def extract_quotes(subtitles, min_length=120, keywords=None, use_sentiment=False, topic_detection=False, group_subtitles=True, max_gap_seconds=3.0, topic_engine='jaccard', sentiment_engine=None):
+    """
+    Extrait les citations importantes avec leurs timecodes
+    
+    topic_engine choisit la détection de changements de sujet: 'jaccard' (vocabulaire
+    des fenêtres) ou 'tfidf' (similarité cosinus TF-IDF, voir detect_topic_changes_tfidf).
+    sentiment_engine permet de partager un SentimentEngine déjà chargé (par défaut,
+    celui du module); tous les candidats y sont analysés en un seul lot.
+    """
+    topic_changes = []
+    
+    if topic_detection:
+        topic_changes = TOPIC_ENGINES[topic_engine](subtitles)
+    
+    candidates = build_candidates(subtitles, group_subtitles, max_gap_seconds)
+    
+    sentiments = None
+    if use_sentiment:
+        engine = sentiment_engine or get_sentiment_engine()
+        sentiments = engine.analyze_batch([candidate[0] for candidate in candidates])
+    
+    return evaluate_candidates(candidates, min_length, keywords, sentiments, topic_changes)
+
+def iter_quotes(subtitles, min_length=120, keywords=None, use_sentiment=False, topic_detection=False, group_subtitles=True, max_gap_seconds=3.0, sentiment_engine=None):
+    """
+    Version en flux de extract_quotes.
+    
+    Les sous-titres peuvent provenir de iter_subtitles_from_srt: chaque passage est évalué
+    dès qu'il est fermé et les citations retenues sont produites une à une. La mémoire
+    utilisée ne dépend pas de la longueur de la transcription.
+    
+    Un passage est marqué comme changement de sujet si l'un de ses sous-titres ouvre un
+    nouveau sujet (indices globaux, comme detect_topic_changes).
+    """
+    engine = (sentiment_engine or get_sentiment_engine()) if use_sentiment else None
+    keyword_matcher = build_keyword_matcher(keywords)
+    
+    def evaluate(content, start_ms, end_ms, is_topic_change):
+        sentiment_data = engine.analyze(content) if engine else None
+        return _evaluate_candidate(content, start_ms, end_ms, min_length, keyword_matcher,
+                                   sentiment_data, is_topic_change)
+    
+    if topic_detection:
+        flagged = iter_topic_flags(subtitles)
+    else:
+        flagged = ((sub, False) for sub in subtitles)
+    
+    if not group_subtitles:
+        for sub, is_topic_change in flagged:
+            quote_data = evaluate(sub.content.strip(), to_milliseconds(sub.start), to_milliseconds(sub.end), is_topic_change)
+            if quote_data:
+                yield quote_data
+        return
+    
+    # Indices des changements de sujet déjà lus mais pas encore rattachés à un passage
+    pending_changes = set()
+    
+    def subtitles_with_changes():
+        for index, (sub, is_topic_change) in enumerate(flagged):
+            if is_topic_change:
+                pending_changes.add(index)
+            yield sub
+    
+    def consume(passage):
+        # Les changements antérieurs à la fin du passage (retenu ou écarté) ne concernent plus les suivants
+        pending_changes.difference_update([i for i in pending_changes if i <= passage.end_index])
+    
+    for passage in iter_passages(subtitles_with_changes(), max_gap_seconds=max_gap_seconds, on_discard=consume):
+        is_topic_change = any(passage.start_index <= i <= passage.end_index for i in pending_changes)
+        consume(passage)
+        
+        quote_data = evaluate(passage.content.strip(), passage.start_ms, passage.end_ms, is_topic_change)
+        if quote_data:
+            yield quote_data
+
+# Nombre de sous-titres conservés pour le résumé en mode flux
+SUMMARY_SUBTITLES = 50
+
 def summarize_text(text, max_sentences=5):
     import re
     sentences = re.split(r'(?<=[.!?])\s+', text)
     return " ".join(sentences[:max_sentences])
 
 def export_quotes_to_file(quotes, output_file):
-    """Exporte les citations dans un fichier texte formaté"""
+    """Exporte les citations dans un fichier texte formaté (une seule lecture de `quotes`)"""
+    # Lignes courtes de la section "édition vidéo", écrites après le détail des citations
+    index_lines = []
     with open(output_file, 'w', encoding='utf-8') as f:
         f.write("# MOMENTS FORTS DU PODCAST\n\n")
         
@@ -272,7 +910,12 @@ def export_quotes_to_file(quotes, output_file):
             if quote.get('is_long', False):
                 criteria.append("Passage long")
             if quote.get('has_keyword', False):
-                criteria.append("Contient un mot-clé")
+                matched = quote.get('matched_keywords')
+                if matched:
+                    criteria.append("Contient un mot-clé (" + ", ".join(
+                        f"{keyword} x{count}" if count > 1 else keyword for keyword, count in matched.items()) + ")")
+                else:
+                    criteria.append("Contient un mot-clé")
             if quote.get('is_intense', False):
                 polarity = quote.get('sentiment_polarity', 0)
                 if polarity > 0:
@@ -287,10 +930,10 @@ def export_quotes_to_file(quotes, output_file):
                 f.write(f"- **Critères**: {', '.join(criteria)}\n")
             
             f.write(f"- **Contenu**: {quote['content']}\n\n")
+            index_lines.append(f"{i}. {quote['formatted_start']} - {quote['formatted_end']} : {quote['content'][:50]}...\n")
             
         f.write("\n# Format pour édition vidéo\n\n")
-        for i, quote in enumerate(quotes, 1):
-            f.write(f"{i}. {quote['formatted_start']} - {quote['formatted_end']} : {quote['content'][:50]}...\n")
+        f.writelines(index_lines)
 
 def split_content_into_segments(content, max_chars=100):
     """
@@ -371,23 +1014,39 @@ def split_content_into_segments(content, max_chars=100):
     
     return segments
 
-def generate_ffmpeg_cut_file(quotes, output_file, padding_seconds=1, add_subtitles=True):
-    """Génère un fichier de découpage pour FFmpeg"""
+def generate_ffmpeg_cut_file(quotes, output_file, padding_seconds=1, add_subtitles=True, subtitles=None):
+    """
+    Génère un fichier de découpage pour FFmpeg et un script bash qui découpe les extraits
+    
+    Args:
+        subtitles: Sous-titres de la vidéo (dans l'ordre chronologique). S'ils sont fournis, les
+            sous-titres de chaque extrait sont écrits dès maintenant dans un dossier à côté du
+            script; sinon le script les découpe avec ffmpeg dans le SRT trouvé à côté de la vidéo
+    """
     padding = timedelta(seconds=padding_seconds)
+    clips = []
+    for i, quote in enumerate(quotes, 1):
+        # Ajouter un padding au début et à la fin
+        start_time = max(timedelta(seconds=0), quote['start_time'] - padding)
+        clips.append({'index': i, 'start': start_time, 'duration': quote['end_time'] + padding - start_time})
     
     # Format pour FFmpeg concat demuxer
     with open(output_file, 'w', encoding='utf-8') as f:
-        for i, quote in enumerate(quotes, 1):
-            # Ajouter un padding au début et à la fin
-            start_time = max(timedelta(seconds=0), quote['start_time'] - padding)
-            
-            f.write(f"# Segment {i}: {quote['formatted_start']} - {quote['formatted_end']}\n")
+        for quote, clip in zip(quotes, clips):
+            f.write(f"# Segment {clip['index']}: {quote['formatted_start']} - {quote['formatted_end']}\n")
             f.write(f"file 'INPUT_FILE'\n")
-            f.write(f"inpoint {format_ffmpeg_time(start_time)}\n")
+            f.write(f"inpoint {format_ffmpeg_time(clip['start'])}\n")
             f.write(f"outpoint {format_ffmpeg_time(quote['end_time'] + padding)}\n\n")
     
     # Générer aussi un script bash pour faciliter l'utilisation
     script_file = output_file.replace('.txt', '.sh')
+    
+    # Sous-titres de tous les extraits, rebasés sur leur début, en un seul parcours
+    subtitle_paths = {}
+    if add_subtitles and subtitles is not None:
+        subtitle_dir = os.path.splitext(script_file)[0] + "_sous_titres"
+        subtitle_paths = write_clip_subtitles(subtitles, clips, subtitle_dir)
+    
     with open(script_file, 'w', encoding='utf-8') as f:
         f.write("#!/bin/bash\n\n")
         f.write("# Script de découpage automatique des moments forts\n\n")
@@ -398,71 +1057,51 @@ def generate_ffmpeg_cut_file(quotes, output_file, padding_seconds=1, add_subtitl
         f.write("INPUT_FILE=$1\n")
         f.write("OUTPUT_DIR=$2\n")
         f.write("mkdir -p $OUTPUT_DIR\n")
-        f.write("SRT_FILE=\"${INPUT_FILE%.*}.srt\"\n\n")
-        f.write("# Vérifier si le fichier SRT existe à côté de la vidéo\n")
-        f.write("if [ ! -f \"$SRT_FILE\" ]; then\n")
-        f.write('    echo "Attention: Fichier SRT non trouvé: $SRT_FILE"\n')
-        f.write('    echo "Les sous-titres ne seront pas incrustés."\n')
-        f.write('    SRT_FILE=""\n')
-        f.write("fi\n\n")
+        if add_subtitles and subtitles is not None:
+            f.write("# Sous-titres des extraits, générés avec le script\n")
+            f.write(f'SUBTITLE_DIR="$(cd "$(dirname "$0")" && pwd)/{os.path.basename(subtitle_dir)}"\n\n')
+        elif add_subtitles:
+            f.write("SRT_FILE=\"${INPUT_FILE%.*}.srt\"\n\n")
+            f.write("# Vérifier si le fichier SRT existe à côté de la vidéo\n")
+            f.write("if [ ! -f \"$SRT_FILE\" ]; then\n")
+            f.write('    echo "Attention: Fichier SRT non trouvé: $SRT_FILE"\n')
+            f.write('    echo "Les sous-titres ne seront pas incrustés."\n')
+            f.write('    SRT_FILE=""\n')
+            f.write("fi\n\n")
         
-        for i, quote in enumerate(quotes, 1):
+        for quote, clip in zip(quotes, clips):
+            i = clip['index']
             safe_name = quote['content'][:30].replace(' ', '_').replace("'", "").replace('"', '').replace('?', '').replace('!', '')
             output_file = f"$OUTPUT_DIR/segment_{i:02d}_{safe_name}.mp4"
-            start_time = max(timedelta(seconds=0), quote['start_time'] - padding)
-            end_time = quote['end_time'] + padding
-            duration = end_time - start_time
-            duration_seconds = duration.total_seconds()
             
             f.write(f"# Segment {i}: {quote['formatted_start']} - {quote['formatted_end']}\n")
             f.write(f'echo "Extraction du segment {i}..."\n')
             
-            # Commande FFmpeg de base
-            ffmpeg_cmd = f'ffmpeg -i "$INPUT_FILE" -ss {format_ffmpeg_time(start_time)} -t {format_ffmpeg_time(duration)}'
+            # Commande FFmpeg de base: -ss avant -i pour se positionner directement au
+            # point de coupe au lieu de décoder la vidéo depuis le début
+            ffmpeg_cmd = f'ffmpeg -ss {format_ffmpeg_time(clip["start"])} -i "$INPUT_FILE" -t {format_ffmpeg_time(clip["duration"])}'
+            encode_options = f'-c:v libx264 -c:a aac -strict experimental "{output_file}"'
             
-            # Ajouter les sous-titres si demandé et si le fichier SRT existe
-            if add_subtitles:
+            if i in subtitle_paths:
+                subtitle_file = f"$SUBTITLE_DIR/{os.path.basename(subtitle_paths[i])}"
+                f.write(f'{ffmpeg_cmd} \\\n')
+                f.write(f'    -vf "subtitles=\'{subtitle_file}\':force_style=\'{DEFAULT_FORCE_STYLE}\'" \\\n')
+                f.write(f'    {encode_options}\n\n')
+            elif add_subtitles and subtitles is None:
+                # Sous-titres découpés par ffmpeg dans le SRT complet au moment du rendu
                 f.write('if [ -n "$SRT_FILE" ]; then\n')
-                # Définir le nom du fichier SRT temporaire
-                f.write(f'  # Définir le nom du fichier SRT temporaire\n')
-                f.write(f'  temp_srt="temp_subtitle_{i}.srt"\n\n')
-                
-                # Extraire les sous-titres correspondant au segment
-                f.write(f'  # Extraire les sous-titres correspondant au segment\n')
-                f.write(f'  ffmpeg -i "$SRT_FILE" -ss {format_ffmpeg_time(start_time)} -t {format_ffmpeg_time(duration)} -f srt "$OUTPUT_DIR/$temp_srt"\n\n')
-                
-                # Débogage: vérifier que le fichier SRT a été créé
-                f.write('  # Débogage: vérifier que le fichier SRT a été créé\n')
-                f.write('  ls -la "$OUTPUT_DIR/$temp_srt"\n')
-                f.write('  cat "$OUTPUT_DIR/$temp_srt"\n\n')
-                
-                # S'assurer que le fichier est accessible
-                f.write('  # S\'assurer que le fichier SRT est accessible\n')
-                f.write('  chmod 644 "$OUTPUT_DIR/$temp_srt"\n\n')
-                
-                # Utiliser le filtre subtitles avec les options de style
+                f.write(f'  temp_srt="$OUTPUT_DIR/temp_subtitle_{i}.srt"\n')
+                f.write(f'  ffmpeg -i "$SRT_FILE" -ss {format_ffmpeg_time(clip["start"])} -t {format_ffmpeg_time(clip["duration"])} -f srt "$temp_srt"\n')
                 f.write(f'  {ffmpeg_cmd} \\\n')
-                f.write(f'    -vf "subtitles=$OUTPUT_DIR/$temp_srt:force_style=\'')
-                f.write(f'FontName=Arial,')
-                f.write(f'FontSize=36,')
-                f.write(f'PrimaryColour=&Hffffff,')
-                f.write(f'BackColour=&H000000B2,')  # 0.7 d'opacité (B2 en hexa)
-                f.write(f'BorderStyle=4,')  # Style avec fond (box)
-                f.write(f'Outline=1,')
-                f.write(f'Alignment=2,')    # Centré en bas
-                f.write(f'MarginV=30')      # Marge verticale pour remonter les sous-titres
-                f.write('\'" \\\n')
-                f.write(f'    -c:v libx264 -c:a aac -strict experimental "{output_file}"\n\n')
-                
-                # Supprimer le fichier SRT temporaire
-                f.write(f'  rm "$OUTPUT_DIR/$temp_srt"\n')
+                f.write(f'    -vf "subtitles=\'$temp_srt\':force_style=\'{DEFAULT_FORCE_STYLE}\'" \\\n')
+                f.write(f'    {encode_options}\n')
+                f.write('  rm "$temp_srt"\n')
                 f.write('else\n')
-                # Commande sans sous-titres
-                f.write(f'  {ffmpeg_cmd} -c:v libx264 -c:a aac -strict experimental "{output_file}"\n')
+                f.write(f'  {ffmpeg_cmd} {encode_options}\n')
                 f.write('fi\n\n')
             else:
                 # Commande sans sous-titres
-                f.write(f'{ffmpeg_cmd} -c:v libx264 -c:a aac -strict experimental "{output_file}"\n\n')
+                f.write(f'{ffmpeg_cmd} {encode_options}\n\n')
     
         # Ajouter une commande pour combiner tous les extraits
         f.write("# Demander à l'utilisateur s'il souhaite combiner tous les extraits\n")
@@ -484,39 +1123,276 @@ def generate_ffmpeg_cut_file(quotes, output_file, padding_seconds=1, add_subtitl
         f.write("fi\n")
     
     # Rendre le script exécutable
-    import os
     os.chmod(script_file, 0o755)
     
     return script_file
 
+# Critères optionnels d'une citation (Quote.extra), conservés dans les exports JSON
+QUOTE_EXTRA_KEYS = ('keyword_hits', 'matched_keywords', 'keyword_spans', 'is_intense',
+                    'sentiment_polarity', 'sentiment_subjectivity')
+
+def quote_to_json(quote):
+    """Citation sous la forme de l'export JSON (temps en secondes, critères de sélection)"""
+    # Convertir les objets timedelta en secondes pour la sérialisation JSON
+    json_quote = {
+        'content': quote['content'],
+        'start_time_seconds': quote['start_time'].total_seconds(),
+        'end_time_seconds': quote['end_time'].total_seconds(),
+        'duration_seconds': quote['duration'].total_seconds(),
+        'formatted_start': quote['formatted_start'],
+        'formatted_end': quote['formatted_end']
+    }
+    
+    # Ajouter les critères de sélection s'ils existent
+    for key in ['is_long', 'has_keyword', 'keyword_hits', 'matched_keywords', 'keyword_spans',
+               'is_intense', 'is_topic_change', 'sentiment_polarity', 'sentiment_subjectivity']:
+        if key in quote:
+            json_quote[key] = quote[key]
+    return json_quote
+
+def quote_from_json(item):
+    """Citation (Quote) lue dans un élément d'export JSON, éventuellement modifié dans l'éditeur"""
+    extra = {key: item[key] for key in QUOTE_EXTRA_KEYS if key in item}
+    return Quote(item['content'], round(item['start_time_seconds'] * 1000), round(item['end_time_seconds'] * 1000),
+                 item.get('is_long', False), item.get('has_keyword', False),
+                 item.get('is_topic_change', False), extra or None)
+
 def export_json_data(quotes, output_file):
     """Exporte les données au format JSON pour une utilisation ultérieure"""
-    # Convertir les objets timedelta en secondes pour la sérialisation JSON
-    json_data = []
-    for quote in quotes:
-        json_quote = {
-            'content': quote['content'],
-            'start_time_seconds': quote['start_time'].total_seconds(),
-            'end_time_seconds': quote['end_time'].total_seconds(),
-            'duration_seconds': quote['duration'].total_seconds(),
-            'formatted_start': quote['formatted_start'],
-            'formatted_end': quote['formatted_end']
-        }
+    # Les citations sont écrites une à une: `quotes` peut être un générateur.
+    # Le résultat est identique à json.dump(liste, f, indent=2).
+    count = 0
+    with open(output_file, 'w', encoding='utf-8') as f:
+        f.write("[")
+        for quote in quotes:
+            f.write(",\n" if count else "\n")
+            f.write(textwrap.indent(json.dumps(quote_to_json(quote), ensure_ascii=False, indent=2), "  "))
+            count += 1
+        f.write("\n]" if count else "]")
+
+def load_json_data(input_file):
+    """
+    Relit un export JSON (éventuellement modifié dans l'éditeur) sous forme de citations
+    utilisables par les fonctions d'export et de découpage.
+    """
+    with open(input_file, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    return [quote_from_json(item) for item in data]
+
+def process_srt_file(file_path, args, output_file):
+    """
+    Analyse un fichier SRT et écrit les exports demandés par les options de la ligne de commande.
+    
+    Args:
+        file_path: Chemin vers le fichier SRT
+        args: Options de la ligne de commande (argparse.Namespace)
+        output_file: Fichier texte de sortie; les exports FFmpeg et JSON sont placés à côté
+    
+    Returns:
+        Dictionnaire avec le résumé, les citations retenues et les fichiers générés
+    """
+    if args.stream:
+        # Seuls les premiers sous-titres sont gardés pour le résumé
+        opening_contents = []
         
-        # Ajouter les critères de sélection s'ils existent
-        for key in ['is_long', 'has_keyword', 'is_intense', 'is_topic_change', 
-                   'sentiment_polarity', 'sentiment_subjectivity']:
-            if key in quote:
-                json_quote[key] = quote[key]
+        def subtitles_with_opening():
+            for sub in iter_subtitles_from_srt(file_path):
+                if len(opening_contents) < SUMMARY_SUBTITLES:
+                    opening_contents.append(sub.content)
+                yield sub
         
-        json_data.append(json_quote)
+        candidates = iter_quotes(subtitles_with_opening(), min_length=args.min_length, keywords=args.keywords,
+                                 use_sentiment=args.sentiment, topic_detection=args.topic_detection,
+                                 group_subtitles=args.group_subtitles, max_gap_seconds=args.max_gap)
+        # Trier les citations par score d'importance, limiter au nombre demandé
+        # puis remettre dans l'ordre chronologique pour l'affichage
+        selected_quotes = select_top_quotes(candidates, args.number, weights=args.weights)
+        summary = summarize_text(" ".join(opening_contents))
+    else:
+        full_text, subtitles = extract_text_from_srt(file_path)
+        quotes = extract_quotes(subtitles, min_length=args.min_length, keywords=args.keywords, 
+                               use_sentiment=args.sentiment, topic_detection=args.topic_detection, group_subtitles=args.group_subtitles, max_gap_seconds=args.max_gap,
+                               topic_engine=args.topic_engine)
+        summary = summarize_text(full_text)
+        selected_quotes = select_top_quotes(quotes, args.number, weights=args.weights)
     
-    with open(output_file, 'w', encoding='utf-8') as f:
-        json.dump(json_data, f, ensure_ascii=False, indent=2)
+    # Exporter dans un fichier
+    export_quotes_to_file(selected_quotes, output_file)
 
-if __name__ == "__main__":
-    parser = argparse.ArgumentParser(description="Extrait les citations importantes d'un fichier SRT")
-    parser.add_argument("file", help="Chemin vers le fichier SRT")
+    # Générer fichier FFmpeg si demandé
+    ffmpeg_file = None
+    ffmpeg_script = None
+    if args.ffmpeg:
+        ffmpeg_file = output_file.replace('.txt', '_ffmpeg.txt')
+        # En flux, la transcription est relue au fil de l'écriture des sous-titres des extraits
+        script_subtitles = iter_subtitles_from_srt(file_path) if args.stream else subtitles
+        ffmpeg_script = generate_ffmpeg_cut_file(selected_quotes, ffmpeg_file, args.padding, not args.no_subtitles,
+                                                 subtitles=script_subtitles)
+    
+    # Exporter au format JSON si demandé
+    json_file = None
+    if args.json:
+        json_file = output_file.replace('.txt', '.json')
+        export_json_data(selected_quotes, json_file)
+    
+    return {
+        'summary': summary,
+        'quotes': selected_quotes,
+        'output': output_file,
+        'ffmpeg': ffmpeg_file,
+        'ffmpeg_script': ffmpeg_script,
+        'json': json_file
+    }
+
+def expand_input_paths(patterns):
+    """
+    Transforme les arguments de la ligne de commande en liste de fichiers SRT.
+    
+    Chaque argument peut être un fichier, un dossier (parcouru récursivement) ou un motif
+    glob ("episodes/**/*.srt"). Les doublons sont ignorés et l'ordre est déterministe.
+    """
+    files = []
+    seen = set()
+    for pattern in patterns:
+        path = Path(pattern)
+        if path.is_dir():
+            matches = sorted(p for p in path.rglob('*') if p.is_file() and p.suffix.lower() == '.srt')
+        elif glob.has_magic(pattern):
+            matches = sorted(Path(p) for p in glob.glob(pattern, recursive=True) if Path(p).is_file())
+        else:
+            matches = [path]
+        for match in matches:
+            key = match.resolve()
+            if key not in seen:
+                seen.add(key)
+                files.append(match)
+    return files
+
+def _process_batch_file(file_path, output_file, args):
+    """Traite un fichier du lot (exécuté dans un processus du pool)"""
+    started = time.perf_counter()
+    try:
+        result = process_srt_file(file_path, args, output_file)
+    except Exception as e:
+        # Certaines exceptions (srt.SRTParseError) ne se désérialisent pas dans le
+        # processus parent et casseraient tout le pool: on ne renvoie que leur texte
+        return {'file': str(file_path), 'status': 'error', 'error': f"{type(e).__name__}: {e}"}
+    return {
+        'file': str(file_path),
+        'status': 'ok',
+        'quotes': len(result['quotes']),
+        'outputs': [path for path in (result['output'], result['ffmpeg'], result['ffmpeg_script'], result['json']) if path],
+        'elapsed_seconds': round(time.perf_counter() - started, 3)
+    }
+
+def run_batch(files, args):
+    """
+    Traite plusieurs fichiers SRT en parallèle dans un pool de processus.
+    
+    Les exports de chaque fichier sont écrits dans args.output_dir sous le nom
+    <fichier>_quotes.txt (et _quotes.json, _quotes_ffmpeg.txt/.sh), à côté d'un
+    résumé global batch_summary.json. L'échec d'un fichier n'interrompt pas le lot.
+    
+    Returns:
+        Liste des résultats par fichier, dans l'ordre des fichiers d'entrée
+    """
+    os.makedirs(args.output_dir, exist_ok=True)
+    
+    # Deux épisodes peuvent porter le même nom dans des dossiers différents
+    output_files = []
+    used_names = set()
+    for file_path in files:
+        name = file_path.stem
+        suffix = 2
+        while name in used_names:
+            name = f"{file_path.stem}_{suffix}"
+            suffix += 1
+        used_names.add(name)
+        output_files.append(os.path.join(args.output_dir, f"{name}_quotes.txt"))
+    
+    results = [None] * len(files)
+    started = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=args.jobs) as executor:
+        futures = {
+            executor.submit(_process_batch_file, file_path, output_file, args): index
+            for index, (file_path, output_file) in enumerate(zip(files, output_files))
+        }
+        for future in as_completed(futures):
+            index = futures[future]
+            try:
+                results[index] = future.result()
+            except Exception as e:
+                # Processus du pool tué (mémoire, signal...)
+                results[index] = {'file': str(files[index]), 'status': 'error', 'error': f"{type(e).__name__}: {e}"}
+            if results[index]['status'] == 'ok':
+                print(f"[OK] {files[index]} ({results[index]['quotes']} citations)")
+            else:
+                print(f"[ERREUR] {files[index]}: {results[index]['error']}")
+    
+    failures = [result for result in results if result['status'] != 'ok']
+    summary = {
+        'files': len(files),
+        'succeeded': len(files) - len(failures),
+        'failed': len(failures),
+        'elapsed_seconds': round(time.perf_counter() - started, 3),
+        'results': results
+    }
+    summary_file = os.path.join(args.output_dir, 'batch_summary.json')
+    with open(summary_file, 'w', encoding='utf-8') as f:
+        json.dump(summary, f, ensure_ascii=False, indent=2)
+    
+    print(f"\n=== Lot terminé: {summary['succeeded']}/{len(files)} fichiers traités ===")
+    for failure in failures:
+        print(f"- Échec: {failure['file']} ({failure['error']})")
+    print(f"Résumé du lot: {summary_file}")
+    
+    return results
+
+def render_selected_quotes(quotes, args, srt_path):
+    """
+    Rend les extraits avec ffmpeg (option --render), --jobs encodages à la fois.
+    
+    Returns:
+        True si tous les extraits ont été rendus
+    """
+    from media_index import load_media_index
+    from render import render_clips, render_summary
+    
+    output_dir = args.render_dir or os.path.splitext(args.output)[0] + "_clips"
+    mode = 'copy' if args.copy else 'encode'
+    srt_file = None if args.no_subtitles or args.copy else str(srt_path)
+    print(f"\n=== Rendu de {len(quotes)} extraits dans {output_dir} ({args.jobs} processus à la fois, "
+          f"{'sans réencodage' if args.copy else 'réencodage'}, moteur {args.engine}) ===\n")
+    
+    def report(result):
+        shifts = ""
+        if args.copy:
+            shifts = f", début {result['start_shift']:+.2f} s, fin {result['end_shift']:+.2f} s"
+        if result['ok']:
+            speed = f", {result['speed']:.2f}x" if result['speed'] else ""
+            print(f"[OK] Extrait {result['index']} ({result['seconds']:.1f} s{speed}{shifts}): {result['output']}")
+        else:
+            print(f"[ERREUR] Extrait {result['index']} ({result['seconds']:.1f} s{shifts}): {result['error']}")
+    
+    started = time.perf_counter()
+    results = render_clips(args.render, quotes, output_dir, jobs=args.jobs, padding_seconds=args.padding,
+                           srt_file=srt_file, subtitle_format=args.subtitle_format, mode=mode,
+                           engine=args.engine, media_index=load_media_index(args.render), on_clip_done=report)
+    summary = render_summary(results)
+    speed = f", vitesse moyenne: {summary['mean_speed']:.2f}x" if summary['mean_speed'] else ""
+    print(f"\n{summary['succeeded']} extraits rendus, {summary['failed']} en échec "
+          f"en {time.perf_counter() - started:.1f} s (encodage cumulé: {summary['encode_seconds']:.1f} s{speed})")
+    return summary['failed'] == 0
+
+def _weights_argument(text):
+    try:
+        return parse_weights(text)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+def build_arg_parser():
+    parser = argparse.ArgumentParser(description="Extrait les citations importantes d'un ou plusieurs fichiers SRT")
+    parser.add_argument("file", nargs='+', help="Chemin vers le fichier SRT (ou plusieurs fichiers, dossiers ou motifs glob pour un traitement par lot)")
     parser.add_argument("-o", "--output", help="Fichier de sortie (par défaut: quotes_output.txt)", default="quotes_output.txt")
     parser.add_argument("-n", "--number", type=int, help="Nombre de citations à extraire", default=10)
     parser.add_argument("-l", "--min-length", type=int, help="Longueur minimale des citations", default=120)
@@ -525,71 +1401,66 @@ def export_json_data(quotes, output_file):
     parser.add_argument("-p", "--padding", type=int, help="Padding en secondes pour les segments vidéo", default=1)
     parser.add_argument("-j", "--json", action="store_true", help="Exporter les données au format JSON")
     parser.add_argument("-s", "--sentiment", action="store_true", help="Utiliser l'analyse de sentiment pour détecter les moments forts")
+    parser.add_argument("--weights", type=_weights_argument, help="Poids des critères de classement, par exemple \"keyword=4,topic_change=1\" (critères: duration, keyword, keyword_repeats, intense, intensity, subjectivity, topic_change, long)")
     parser.add_argument("-t", "--topic-detection", action="store_true", help="Détecter les changements de sujet")
+    parser.add_argument("--topic-engine", choices=sorted(TOPIC_ENGINES), help="Méthode de détection des changements de sujet (par défaut: jaccard)", default='jaccard')
     parser.add_argument("-g", "--group-subtitles", action="store_true", help="Regrouper les sous-titres consécutifs en passages")
     parser.add_argument("-m", "--max-gap", type=float, help="Écart maximal en secondes entre deux sous-titres pour les considérer comme faisant partie du même passage", default=3.0)
     parser.add_argument("--no-subtitles", action="store_true", help="Ne pas incruster les sous-titres dans les segments vidéo")
+    parser.add_argument("--stream", action="store_true", help="Lire et analyser le fichier SRT en flux (mémoire constante pour les très longues transcriptions)")
+    parser.add_argument("--jobs", type=int, help="Nombre de processus pour le traitement par lot, ou d'encodages simultanés avec --render (par défaut: nombre de cœurs)", default=os.cpu_count() or 1)
+    parser.add_argument("--render", metavar="VIDEO", help="Découper directement les extraits de cette vidéo avec ffmpeg, --jobs encodages à la fois")
+    parser.add_argument("--render-dir", help="Dossier des extraits rendus (par défaut: <sortie>_clips)")
+    parser.add_argument("--engine", choices=['parallel', 'single-pass'], default='parallel', help="Avec --render: un processus ffmpeg par extrait (parallel, par défaut) ou un seul décodage de la vidéo pour plusieurs extraits (single-pass)")
+    parser.add_argument("--subtitle-format", choices=['srt', 'ass'], default='srt', help="Avec --render: format des sous-titres générés pour chaque extrait (par défaut: srt)")
+    parser.add_argument("--copy", action="store_true", help="Avec --render: découper sans réencoder (bornes sur les images clés, sans sous-titres incrustés)")
+    parser.add_argument("--output-dir", help="Dossier de sortie du traitement par lot (par défaut: batch_output)", default="batch_output")
+    return parser
+
+def main(argv=None):
+    parser = build_arg_parser()
+    args = parser.parse_args(argv)
+    if args.stream and args.topic_engine != 'jaccard':
+        # TF-IDF a besoin de toute la transcription pour pondérer les mots
+        parser.error("--topic-engine tfidf n'est pas disponible avec --stream")
+    if args.copy and not args.render:
+        parser.error("--copy s'utilise avec --render")
+    if args.copy and args.engine == 'single-pass':
+        parser.error("--engine single-pass réencode les extraits: incompatible avec --copy")
     
-    args = parser.parse_args()
+    # Plusieurs fichiers, un dossier ou un motif glob: traitement par lot
+    if len(args.file) > 1 or any(Path(pattern).is_dir() or glob.has_magic(pattern) for pattern in args.file):
+        if args.render:
+            parser.error("--render n'est disponible que pour un seul fichier SRT")
+        files = expand_input_paths(args.file)
+        if not files:
+            print("Aucun fichier SRT trouvé.")
+            sys.exit(1)
+        results = run_batch(files, args)
+        if any(result['status'] != 'ok' for result in results):
+            sys.exit(1)
+        return
 
-    file_path = Path(args.file)
+    file_path = Path(args.file[0])
     if not file_path.exists():
         print(f"Fichier {file_path} introuvable.")
         sys.exit(1)
 
-    full_text, subtitles = extract_text_from_srt(file_path)
-    quotes = extract_quotes(subtitles, min_length=args.min_length, keywords=args.keywords, 
-                           use_sentiment=args.sentiment, topic_detection=args.topic_detection, group_subtitles=args.group_subtitles, max_gap_seconds=args.max_gap)
-    summary = summarize_text(full_text)
-
-    # Trier les citations par score d'importance
-    def importance_score(quote):
-        score = 0
-        # Longueur du contenu
-        score += min(5, quote['duration'].total_seconds() / 10)
-        # Présence de mots-clés
-        if quote.get('has_keyword', False):
-            score += 3
-        # Intensité du sentiment
-        if quote.get('is_intense', False):
-            score += 2 + abs(quote.get('sentiment_polarity', 0))
-        # Changement de sujet
-        if quote.get('is_topic_change', False):
-            score += 2
-        return score
-    
-    quotes.sort(key=importance_score, reverse=True)
-    
-    # Limiter au nombre demandé
-    selected_quotes = quotes[:args.number]
-    
-    # Trier par ordre chronologique pour l'affichage
-    selected_quotes.sort(key=lambda x: x['start_time'])
-    
-    # Exporter dans un fichier
-    export_quotes_to_file(selected_quotes, args.output)
-
-    # Générer fichier FFmpeg si demandé
-    ffmpeg_script = None
-    if args.ffmpeg:
-        ffmpeg_file = args.output.replace('.txt', '_ffmpeg.txt')
-        ffmpeg_script = generate_ffmpeg_cut_file(selected_quotes, ffmpeg_file, args.padding, not args.no_subtitles)
-    
-    # Exporter au format JSON si demandé
-    if args.json:
-        json_file = args.output.replace('.txt', '.json')
-        export_json_data(selected_quotes, json_file)
-        print(f"Données exportées au format JSON: {json_file}")
+    result = process_srt_file(file_path, args, args.output)
+    selected_quotes = result['quotes']
+    ffmpeg_script = result['ffmpeg_script']
+    if result['json']:
+        print(f"Données exportées au format JSON: {result['json']}")
 
     print(f"\n=== Résumé du fichier ===\n")
-    print(summary)
+    print(result['summary'])
     print(f"\n=== {len(selected_quotes)} citations marquantes extraites ===\n")
     for q in selected_quotes:
         criteria = []
         if q.get('is_long', False):
             criteria.append("long")
         if q.get('has_keyword', False):
-            criteria.append("mot-clé")
+            criteria.append(f"mot-clé x{q.get('keyword_hits', 1)}")
         if q.get('is_intense', False):
             criteria.append(f"sentiment: {q.get('sentiment_polarity', 0):.2f}")
         if q.get('is_topic_change', False):
@@ -605,5 +1476,16 @@ def importance_score(quote):
         print(f"Script bash de découpage généré: {ffmpeg_script.replace('.txt', '.sh')}")
         print(f"Pour utiliser le script: bash {ffmpeg_script.replace('.txt', '.sh')} video_input.mp4 dossier_sortie/")
     
+    if args.render:
+        if not render_selected_quotes(selected_quotes, args, file_path):
+            sys.exit(1)
+    
     if args.sentiment:
-        print("\nNote: Pour une meilleure analyse de sentiment, installez TextBlob: pip install textblob")
+        stats = get_sentiment_engine().stats()
+        print(f"\nAnalyse de sentiment: {stats['texts']} passages en {stats['seconds']:.2f} s "
+              f"({stats['cache_hits']} déjà en cache, moteur: {stats['backend']})")
+        if stats['backend'] != 'textblob':
+            print("Note: Pour une meilleure analyse de sentiment, installez TextBlob: pip install textblob")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+"""
+Capacités de l'installation ffmpeg: filtres, encodeurs et police disponibles.
+
+Le rendu choisit sa méthode une fois pour toutes (filtre subtitles si ffmpeg est compilé
+avec libass, sinon drawtext avec une police trouvée sur la machine) au lieu de tenter un
+encodage et de le relancer autrement en cas d'échec.
+
+Le résultat est enregistré sur disque, sous une clé formée du chemin et de la version
+du binaire ffmpeg: il n'est recalculé qu'après une mise à jour de ffmpeg.
+"""
+import hashlib
+import json
+import os
+import platform
+import re
+import shutil
+import subprocess
+import threading
+
+# Encodeurs vidéo H.264 utilisables, par ordre de préférence
+VIDEO_ENCODERS = ('libx264', 'libopenh264', 'h264_videotoolbox', 'mpeg4')
+
+# Polices utilisées par drawtext quand fontconfig ne répond pas
+FONT_CANDIDATES = {
+    'Darwin': ('/System/Library/Fonts/Helvetica.ttc', '/Library/Fonts/Arial.ttf'),
+    'Linux': ('/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf',
+              '/usr/share/fonts/dejavu/DejaVuSans.ttf',
+              '/usr/share/fonts/TTF/DejaVuSans.ttf',
+              '/usr/share/fonts/truetype/liberation/LiberationSans-Regular.ttf'),
+    'Windows': ('C:/Windows/Fonts/arial.ttf',)
+}
+
+_FILTER_LINE = re.compile(r'^\s*[TSC.]{2,3}\s+(\S+)\s+\S*->\S*')
+_ENCODER_LINE = re.compile(r'^\s*[VAS][F.][S.][X.][B.][D.]\s+(\S+)')
+
+_memory = {}
+_lock = threading.Lock()
+
+def default_cache_dir():
+    """Dossier de cache de l'utilisateur ($XDG_CACHE_HOME ou ~/.cache)"""
+    base = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'extract_srt_quotes')
+
+def run_ffmpeg(arguments):
+    """Sortie standard d'une commande ffmpeg courte (-version, -filters, ...)"""
+    completed = subprocess.run(arguments, stdin=subprocess.DEVNULL, capture_output=True, text=True)
+    if completed.returncode != 0:
+        raise RuntimeError(f"{' '.join(arguments)} a échoué: {completed.stderr.strip()}")
+    return completed.stdout
+
+def parse_filters(output):
+    """Noms des filtres listés par `ffmpeg -filters`"""
+    return sorted({match.group(1) for match in map(_FILTER_LINE.match, output.splitlines()) if match})
+
+def parse_encoders(output):
+    """Noms des encodeurs listés par `ffmpeg -encoders`"""
+    names = set()
+    for line in output.splitlines():
+        match = _ENCODER_LINE.match(line)
+        # La légende ("V..... = Video") précède la liste
+        if match and match.group(1) != '=':
+            names.add(match.group(1))
+    return sorted(names)
+
+def find_font_file():
+    """Fichier de police pour drawtext: fontconfig si disponible, sinon chemins usuels du système"""
+    if shutil.which('fc-match'):
+        try:
+            path = subprocess.run(['fc-match', '-f', '%{file}', 'sans-serif'], stdin=subprocess.DEVNULL,
+                                  capture_output=True, text=True, timeout=10).stdout.strip()
+            if path and os.path.exists(path):
+                return path
+        except (OSError, subprocess.SubprocessError):
+            pass
+    for path in FONT_CANDIDATES.get(platform.system(), ()):
+        if os.path.exists(path):
+            return path
+    return None
+
+def probe_capabilities(ffmpeg='ffmpeg', cache_dir=None, run=run_ffmpeg):
+    """
+    Capacités du binaire ffmpeg, lues une seule fois par version.
+
+    Args:
+        ffmpeg: Commande ou chemin de ffmpeg
+        cache_dir: Dossier du cache disque (par défaut: default_cache_dir())
+        run: Fonction (arguments) -> sortie standard, qui lance ffmpeg
+
+    Returns:
+        Dictionnaire: version, filters, encoders, font_file, subtitles (filtre subtitles
+        disponible), drawtext, video_encoder
+
+    Raises:
+        OSError, RuntimeError: ffmpeg introuvable ou en échec
+    """
+    binary = shutil.which(ffmpeg) or ffmpeg
+    version = run([binary, '-hide_banner', '-version']).splitlines()[0].strip()
+    key = hashlib.blake2b(repr((os.path.realpath(binary), version)).encode('utf-8'), digest_size=12).hexdigest()
+    with _lock:
+        if key in _memory:
+            return _memory[key]
+
+    cache_dir = cache_dir or default_cache_dir()
+    path = os.path.join(cache_dir, f"ffmpeg-{key}.json")
+    capabilities = None
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            capabilities = json.load(f)
+        if capabilities.get('font_file') and not os.path.exists(capabilities['font_file']):
+            # Police supprimée depuis: la recherche est refaite
+            capabilities['font_file'] = find_font_file()
+    except (OSError, ValueError):
+        pass
+
+    if capabilities is None:
+        filters = parse_filters(run([binary, '-hide_banner', '-filters']))
+        encoders = parse_encoders(run([binary, '-hide_banner', '-encoders']))
+        capabilities = {
+            'binary': os.path.realpath(binary),
+            'version': version,
+            'filters': filters,
+            'encoders': encoders,
+            'font_file': find_font_file(),
+            'subtitles': 'subtitles' in filters,
+            'drawtext': 'drawtext' in filters,
+            'video_encoder': next((name for name in VIDEO_ENCODERS if name in encoders), None)
+        }
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+            temp_path = f"{path}.{os.getpid()}.tmp"
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump(capabilities, f)
+            os.replace(temp_path, path)
+        except OSError as e:
+            print(f"Capacités de ffmpeg non enregistrées dans {cache_dir}: {e}")
+
+    with _lock:
+        _memory[key] = capabilities
+    return capabilities
+
+def subtitle_method(capabilities):
+    """
+    Méthode d'incrustation des sous-titres: 'subtitles' (libass), 'drawtext' ou None.
+
+    Sans capacités connues (ffmpeg non sondé), le filtre subtitles est supposé disponible.
+    """
+    if capabilities is None or capabilities.get('subtitles'):
+        return 'subtitles'
+    if capabilities.get('drawtext') and capabilities.get('font_file'):
+        return 'drawtext'
+    return None
+
+def video_encoder(capabilities):
+    """Encodeur vidéo à utiliser (libx264 sauf s'il manque)"""
+    if capabilities is None:
+        return 'libx264'
+    return capabilities.get('video_encoder') or 'libx264'
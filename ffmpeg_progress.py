@@ -0,0 +1,259 @@
+"""
+Avancement des encodages ffmpeg.
+
+Avec `-progress pipe:1`, ffmpeg écrit sur sa sortie standard, environ deux fois par
+seconde, un bloc de lignes `clé=valeur` (frame, fps, out_time_us, total_size, speed...)
+terminé par `progress=continue`, ou `progress=end` à la fin. ProgressParser lit ces
+lignes et en tire l'avancement d'un extrait (images, vitesse, temps restant, octets
+écrits); RenderProgress agrège les extraits d'un rendu.
+
+La vitesse de chaque encodage terminé est gardée dans un historique (SpeedHistory) pour
+repérer les machines lentes et les réglages d'encodeur mal choisis.
+"""
+import json
+import os
+import socket
+import threading
+import time
+from collections import deque
+
+# Arguments ajoutés après le nom de ffmpeg: avancement sur la sortie standard, sans la
+# ligne de statistiques habituelle sur la sortie d'erreur (qui va dans le log)
+PROGRESS_ARGUMENTS = ['-progress', 'pipe:1', '-nostats']
+
+def with_progress(command):
+    """Commande ffmpeg qui écrit son avancement sur la sortie standard"""
+    return command[:1] + PROGRESS_ARGUMENTS + command[1:]
+
+def _float(value):
+    try:
+        return float(value.rstrip('x'))
+    except (AttributeError, ValueError):
+        # 'N/A' au début de l'encodage
+        return None
+
+def _int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+def progress_snapshot(fields, duration_seconds=None, elapsed_seconds=None):
+    """
+    Avancement d'un encodage d'après un bloc de sortie de -progress.
+    
+    Args:
+        fields: Dictionnaire clé -> valeur du dernier bloc
+        duration_seconds: Durée attendue de la sortie (fraction et temps restant)
+        elapsed_seconds: Temps écoulé depuis le lancement (vitesse si ffmpeg ne la donne pas)
+    
+    Returns:
+        Dictionnaire: frames, fps, out_seconds, bytes, speed, fraction, eta_seconds, ended
+    """
+    out_us = _int(fields.get('out_time_us')) or _int(fields.get('out_time_ms'))
+    out_seconds = max(0.0, out_us / 1_000_000) if out_us is not None else None
+    speed = _float(fields.get('speed'))
+    if speed is None and out_seconds and elapsed_seconds:
+        speed = out_seconds / elapsed_seconds
+    ended = fields.get('progress') == 'end'
+    fraction = None
+    eta = None
+    if ended:
+        fraction = 1.0
+        eta = 0.0
+    elif duration_seconds and out_seconds is not None:
+        fraction = min(1.0, out_seconds / duration_seconds)
+        if speed:
+            eta = max(0.0, duration_seconds - out_seconds) / speed
+    return {
+        'frames': _int(fields.get('frame')),
+        'fps': _float(fields.get('fps')),
+        'out_seconds': round(out_seconds, 3) if out_seconds is not None else None,
+        'bytes': _int(fields.get('total_size')),
+        'speed': round(speed, 3) if speed is not None else None,
+        'fraction': round(fraction, 4) if fraction is not None else None,
+        'eta_seconds': round(eta, 1) if eta is not None else None,
+        'ended': ended
+    }
+
+class ProgressParser:
+    """
+    Lit la sortie de `ffmpeg -progress pipe:1` ligne par ligne.
+    
+    Args:
+        duration_seconds: Durée attendue de la sortie
+        callback: Appelée avec l'avancement (progress_snapshot) à la fin de chaque bloc
+    """
+    
+    def __init__(self, duration_seconds=None, callback=None):
+        self.duration_seconds = duration_seconds
+        self.callback = callback
+        self.started = time.perf_counter()
+        self.last = None
+        self._fields = {}
+    
+    def feed(self, line):
+        """Ajoute une ligne de sortie; renvoie l'avancement si elle termine un bloc, sinon None"""
+        if isinstance(line, bytes):
+            line = line.decode('utf-8', 'replace')
+        key, separator, value = line.strip().partition('=')
+        if not separator:
+            return None
+        self._fields[key.strip()] = value.strip()
+        if key.strip() != 'progress':
+            return None
+        self.last = progress_snapshot(self._fields, self.duration_seconds, time.perf_counter() - self.started)
+        self._fields = {}
+        if self.callback:
+            self.callback(self.last)
+        return self.last
+
+class RenderProgress:
+    """
+    Avancement d'un rendu de plusieurs extraits, mis à jour depuis les threads qui
+    lisent la sortie des processus ffmpeg.
+    
+    La part faite est pondérée par la durée des extraits; le temps restant est estimé
+    d'après le temps écoulé depuis le début du rendu.
+    
+    Args:
+        durations: Index de l'extrait -> durée (secondes)
+    """
+    
+    def __init__(self, durations):
+        self.durations = dict(durations)
+        self.total_seconds = sum(self.durations.values()) or 1.0
+        self.started = time.perf_counter()
+        self._clips = {}
+        self._lock = threading.Lock()
+    
+    def update(self, index, snapshot):
+        """Enregistre l'avancement d'un extrait en cours d'encodage"""
+        with self._lock:
+            self._clips[index] = {**snapshot, 'state': 'running'}
+    
+    def finish(self, result):
+        """Enregistre un extrait terminé (résultat de render_clips)"""
+        with self._lock:
+            clip = self._clips.get(result['index'], {})
+            state = 'done' if result['ok'] else 'failed'
+            if result.get('cache') == 'hit':
+                state = 'cached'
+            self._clips[result['index']] = {**clip, 'state': state, 'fraction': 1.0, 'eta_seconds': 0.0,
+                                            'speed': result.get('speed') or clip.get('speed')}
+    
+    def to_dict(self):
+        """Avancement global et par extrait, sérialisable en JSON"""
+        with self._lock:
+            clips = {index: dict(clip) for index, clip in self._clips.items()}
+        done_seconds = sum(self.durations.get(index, 0.0) * (clip.get('fraction') or 0.0)
+                           for index, clip in clips.items())
+        fraction = min(1.0, done_seconds / self.total_seconds)
+        elapsed = time.perf_counter() - self.started
+        running = [clip for clip in clips.values() if clip['state'] == 'running']
+        return {
+            'fraction': round(fraction, 4),
+            'eta_seconds': round(elapsed * (1 - fraction) / fraction, 1) if fraction else None,
+            'bytes': sum(clip.get('bytes') or 0 for clip in clips.values()),
+            'frames': sum(clip.get('frames') or 0 for clip in clips.values()),
+            # Vitesse cumulée des encodages en cours (secondes de vidéo par seconde)
+            'speed': round(sum(clip.get('speed') or 0 for clip in running), 3),
+            'running': len(running),
+            'clips': {str(index): clip for index, clip in sorted(clips.items())}
+        }
+
+class SpeedHistory:
+    """
+    Historique borné des vitesses d'encodage, enregistré en JSON (une ligne par extrait).
+    
+    Chaque entrée indique la machine, l'encodeur, le mode et le moteur de rendu, la durée
+    de l'extrait, le temps d'encodage et la vitesse (secondes de vidéo par seconde).
+    
+    Args:
+        path: Fichier de l'historique
+        max_entries: Nombre d'entrées gardées (les plus anciennes sont oubliées); le
+            fichier est complété à chaque rendu et n'est réécrit que lorsqu'il dépasse le
+            double de ce nombre de lignes
+    """
+    
+    def __init__(self, path, max_entries=2000):
+        self.path = path
+        self.max_entries = max_entries
+        self.host = socket.gethostname()
+        self._entries = deque(maxlen=max_entries)
+        # Lignes du fichier, y compris celles déjà oubliées
+        self._file_lines = 0
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self._load()
+    
+    def _load(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    self._file_lines += 1
+                    try:
+                        self._entries.append(json.loads(line))
+                    except ValueError:
+                        # Ligne tronquée par un arrêt pendant l'écriture
+                        continue
+        except OSError:
+            pass
+    
+    def record(self, results, **context):
+        """
+        Ajoute les extraits encodés d'un rendu (les extraits repris du cache ou en échec
+        n'ont pas de vitesse significative).
+        
+        Args:
+            results: Résultats de render_clips
+            context: Informations communes (encoder, mode, engine, ...)
+        """
+        entries = [{
+            'time': round(time.time(), 3),
+            'host': self.host,
+            **context,
+            'clip': result['index'],
+            'media_seconds': result['media_seconds'],
+            'seconds': result['seconds'],
+            'speed': result['speed']
+        } for result in results if result['ok'] and result.get('cache') != 'hit' and result.get('speed')]
+        if not entries:
+            return
+        with self._lock:
+            self._entries.extend(entries)
+            if self._file_lines + len(entries) > 2 * self.max_entries:
+                # Fichier compacté (borné) plutôt que de grossir indéfiniment
+                temp_path = f"{self.path}.{os.getpid()}.tmp"
+                with open(temp_path, 'w', encoding='utf-8') as f:
+                    f.writelines(json.dumps(entry) + "\n" for entry in self._entries)
+                os.replace(temp_path, self.path)
+                self._file_lines = len(self._entries)
+            else:
+                with open(self.path, 'a', encoding='utf-8') as f:
+                    f.writelines(json.dumps(entry) + "\n" for entry in entries)
+                self._file_lines += len(entries)
+    
+    def entries(self, limit=None):
+        """Entrées, des plus récentes aux plus anciennes"""
+        with self._lock:
+            entries = list(self._entries)
+        entries.reverse()
+        return entries[:limit] if limit else entries
+    
+    def summary(self):
+        """Vitesse moyenne, minimale et maximale par machine, encodeur, mode et moteur"""
+        groups = {}
+        for entry in self.entries():
+            key = (entry.get('host'), entry.get('encoder'), entry.get('mode'), entry.get('engine'))
+            groups.setdefault(key, []).append(entry['speed'])
+        return [{
+            'host': host,
+            'encoder': encoder,
+            'mode': mode,
+            'engine': engine,
+            'clips': len(speeds),
+            'mean_speed': round(sum(speeds) / len(speeds), 3),
+            'min_speed': min(speeds),
+            'max_speed': max(speeds)
+        } for (host, encoder, mode, engine), speeds in sorted(groups.items(), key=lambda item: str(item[0]))]
@@ -0,0 +1,316 @@
+"""
+File de tâches en arrière-plan pour les rendus vidéo.
+
+Les tâches sont exécutées par un pool de threads du processus Flask: aucun serveur de
+messages externe n'est nécessaire. Une requête qui lance un rendu reçoit tout de suite
+l'identifiant de sa tâche et peut ensuite suivre son état ou l'annuler.
+
+Un sémaphore commun à toutes les tâches limite le nombre de processus ffmpeg lancés
+en même temps, quels que soient le projet et l'utilisateur.
+"""
+import os
+import signal
+import subprocess
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+# États d'une tâche
+QUEUED = 'queued'
+RUNNING = 'running'
+SUCCEEDED = 'succeeded'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+FINISHED_STATES = (SUCCEEDED, FAILED, CANCELLED)
+
+# Intervalle de vérification des demandes d'annulation (secondes)
+POLL_INTERVAL = 0.2
+
+def default_ffmpeg_limit():
+    """Nombre de processus ffmpeg simultanés par défaut: libx264 utilise déjà plusieurs cœurs"""
+    return max(1, (os.cpu_count() or 1) // 2)
+
+class JobCancelled(Exception):
+    """Levée dans une tâche dont l'annulation a été demandée"""
+
+class Job:
+    """
+    Une tâche de la file.
+    
+    La fonction exécutée reçoit la tâche en premier argument: elle peut publier son
+    avancement (update), vérifier si elle doit s'arrêter (check_cancelled) et lancer
+    des processus externes (run_command) dans la limite globale.
+    """
+    
+    def __init__(self, kind, label, queue):
+        self.id = uuid.uuid4().hex[:12]
+        self.kind = kind
+        self.label = label
+        self.status = QUEUED
+        self.message = "En attente"
+        self.progress = None
+        self.result = None
+        self.error = None
+        # Informations propres au type de tâche (étapes d'une analyse, ...)
+        self.details = {}
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self._queue = queue
+        self._cancel_event = threading.Event()
+        self._processes = set()
+        self._lock = threading.Lock()
+        self.future = None
+    
+    @property
+    def cancel_requested(self):
+        return self._cancel_event.is_set()
+    
+    def update(self, message=None, progress=None, **details):
+        """Publie l'avancement de la tâche (progress entre 0 et 1, détails propres au type de tâche)"""
+        if message is not None:
+            self.message = message
+        if progress is not None:
+            self.progress = progress
+        if details:
+            self.details = {**self.details, **details}
+    
+    def check_cancelled(self):
+        """Lève JobCancelled si l'annulation de la tâche a été demandée"""
+        if self._cancel_event.is_set():
+            raise JobCancelled()
+    
+    def run_command(self, command, log_path=None, cwd=None, on_output=None):
+        """
+        Lance un processus (ffmpeg, ou un script qui lance ffmpeg une fois à la fois) et
+        attend sa fin.
+        
+        Le processus ne démarre que lorsqu'une place se libère parmi les processus ffmpeg
+        autorisés. Il est arrêté si la tâche est annulée.
+        
+        Args:
+            command: Liste des arguments (pas de shell)
+            log_path: Fichier recevant la sortie du processus (sinon ignorée)
+            on_output: Appelée avec chaque ligne de la sortie standard (avancement de
+                `ffmpeg -progress pipe:1`); la sortie d'erreur seule va alors dans log_path
+        
+        Returns:
+            Code de retour du processus
+        """
+        slots = self._queue.ffmpeg_slots
+        if not slots.acquire(blocking=False):
+            waiting_message = self.message
+            self.message = f"{waiting_message} (en attente d'un processus ffmpeg libre)"
+            while not slots.acquire(timeout=POLL_INTERVAL):
+                self.check_cancelled()
+            self.message = waiting_message
+        try:
+            self.check_cancelled()
+            log = open(log_path, 'ab') if log_path else subprocess.DEVNULL
+            try:
+                # Nouveau groupe de processus: l'annulation arrête aussi les enfants d'un script
+                process = subprocess.Popen(command, stdin=subprocess.DEVNULL,
+                                           stdout=subprocess.PIPE if on_output else log,
+                                           stderr=log if on_output else subprocess.STDOUT, cwd=cwd,
+                                           start_new_session=(os.name == 'posix'))
+            finally:
+                if log_path:
+                    log.close()
+            with self._lock:
+                self._processes.add(process)
+            reader = follow_output(process, on_output) if on_output else None
+            try:
+                while True:
+                    try:
+                        returncode = process.wait(timeout=POLL_INTERVAL)
+                        break
+                    except subprocess.TimeoutExpired:
+                        if self._cancel_event.is_set():
+                            _terminate(process)
+                            process.wait()
+                            raise JobCancelled()
+            finally:
+                with self._lock:
+                    self._processes.discard(process)
+                if reader is not None:
+                    reader.join()
+            # Processus arrêté par cancel() entre deux vérifications
+            self.check_cancelled()
+            return returncode
+        finally:
+            slots.release()
+    
+    def _request_cancel(self):
+        self._cancel_event.set()
+        with self._lock:
+            processes = list(self._processes)
+        for process in processes:
+            _terminate(process)
+    
+    def to_dict(self):
+        """État de la tâche, sérialisable en JSON"""
+        end = self.finished_at or time.time()
+        return {
+            'id': self.id,
+            'kind': self.kind,
+            'label': self.label,
+            'status': self.status,
+            'message': self.message,
+            'progress': self.progress,
+            'details': self.details,
+            'result': self.result,
+            'error': self.error,
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+            'elapsed_seconds': round(end - self.started_at, 3) if self.started_at else None
+        }
+
+def follow_output(process, on_output):
+    """
+    Lit la sortie standard du processus dans un thread (lancé, à attendre avec join)
+    et passe chaque ligne à on_output.
+    """
+    def read():
+        with process.stdout:
+            for line in iter(process.stdout.readline, b''):
+                try:
+                    on_output(line)
+                except Exception as e:
+                    # Un avancement mal lu ne doit pas bloquer le processus (tube plein)
+                    print(f"Sortie du processus {process.pid} ignorée: {e}")
+    
+    reader = threading.Thread(target=read, name=f'output-{process.pid}', daemon=True)
+    reader.start()
+    return reader
+
+def _terminate(process):
+    if process.poll() is not None:
+        return
+    try:
+        if os.name == 'posix':
+            os.killpg(process.pid, signal.SIGTERM)
+        else:
+            process.terminate()
+    except (ProcessLookupError, PermissionError):
+        pass
+
+class JobQueue:
+    """
+    File de tâches exécutées par un pool de threads borné.
+    
+    Args:
+        workers: Nombre de tâches exécutées en même temps (par défaut: nombre de cœurs)
+        max_ffmpeg: Nombre maximal de processus ffmpeg simultanés, toutes tâches confondues
+        history: Nombre de tâches terminées conservées pour consultation
+        on_state_change: Appelée avec la tâche lorsqu'elle est ajoutée, démarre et se
+            termine (historique persistant des tâches)
+    """
+    
+    def __init__(self, workers=None, max_ffmpeg=None, history=200, on_state_change=None):
+        self.workers = workers or os.cpu_count() or 1
+        self.max_ffmpeg = max_ffmpeg or default_ffmpeg_limit()
+        self.history = history
+        self.on_state_change = on_state_change
+        self.ffmpeg_slots = threading.BoundedSemaphore(self.max_ffmpeg)
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='job')
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def submit(self, kind, label, function, *args, **kwargs):
+        """
+        Ajoute une tâche à la file et rend la main immédiatement.
+        
+        Args:
+            kind: Type de tâche ('clips', ...)
+            label: Projet concerné (nom du fichier), pour filtrer la liste des tâches
+            function: Appelée avec (job, *args, **kwargs); sa valeur de retour devient job.result
+        """
+        job = Job(kind, label, self)
+        with self._lock:
+            self._jobs[job.id] = job
+            self._prune()
+        self._state_changed(job)
+        job.future = self._executor.submit(self._run, job, function, args, kwargs)
+        return job
+    
+    def _state_changed(self, job):
+        if self.on_state_change is None:
+            return
+        try:
+            self.on_state_change(job)
+        except Exception as e:
+            # L'historique ne doit pas faire échouer la tâche
+            print(f"État de la tâche {job.id} non enregistré: {e}")
+    
+    def _run(self, job, function, args, kwargs):
+        if job.cancel_requested:
+            job.status = CANCELLED
+            job.message = "Annulé"
+            job.finished_at = time.time()
+            self._state_changed(job)
+            return
+        job.status = RUNNING
+        job.started_at = time.time()
+        job.message = "En cours"
+        self._state_changed(job)
+        try:
+            job.result = function(job, *args, **kwargs)
+            job.status = SUCCEEDED
+            job.message = "Terminé"
+            job.progress = 1.0
+        except JobCancelled:
+            job.status = CANCELLED
+            job.message = "Annulé"
+        except Exception as e:
+            job.status = FAILED
+            job.error = str(e)
+            job.message = "Échec"
+            print(f"Tâche {job.id} ({job.kind} {job.label}) en échec: {e}")
+        finally:
+            job.finished_at = time.time()
+            self._state_changed(job)
+    
+    def _prune(self):
+        finished = [job_id for job_id, job in self._jobs.items() if job.status in FINISHED_STATES]
+        for job_id in finished[:max(0, len(finished) - self.history)]:
+            del self._jobs[job_id]
+    
+    def get(self, job_id):
+        """Tâche d'identifiant job_id, ou None"""
+        with self._lock:
+            return self._jobs.get(job_id)
+    
+    def list(self, label=None):
+        """Tâches connues, des plus récentes aux plus anciennes, éventuellement pour un seul projet"""
+        with self._lock:
+            jobs = list(self._jobs.values())
+        return [job for job in reversed(jobs) if label is None or job.label == label]
+    
+    def cancel(self, job_id):
+        """
+        Annule une tâche en attente ou en cours.
+        
+        Returns:
+            False si la tâche n'existe pas ou est déjà terminée
+        """
+        job = self.get(job_id)
+        if job is None or job.status in FINISHED_STATES:
+            return False
+        job._request_cancel()
+        if job.future is not None and job.future.cancel():
+            # Pas encore démarrée: retirée de la file
+            job.status = CANCELLED
+            job.message = "Annulé"
+            job.finished_at = time.time()
+            self._state_changed(job)
+        return True
+    
+    def shutdown(self, wait=True):
+        """Annule les tâches en cours puis arrête le pool"""
+        for job in self.list():
+            if job.status not in FINISHED_STATES:
+                self.cancel(job.id)
+        self._executor.shutdown(wait=wait)
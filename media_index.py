@@ -0,0 +1,242 @@
+"""
+Index des vidéos envoyées: images clés, durée, pistes et paramètres des codecs.
+
+ffprobe n'est lancé qu'une fois par vidéo, en tâche de fond après l'envoi. Le résultat
+est enregistré dans un petit fichier binaire à côté de la vidéo (`<vidéo>.midx`), relu
+ensuite par le rendu (coupes en copie de flux alignées sur les images clés, citations
+hors de la vidéo refusées) et par l'éditeur vidéo (poignées calées sur les images clés).
+
+Format du fichier (petit-boutiste):
+- en-tête HEADER: signature, version, nombre de pistes, durée (secondes), taille et
+  date de modification de la vidéo indexée (un index périmé est ignoré), nombre
+  d'images clés;
+- une entrée STREAM par piste;
+- les images clés de la première piste vidéo, en millisecondes (entiers 32 bits).
+"""
+import json
+import os
+import struct
+import subprocess
+import sys
+from array import array
+
+MAGIC = b'MIDX'
+FORMAT_VERSION = 1
+
+HEADER = struct.Struct('<4sBxHdQqI')
+# index, type, codec, format des pixels ou des échantillons, largeur, hauteur,
+# images par seconde (numérateur, dénominateur), fréquence, canaux, débit
+STREAM = struct.Struct('<HB15s12sHHIIIHQ')
+
+STREAM_TYPES = {'video': b'v', 'audio': b'a', 'subtitle': b's', 'data': b'd'}
+_STREAM_TYPE_NAMES = {code[0]: name for name, code in STREAM_TYPES.items()}
+
+INDEX_EXTENSION = '.midx'
+
+class MediaIndex:
+    """
+    Index d'une vidéo.
+    
+    Les images clés sont gardées en millisecondes dans un tableau d'entiers, comme dans
+    le fichier; `keyframes` les donne en secondes.
+    """
+    __slots__ = ('duration', 'streams', 'keyframes_ms', 'source_size', 'source_mtime_ns')
+    
+    def __init__(self, duration, streams, keyframes_ms, source_size=0, source_mtime_ns=0):
+        self.duration = duration
+        self.streams = streams
+        self.keyframes_ms = array('I', keyframes_ms)
+        self.source_size = source_size
+        self.source_mtime_ns = source_mtime_ns
+    
+    @property
+    def keyframes(self):
+        """Instants des images clés (secondes, triés)"""
+        return [ms / 1000 for ms in self.keyframes_ms]
+    
+    @property
+    def has_audio(self):
+        return any(stream['type'] == 'audio' for stream in self.streams)
+    
+    @property
+    def video_stream(self):
+        """Première piste vidéo, ou None"""
+        return next((stream for stream in self.streams if stream['type'] == 'video'), None)
+    
+    def matches(self, video_path):
+        """L'index correspond-il encore au fichier vidéo (même taille, même date) ?"""
+        try:
+            stat = os.stat(video_path)
+        except OSError:
+            return False
+        return stat.st_size == self.source_size and stat.st_mtime_ns == self.source_mtime_ns
+    
+    def to_dict(self):
+        """Index sérialisable en JSON (éditeur vidéo)"""
+        return {
+            'duration': round(self.duration, 3),
+            'streams': self.streams,
+            'keyframes': self.keyframes
+        }
+
+def index_path(video_path):
+    """Fichier d'index d'une vidéo"""
+    return os.path.splitext(video_path)[0] + INDEX_EXTENSION
+
+def run_ffprobe(arguments):
+    """Sortie standard de ffprobe"""
+    completed = subprocess.run(arguments, stdin=subprocess.DEVNULL, capture_output=True, text=True)
+    if completed.returncode != 0:
+        raise RuntimeError(f"ffprobe a échoué: {completed.stderr.strip()}")
+    return completed.stdout
+
+def streams_probe_command(video_path, ffprobe='ffprobe'):
+    """Commande ffprobe qui décrit le conteneur et ses pistes (JSON)"""
+    return [ffprobe, '-v', 'error', '-show_entries',
+            'format=duration:stream=index,codec_type,codec_name,pix_fmt,sample_fmt,width,height,'
+            'r_frame_rate,sample_rate,channels,bit_rate',
+            '-of', 'json', video_path]
+
+def keyframes_probe_command(video_path, ffprobe='ffprobe'):
+    """Commande ffprobe qui liste tous les paquets de la première piste vidéo (sans décodage)"""
+    return [ffprobe, '-v', 'error', '-select_streams', 'v:0', '-show_entries', 'packet=pts_time,flags',
+            '-of', 'csv=p=0', video_path]
+
+def parse_keyframes(output):
+    """Instants (secondes, triés) des paquets marqués comme images clés dans la sortie de ffprobe"""
+    keyframes = set()
+    for line in output.splitlines():
+        pts_time, _, flags = line.strip().partition(',')
+        if 'K' in flags:
+            try:
+                keyframes.add(float(pts_time))
+            except ValueError:
+                # pts_time=N/A
+                continue
+    return sorted(keyframes)
+
+def _number(value, convert=int):
+    try:
+        return convert(value)
+    except (TypeError, ValueError):
+        # Champ absent ou 'N/A'
+        return 0
+
+def parse_streams(output):
+    """
+    Durée et pistes décrites par ffprobe (sortie JSON de streams_probe_command).
+    
+    Returns:
+        (durée en secondes, liste de dictionnaires par piste)
+    """
+    data = json.loads(output or '{}')
+    streams = []
+    for stream in data.get('streams', []):
+        numerator, _, denominator = str(stream.get('r_frame_rate', '0/1')).partition('/')
+        streams.append({
+            'index': _number(stream.get('index')),
+            'type': stream.get('codec_type', 'data') if stream.get('codec_type') in STREAM_TYPES else 'data',
+            'codec': stream.get('codec_name', ''),
+            'format': stream.get('pix_fmt') or stream.get('sample_fmt') or '',
+            'width': _number(stream.get('width')),
+            'height': _number(stream.get('height')),
+            'frame_rate': [_number(numerator), _number(denominator) or 1],
+            'sample_rate': _number(stream.get('sample_rate')),
+            'channels': _number(stream.get('channels')),
+            'bit_rate': _number(stream.get('bit_rate'))
+        })
+    return _number(data.get('format', {}).get('duration'), float), streams
+
+def build_media_index(video_path, ffprobe='ffprobe', run=run_ffprobe):
+    """
+    Indexe une vidéo avec ffprobe: description des pistes, puis liste des paquets vidéo
+    (sans décodage) pour les images clés.
+    
+    Raises:
+        OSError, RuntimeError: ffprobe introuvable ou en échec
+    """
+    stat = os.stat(video_path)
+    duration, streams = parse_streams(run(streams_probe_command(video_path, ffprobe)))
+    keyframes = []
+    if any(stream['type'] == 'video' for stream in streams):
+        keyframes = parse_keyframes(run(keyframes_probe_command(video_path, ffprobe)))
+    return MediaIndex(duration, streams, [max(0, round(time_seconds * 1000)) for time_seconds in keyframes],
+                      stat.st_size, stat.st_mtime_ns)
+
+def _fixed(text, size):
+    return text.encode('utf-8')[:size]
+
+def _text(raw):
+    return raw.rstrip(b'\0').decode('utf-8', 'replace')
+
+def write_media_index(index, path):
+    """Écrit l'index (fichier temporaire puis renommage: un lecteur ne voit jamais un index partiel)"""
+    parts = [HEADER.pack(MAGIC, FORMAT_VERSION, len(index.streams), index.duration, index.source_size,
+                         index.source_mtime_ns, len(index.keyframes_ms))]
+    for stream in index.streams:
+        parts.append(STREAM.pack(stream['index'], STREAM_TYPES[stream['type']][0], _fixed(stream['codec'], 15),
+                                 _fixed(stream['format'], 12), stream['width'], stream['height'],
+                                 stream['frame_rate'][0], stream['frame_rate'][1], stream['sample_rate'],
+                                 stream['channels'], stream['bit_rate']))
+    keyframes = array('I', index.keyframes_ms)
+    if sys.byteorder == 'big':
+        keyframes.byteswap()
+    parts.append(keyframes.tobytes())
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, 'wb') as f:
+        f.write(b''.join(parts))
+    os.replace(temp_path, path)
+
+def read_media_index(path):
+    """
+    Lit un fichier d'index.
+    
+    Raises:
+        OSError: fichier illisible
+        ValueError: fichier qui n'est pas un index, ou d'une autre version
+    """
+    with open(path, 'rb') as f:
+        data = f.read()
+    if len(data) < HEADER.size:
+        raise ValueError(f"Index tronqué: {path}")
+    magic, version, stream_count, duration, size, mtime_ns, keyframe_count = HEADER.unpack_from(data)
+    if magic != MAGIC or version != FORMAT_VERSION:
+        raise ValueError(f"Fichier d'index inconnu ou d'une autre version: {path}")
+    expected = HEADER.size + stream_count * STREAM.size + keyframe_count * 4
+    if len(data) != expected:
+        raise ValueError(f"Index tronqué: {path}")
+    streams = []
+    for offset in range(HEADER.size, HEADER.size + stream_count * STREAM.size, STREAM.size):
+        (stream_index, code, codec, sample_format, width, height, rate_num, rate_den, sample_rate,
+         channels, bit_rate) = STREAM.unpack_from(data, offset)
+        streams.append({
+            'index': stream_index,
+            'type': _STREAM_TYPE_NAMES.get(code, 'data'),
+            'codec': _text(codec),
+            'format': _text(sample_format),
+            'width': width,
+            'height': height,
+            'frame_rate': [rate_num, rate_den],
+            'sample_rate': sample_rate,
+            'channels': channels,
+            'bit_rate': bit_rate
+        })
+    keyframes = array('I')
+    keyframes.frombytes(data[HEADER.size + stream_count * STREAM.size:])
+    if sys.byteorder == 'big':
+        keyframes.byteswap()
+    return MediaIndex(duration, streams, keyframes, size, mtime_ns)
+
+def load_media_index(video_path):
+    """Index à jour de la vidéo, ou None (pas encore indexée, index périmé ou illisible)"""
+    try:
+        index = read_media_index(index_path(video_path))
+    except (OSError, ValueError):
+        return None
+    return index if index.matches(video_path) else None
+
+def index_video(video_path, ffprobe='ffprobe', run=run_ffprobe):
+    """Indexe la vidéo et enregistre l'index à côté d'elle; renvoie l'index"""
+    index = build_media_index(video_path, ffprobe, run)
+    write_media_index(index, index_path(video_path))
+    return index
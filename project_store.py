@@ -0,0 +1,673 @@
+"""
+Stockage des projets dans une base SQLite.
+
+Un projet (nom du fichier SRT envoyé) regroupe ses sous-titres, ses citations, les
+paramètres de son analyse, le style de ses sous-titres incrustés et l'historique de
+ses tâches (analyses, indexations, rendus). Les exports (texte, JSON, SRT édité,
+scripts FFmpeg) ne sont plus la source des données: ils sont générés à partir de la
+base quand on les demande.
+
+La base est en mode WAL: les lectures ne bloquent pas les écritures, et plusieurs
+threads ou processus (pool d'analyse) peuvent écrire; chaque écriture est une
+transaction courte (BEGIN IMMEDIATE) et une modification dans l'éditeur ne met à jour
+que les citations qui ont changé.
+
+Chaque citation a un identifiant stable et une version: les éditeurs modifient,
+insèrent, suppriment ou déplacent une citation à la fois, et une modification faite à
+partir d'une version dépassée est refusée (VersionConflict) au lieu d'écraser celle de
+quelqu'un d'autre. Toute modification donne une nouvelle version au projet; la version
+à laquelle chaque export a été généré est enregistrée, avec l'empreinte de son contenu:
+un export n'est régénéré que s'il est dépassé, et n'est renvoyé au client que si son
+contenu a changé.
+
+Les sous-titres de tous les projets sont indexés (FTS5) pour la recherche plein texte;
+l'index est mis à jour dans la transaction qui enregistre les sous-titres d'un projet.
+"""
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+
+import srt
+
+from extract_srt_quotes import Quote, format_timecode, quote_from_json, quote_to_json
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS projects (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    options TEXT,
+    subtitle_options TEXT
+);
+CREATE TABLE IF NOT EXISTS subtitles (
+    project_id INTEGER NOT NULL REFERENCES projects(id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    start_ms INTEGER NOT NULL,
+    end_ms INTEGER NOT NULL,
+    content TEXT NOT NULL,
+    PRIMARY KEY (project_id, position)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS subtitles_time ON subtitles(project_id, start_ms);
+CREATE TABLE IF NOT EXISTS quotes (
+    id INTEGER PRIMARY KEY,
+    project_id INTEGER NOT NULL REFERENCES projects(id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    content TEXT NOT NULL,
+    start_ms INTEGER NOT NULL,
+    end_ms INTEGER NOT NULL,
+    is_long INTEGER NOT NULL DEFAULT 0,
+    has_keyword INTEGER NOT NULL DEFAULT 0,
+    is_topic_change INTEGER NOT NULL DEFAULT 0,
+    extra TEXT,
+    updated_at REAL NOT NULL
+);
+CREATE UNIQUE INDEX IF NOT EXISTS quotes_position ON quotes(project_id, position);
+CREATE INDEX IF NOT EXISTS quotes_time ON quotes(project_id, start_ms);
+CREATE TABLE IF NOT EXISTS render_jobs (
+    id TEXT PRIMARY KEY,
+    project_id INTEGER NOT NULL REFERENCES projects(id) ON DELETE CASCADE,
+    kind TEXT NOT NULL,
+    status TEXT NOT NULL,
+    message TEXT,
+    error TEXT,
+    result TEXT,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL
+);
+CREATE INDEX IF NOT EXISTS render_jobs_project ON render_jobs(project_id, created_at);
+"""
+
+# Version 2: versions des citations (modifications concurrentes) et du projet, version
+# du projet à laquelle chaque export a été généré
+SCHEMA_V2 = """
+ALTER TABLE quotes ADD COLUMN version INTEGER NOT NULL DEFAULT 1;
+ALTER TABLE projects ADD COLUMN version INTEGER NOT NULL DEFAULT 0;
+CREATE TABLE IF NOT EXISTS artifacts (
+    project_id INTEGER NOT NULL REFERENCES projects(id) ON DELETE CASCADE,
+    kind TEXT NOT NULL,
+    version INTEGER NOT NULL,
+    generated_at REAL NOT NULL,
+    PRIMARY KEY (project_id, kind)
+) WITHOUT ROWID;
+"""
+
+# Version 3: empreinte du contenu de chaque export (ETag) et date de son dernier
+# changement de contenu (Last-Modified)
+SCHEMA_V3 = """
+ALTER TABLE artifacts ADD COLUMN sha256 TEXT;
+ALTER TABLE artifacts ADD COLUMN modified_at REAL;
+"""
+
+# Version 4: index plein texte des sous-titres de tous les projets. Sans contenu
+# (content=''): le texte est déjà dans la table subtitles, l'index n'en garde que les
+# mots; chaque ligne est identifiée par (projet << 32) | position
+SCHEMA_V4 = """
+CREATE VIRTUAL TABLE IF NOT EXISTS subtitles_fts USING fts5(
+    content, content='', tokenize='unicode61 remove_diacritics 2'
+);
+INSERT INTO subtitles_fts (rowid, content) SELECT (project_id << 32) | position, content FROM subtitles;
+"""
+
+# Schéma de chaque version de la base, appliqués dans l'ordre
+MIGRATIONS = (SCHEMA, SCHEMA_V2, SCHEMA_V3, SCHEMA_V4)
+SCHEMA_VERSION = len(MIGRATIONS)
+
+# Colonnes d'une citation, dans l'ordre des requêtes
+_QUOTE_COLUMNS = ('content', 'start_ms', 'end_ms', 'is_long', 'has_keyword', 'is_topic_change', 'extra')
+
+def _quote_row(quote):
+    """Valeurs des colonnes d'une citation (Quote)"""
+    return (quote.content, quote.start_ms, quote.end_ms, int(bool(quote.is_long)), int(bool(quote.has_keyword)),
+            int(bool(quote.is_topic_change)), json.dumps(quote.extra, ensure_ascii=False) if quote.extra else None)
+
+def _quote_from_row(row):
+    content, start_ms, end_ms, is_long, has_keyword, is_topic_change, extra = row
+    return Quote(content, start_ms, end_ms, bool(is_long), bool(has_keyword), bool(is_topic_change),
+                 json.loads(extra) if extra else None)
+
+def _quote_entry(row):
+    """Citation au format JSON des éditeurs, avec son identifiant, sa version et sa position"""
+    quote_id, version, position = row[:3]
+    return {'id': quote_id, 'version': version, 'position': position, **quote_to_json(_quote_from_row(row[3:]))}
+
+def _times(start_ms, end_ms):
+    """Temps d'un résultat de recherche, dans le format de l'export JSON"""
+    start, end = timedelta(milliseconds=start_ms), timedelta(milliseconds=end_ms)
+    return {
+        'start_time_seconds': start.total_seconds(),
+        'end_time_seconds': end.total_seconds(),
+        'formatted_start': format_timecode(start),
+        'formatted_end': format_timecode(end)
+    }
+
+def _passage_text(lines):
+    return ' '.join(content.replace('\n', ' ') for _, _, _, content in lines)
+
+def fts_query(text):
+    """
+    Requête FTS5 d'après une recherche saisie: chaque mot (ou "expression entre
+    guillemets") est cherché tel quel, sans la syntaxe FTS5 (opérateurs, colonnes) qui
+    ferait échouer la requête; un mot terminé par * est cherché comme préfixe.
+    
+    Raises:
+        ValueError: aucun mot dans la recherche
+    """
+    terms = []
+    for phrase, word in re.findall(r'"([^"]*)"|(\S+)', text):
+        term = (phrase or word).replace('"', '')
+        prefix = bool(word) and term.endswith('*')
+        term = term.rstrip('*').strip()
+        if term:
+            terms.append(f'"{term}"' + ('*' if prefix else ''))
+    if not terms:
+        raise ValueError("Recherche vide")
+    return ' '.join(terms)
+
+class QuoteNotFound(LookupError):
+    """Citation inconnue dans ce projet (supprimée, ou projet réanalysé)"""
+
+class VersionConflict(Exception):
+    """
+    Citation modifiée entre-temps par quelqu'un d'autre: la version envoyée n'est plus
+    la version enregistrée.
+    
+    Attributes:
+        current: Citation enregistrée (avec sa version)
+    """
+    
+    def __init__(self, current):
+        super().__init__(f"Citation {current['id']} modifiée entre-temps (version {current['version']})")
+        self.current = current
+
+class ProjectStore:
+    """
+    Base des projets, partagée entre les threads (une connexion par thread).
+    
+    Args:
+        path: Fichier de la base (créé au besoin)
+        timeout: Attente maximale (secondes) d'un verrou d'écriture tenu par un autre
+            thread ou processus
+    """
+    
+    def __init__(self, path, timeout=30.0):
+        self.path = path
+        self.timeout = timeout
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        if self._connection().execute("PRAGMA user_version").fetchone()[0] < SCHEMA_VERSION:
+            self._migrate()
+    
+    def _migrate(self):
+        # Plusieurs processus peuvent ouvrir la base en même temps: la version est relue
+        # sous le verrou d'écriture, chaque schéma n'est appliqué qu'une fois
+        with self._write() as db:
+            version = db.execute("PRAGMA user_version").fetchone()[0]
+            for target, schema in enumerate(MIGRATIONS, 1):
+                if version < target:
+                    for statement in schema.split(';'):
+                        if statement.strip():
+                            db.execute(statement)
+            db.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+    
+    def _connection(self):
+        db = getattr(self._local, 'db', None)
+        if db is None:
+            # Autocommit: les transactions sont ouvertes explicitement par _write
+            db = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+            db.execute("PRAGMA journal_mode = WAL")
+            db.execute("PRAGMA synchronous = NORMAL")
+            db.execute("PRAGMA foreign_keys = ON")
+            self._local.db = db
+        return db
+    
+    @contextmanager
+    def _write(self):
+        """Transaction d'écriture: le verrou est pris dès le début, validée ou annulée à la fin"""
+        db = self._connection()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            yield db
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+        db.execute("COMMIT")
+    
+    def close(self):
+        """Ferme la connexion du thread courant"""
+        db = getattr(self._local, 'db', None)
+        if db is not None:
+            db.close()
+            self._local.db = None
+    
+    @staticmethod
+    def _ensure(db, name):
+        """Identifiant du projet, créé s'il n'existe pas (dans une transaction d'écriture)"""
+        now = time.time()
+        db.execute("INSERT INTO projects (name, created_at, updated_at) VALUES (?, ?, ?) "
+                   "ON CONFLICT(name) DO UPDATE SET updated_at = excluded.updated_at", (name, now, now))
+        return db.execute("SELECT id FROM projects WHERE name = ?", (name,)).fetchone()[0]
+    
+    @staticmethod
+    def _touch(db, project_id):
+        """Nouvelle version du projet: ses exports sont à régénérer"""
+        db.execute("UPDATE projects SET version = version + 1, updated_at = ? WHERE id = ?", (time.time(), project_id))
+    
+    def get_project(self, name):
+        """Projet (name, version, created_at, updated_at, options, subtitle_options, quotes), ou None"""
+        row = self._connection().execute(
+            "SELECT id, version, created_at, updated_at, options, subtitle_options FROM projects WHERE name = ?",
+            (name,)).fetchone()
+        if row is None:
+            return None
+        project_id, version, created_at, updated_at, options, subtitle_options = row
+        quote_count = self._connection().execute("SELECT COUNT(*) FROM quotes WHERE project_id = ?",
+                                                 (project_id,)).fetchone()[0]
+        return {
+            'name': name,
+            'version': version,
+            'created_at': created_at,
+            'updated_at': updated_at,
+            'options': json.loads(options) if options else {},
+            'subtitle_options': json.loads(subtitle_options) if subtitle_options else None,
+            'quotes': quote_count
+        }
+    
+    def save_analysis(self, name, quotes, subtitles=None, options=None):
+        """
+        Enregistre le résultat d'une analyse: remplace les citations (et les sous-titres
+        s'ils sont fournis) du projet, en une seule transaction.
+        
+        Args:
+            quotes: Citations retenues (Quote), dans l'ordre
+            subtitles: Sous-titres de la transcription (srt.Subtitle, itérable lu une fois)
+            options: Paramètres de l'analyse
+        """
+        now = time.time()
+        with self._write() as db:
+            project_id = self._ensure(db, name)
+            if options is not None:
+                db.execute("UPDATE projects SET options = ? WHERE id = ?",
+                           (json.dumps(options, ensure_ascii=False), project_id))
+            db.execute("DELETE FROM quotes WHERE project_id = ?", (project_id,))
+            db.executemany(
+                f"INSERT INTO quotes (project_id, position, {', '.join(_QUOTE_COLUMNS)}, updated_at) "
+                f"VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                ((project_id, position) + _quote_row(quote) + (now,) for position, quote in enumerate(quotes)))
+            if subtitles is not None:
+                self._replace_subtitles(db, project_id, subtitles)
+            self._touch(db, project_id)
+    
+    def save_subtitles(self, name, subtitles):
+        """
+        Remplace les sous-titres du projet (créé au besoin) sans toucher à ses citations:
+        indexation de transcriptions déjà traitées.
+        
+        Returns:
+            Nombre de sous-titres enregistrés
+        """
+        with self._write() as db:
+            project_id = self._ensure(db, name)
+            count = self._replace_subtitles(db, project_id, subtitles)
+            self._touch(db, project_id)
+        return count
+    
+    @staticmethod
+    def _replace_subtitles(db, project_id, subtitles):
+        """Remplace les sous-titres d'un projet et leurs entrées de l'index plein texte"""
+        # Index sans contenu: une entrée se retire en redonnant le texte indexé
+        db.execute("INSERT INTO subtitles_fts (subtitles_fts, rowid, content) "
+                   "SELECT 'delete', (project_id << 32) | position, content FROM subtitles WHERE project_id = ?",
+                   (project_id,))
+        db.execute("DELETE FROM subtitles WHERE project_id = ?", (project_id,))
+        count = db.executemany(
+            "INSERT INTO subtitles (project_id, position, start_ms, end_ms, content) VALUES (?, ?, ?, ?, ?)",
+            ((project_id, position, round(subtitle.start.total_seconds() * 1000),
+              round(subtitle.end.total_seconds() * 1000), subtitle.content)
+             for position, subtitle in enumerate(subtitles))).rowcount
+        db.execute("INSERT INTO subtitles_fts (rowid, content) "
+                   "SELECT (project_id << 32) | position, content FROM subtitles WHERE project_id = ?", (project_id,))
+        return count
+    
+    def quotes(self, name):
+        """Citations du projet (Quote), dans l'ordre"""
+        return [_quote_from_row(row) for row in self._connection().execute(
+            f"SELECT {', '.join(_QUOTE_COLUMNS)} FROM quotes JOIN projects ON projects.id = quotes.project_id "
+            f"WHERE projects.name = ? ORDER BY position", (name,))]
+    
+    def update_quotes(self, name, quotes):
+        """
+        Enregistre la liste des citations modifiée dans un éditeur: seules les citations
+        qui ont changé sont réécrites, les citations en trop sont supprimées.
+        
+        Returns:
+            Nombre de citations modifiées, ajoutées ou supprimées
+        """
+        now = time.time()
+        rows = [_quote_row(quote) for quote in quotes]
+        with self._write() as db:
+            project_id = self._ensure(db, name)
+            current = {row[0]: row[1:] for row in db.execute(
+                f"SELECT position, {', '.join(_QUOTE_COLUMNS)} FROM quotes WHERE project_id = ?", (project_id,))}
+            changes = 0
+            for position, row in enumerate(rows):
+                if position not in current:
+                    db.execute(f"INSERT INTO quotes (project_id, position, {', '.join(_QUOTE_COLUMNS)}, updated_at) "
+                               f"VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", (project_id, position) + row + (now,))
+                    changes += 1
+                elif current[position] != row:
+                    db.execute(f"UPDATE quotes SET {', '.join(f'{column} = ?' for column in _QUOTE_COLUMNS)}, "
+                               f"version = version + 1, updated_at = ? WHERE project_id = ? AND position = ?",
+                               row + (now, project_id, position))
+                    changes += 1
+            changes += db.execute("DELETE FROM quotes WHERE project_id = ? AND position >= ?",
+                                  (project_id, len(rows))).rowcount
+            if changes:
+                self._touch(db, project_id)
+        return changes
+    
+    def add_quote(self, name, quote):
+        """Ajoute une citation à la fin de la liste; renvoie sa position"""
+        return self.insert_quote(name, quote)['position']
+    
+    def _entries(self, db, where, parameters):
+        return [_quote_entry(row) for row in db.execute(
+            f"SELECT quotes.id, quotes.version, position, {', '.join(_QUOTE_COLUMNS)} FROM quotes "
+            f"JOIN projects ON projects.id = quotes.project_id WHERE {where} ORDER BY position", parameters)]
+    
+    def quote_entries(self, name):
+        """Citations du projet au format JSON des éditeurs, avec identifiant, version et position"""
+        return self._entries(self._connection(), "projects.name = ?", (name,))
+    
+    def get_quote(self, name, quote_id):
+        """Citation d'identifiant quote_id (format de quote_entries), ou None"""
+        entries = self._entries(self._connection(), "projects.name = ? AND quotes.id = ?", (name, quote_id))
+        return entries[0] if entries else None
+    
+    def _locate(self, db, name, quote_id, version):
+        """
+        Projet et position d'une citation dont la version est encore celle envoyée
+        (dans une transaction d'écriture).
+        
+        Raises:
+            QuoteNotFound: citation inconnue dans ce projet
+            VersionConflict: citation modifiée depuis la version envoyée
+        """
+        entries = self._entries(db, "projects.name = ? AND quotes.id = ?", (name, quote_id))
+        if not entries:
+            raise QuoteNotFound(quote_id)
+        if entries[0]['version'] != version:
+            raise VersionConflict(entries[0])
+        return db.execute("SELECT project_id FROM quotes WHERE id = ?", (quote_id,)).fetchone()[0], entries[0]
+    
+    @staticmethod
+    def _shift(db, project_id, low, high, delta):
+        """Décale de delta (+1 ou -1) les positions comprises entre low (inclus) et high (exclu)"""
+        # En deux passes par des positions négatives: l'index unique sur les positions est
+        # vérifié ligne par ligne et refuserait un décalage fait en place
+        db.execute("UPDATE quotes SET position = -(position + ?) - 1 WHERE project_id = ? AND position >= ? "
+                   "AND position < ?", (delta, project_id, low, high))
+        db.execute("UPDATE quotes SET position = -position - 1 WHERE project_id = ? AND position < 0", (project_id,))
+    
+    def insert_quote(self, name, quote, position=None, chronological=False):
+        """
+        Insère une citation (Quote) à une position (par défaut à la fin), les suivantes
+        sont décalées.
+        
+        Args:
+            chronological: Sans position, insérer la citation après celles qui commencent
+                avant elle plutôt qu'à la fin
+        
+        Returns:
+            Citation enregistrée (format de quote_entries)
+        """
+        with self._write() as db:
+            project_id = self._ensure(db, name)
+            count = db.execute("SELECT COUNT(*) FROM quotes WHERE project_id = ?", (project_id,)).fetchone()[0]
+            if position is None and chronological:
+                position = db.execute("SELECT COUNT(*) FROM quotes WHERE project_id = ? AND start_ms < ?",
+                                      (project_id, quote.start_ms)).fetchone()[0]
+            position = count if position is None else max(0, min(position, count))
+            self._shift(db, project_id, position, count, 1)
+            quote_id = db.execute(
+                f"INSERT INTO quotes (project_id, position, {', '.join(_QUOTE_COLUMNS)}, updated_at) "
+                f"VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (project_id, position) + _quote_row(quote) + (time.time(),)).lastrowid
+            self._touch(db, project_id)
+            return self._entries(db, "quotes.id = ?", (quote_id,))[0]
+    
+    def patch_quote(self, name, quote_id, version, fields):
+        """
+        Modifie une citation, si elle n'a pas changé depuis la version lue par l'éditeur.
+        
+        Args:
+            quote_id: Identifiant de la citation
+            version: Version lue par l'éditeur
+            fields: Champs modifiés, au format de l'export JSON (content, start_time_seconds, ...)
+        
+        Returns:
+            Citation enregistrée, avec sa nouvelle version
+        
+        Raises:
+            QuoteNotFound, VersionConflict
+            ValueError: fin de la citation avant son début
+        """
+        with self._write() as db:
+            project_id, current = self._locate(db, name, quote_id, version)
+            quote = quote_from_json({**current, **fields})
+            if quote.end_ms < quote.start_ms:
+                raise ValueError("La fin de la citation précède son début")
+            row = _quote_row(quote)
+            db.execute(f"UPDATE quotes SET {', '.join(f'{column} = ?' for column in _QUOTE_COLUMNS)}, "
+                       f"version = version + 1, updated_at = ? WHERE id = ?", row + (time.time(), quote_id))
+            self._touch(db, project_id)
+            return self._entries(db, "quotes.id = ?", (quote_id,))[0]
+    
+    def delete_quote(self, name, quote_id, version):
+        """
+        Supprime une citation, si elle n'a pas changé depuis la version lue par l'éditeur;
+        les suivantes remontent d'une position.
+        
+        Returns:
+            Citation supprimée
+        
+        Raises:
+            QuoteNotFound, VersionConflict
+        """
+        with self._write() as db:
+            project_id, current = self._locate(db, name, quote_id, version)
+            db.execute("DELETE FROM quotes WHERE id = ?", (quote_id,))
+            count = db.execute("SELECT COUNT(*) FROM quotes WHERE project_id = ?", (project_id,)).fetchone()[0]
+            self._shift(db, project_id, current['position'] + 1, count + 1, -1)
+            self._touch(db, project_id)
+        return current
+    
+    def move_quote(self, name, quote_id, version, position):
+        """
+        Déplace une citation à une autre position (les citations entre les deux sont
+        décalées), si elle n'a pas changé depuis la version lue par l'éditeur.
+        
+        Returns:
+            Citation déplacée, avec sa nouvelle version
+        
+        Raises:
+            QuoteNotFound, VersionConflict
+        """
+        with self._write() as db:
+            project_id, current = self._locate(db, name, quote_id, version)
+            count = db.execute("SELECT COUNT(*) FROM quotes WHERE project_id = ?", (project_id,)).fetchone()[0]
+            source = current['position']
+            target = max(0, min(position, count - 1))
+            if target != source:
+                # Citation mise de côté après la dernière position pendant le décalage
+                db.execute("UPDATE quotes SET position = ? WHERE id = ?", (count, quote_id))
+                if target < source:
+                    self._shift(db, project_id, target, source, 1)
+                else:
+                    self._shift(db, project_id, source + 1, target + 1, -1)
+                db.execute("UPDATE quotes SET position = ?, version = version + 1, updated_at = ? WHERE id = ?",
+                           (target, time.time(), quote_id))
+                self._touch(db, project_id)
+            return self._entries(db, "quotes.id = ?", (quote_id,))[0]
+    
+    def artifact(self, name, kind):
+        """
+        Export kind du projet: version du projet à laquelle il a été généré, empreinte
+        SHA-256 de son contenu et date du dernier changement de ce contenu, ou None s'il n'a
+        jamais été généré
+        """
+        row = self._connection().execute(
+            "SELECT artifacts.version, sha256, modified_at FROM artifacts "
+            "JOIN projects ON projects.id = artifacts.project_id WHERE projects.name = ? AND kind = ?",
+            (name, kind)).fetchone()
+        if row is None:
+            return None
+        version, sha256, modified_at = row
+        return {'version': version, 'sha256': sha256, 'modified_at': modified_at}
+    
+    def mark_artifact(self, name, kind, version, sha256):
+        """
+        Enregistre que l'export kind a été généré à partir de la version version du projet.
+        La date de modification ne change que si le contenu (sha256) a changé.
+        """
+        now = time.time()
+        with self._write() as db:
+            project_id = self._ensure(db, name)
+            db.execute("INSERT INTO artifacts (project_id, kind, version, generated_at, sha256, modified_at) "
+                       "VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT(project_id, kind) DO UPDATE SET "
+                       "version = excluded.version, generated_at = excluded.generated_at, sha256 = excluded.sha256, "
+                       "modified_at = CASE WHEN sha256 IS excluded.sha256 THEN modified_at ELSE excluded.modified_at END",
+                       (project_id, kind, version, now, sha256, now))
+        return self.artifact(name, kind)
+    
+    def has_subtitles(self, name):
+        return self._connection().execute(
+            "SELECT 1 FROM subtitles JOIN projects ON projects.id = subtitles.project_id "
+            "WHERE projects.name = ? LIMIT 1", (name,)).fetchone() is not None
+    
+    def iter_subtitles(self, name):
+        """Sous-titres de la transcription du projet (srt.Subtitle), dans l'ordre, lus au fur et à mesure"""
+        cursor = self._connection().execute(
+            "SELECT position, start_ms, end_ms, content FROM subtitles JOIN projects ON projects.id = subtitles.project_id "
+            "WHERE projects.name = ? ORDER BY position", (name,))
+        for position, start_ms, end_ms, content in cursor:
+            yield srt.Subtitle(index=position + 1, start=timedelta(milliseconds=start_ms),
+                               end=timedelta(milliseconds=end_ms), content=content)
+    
+    def search(self, query, limit=20, context=2, project=None):
+        """
+        Recherche plein texte dans les sous-titres de tous les projets (ou d'un seul),
+        classée par pertinence (BM25).
+        
+        Args:
+            query: Mots recherchés (tous requis), "expressions entre guillemets", préfixes
+                terminés par *
+            limit: Nombre maximal de résultats
+            context: Sous-titres gardés avant et après chaque résultat (passage)
+            project: Nom du projet où chercher, ou None pour tous
+        
+        Returns:
+            Liste de résultats: project, position, content, temps de la ligne trouvée,
+            score et passage (content et temps)
+        
+        Raises:
+            ValueError: requête vide
+        """
+        db = self._connection()
+        sql = "SELECT rowid, rank FROM subtitles_fts WHERE subtitles_fts MATCH ?"
+        parameters = [fts_query(query)]
+        if project is not None:
+            row = db.execute("SELECT id FROM projects WHERE name = ?", (project,)).fetchone()
+            if row is None:
+                return []
+            # Les lignes d'un projet forment un intervalle de rowid
+            sql += " AND rowid BETWEEN ? AND ?"
+            parameters += [row[0] << 32, (row[0] << 32) | 0xFFFFFFFF]
+        matches = db.execute(sql + " ORDER BY rank LIMIT ?", parameters + [limit]).fetchall()
+        
+        names = {}
+        hits = []
+        for rowid, rank in matches:
+            project_id, position = rowid >> 32, rowid & 0xFFFFFFFF
+            if project_id not in names:
+                names[project_id] = db.execute("SELECT name FROM projects WHERE id = ?", (project_id,)).fetchone()[0]
+            lines = self._passage(db, project_id, position, context)
+            line = next(line for line in lines if line[0] == position)
+            hits.append({
+                'project': names[project_id],
+                'position': position,
+                'content': line[3],
+                **_times(line[1], line[2]),
+                'score': round(-rank, 4),
+                'passage': {
+                    'content': _passage_text(lines),
+                    **_times(lines[0][1], lines[-1][2])
+                }
+            })
+        return hits
+    
+    @staticmethod
+    def _passage(db, project_id, position, context):
+        """Sous-titres (position, start_ms, end_ms, content) autour d'une position"""
+        return db.execute("SELECT position, start_ms, end_ms, content FROM subtitles WHERE project_id = ? "
+                          "AND position BETWEEN ? AND ? ORDER BY position",
+                          (project_id, max(0, position - context), position + context)).fetchall()
+    
+    def passage_quote(self, name, position, context=2):
+        """
+        Citation candidate (Quote) formée du passage autour d'un sous-titre (résultat de
+        recherche), ou None si le sous-titre n'existe pas
+        """
+        db = self._connection()
+        row = db.execute("SELECT id FROM projects WHERE name = ?", (name,)).fetchone()
+        lines = self._passage(db, row[0], position, context) if row else []
+        if not any(line[0] == position for line in lines):
+            return None
+        return Quote(_passage_text(lines), lines[0][1], lines[-1][2])
+    
+    def set_subtitle_options(self, name, subtitle_options):
+        """Enregistre le style des sous-titres incrustés (options de l'éditeur vidéo)"""
+        with self._write() as db:
+            project_id = self._ensure(db, name)
+            value = json.dumps(subtitle_options, ensure_ascii=False)
+            if db.execute("UPDATE projects SET subtitle_options = ? WHERE id = ? AND subtitle_options IS NOT ?",
+                          (value, project_id, value)).rowcount:
+                self._touch(db, project_id)
+    
+    def record_job(self, job):
+        """Enregistre (ou met à jour) l'état d'une tâche (jobs.Job) dans l'historique du projet"""
+        with self._write() as db:
+            project_id = self._ensure(db, job.label)
+            db.execute(
+                "INSERT INTO render_jobs (id, project_id, kind, status, message, error, result, created_at, "
+                "started_at, finished_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT(id) DO UPDATE SET status = excluded.status, message = excluded.message, "
+                "error = excluded.error, result = excluded.result, started_at = excluded.started_at, "
+                "finished_at = excluded.finished_at",
+                (job.id, project_id, job.kind, job.status, job.message, job.error,
+                 json.dumps(job.result, ensure_ascii=False, default=str) if job.result is not None else None,
+                 job.created_at, job.started_at, job.finished_at))
+    
+    def jobs(self, name, limit=50):
+        """Historique des tâches du projet, des plus récentes aux plus anciennes"""
+        rows = self._connection().execute(
+            "SELECT render_jobs.id, kind, status, message, error, result, render_jobs.created_at, started_at, "
+            "finished_at FROM render_jobs JOIN projects ON projects.id = render_jobs.project_id "
+            "WHERE projects.name = ? ORDER BY render_jobs.created_at DESC LIMIT ?", (name, limit))
+        return [{
+            'id': job_id,
+            'kind': kind,
+            'status': status,
+            'message': message,
+            'error': error,
+            'result': json.loads(result) if result else None,
+            'created_at': created_at,
+            'started_at': started_at,
+            'finished_at': finished_at
+        } for job_id, kind, status, message, error, result, created_at, started_at, finished_at in rows]
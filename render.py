@@ -0,0 +1,630 @@
+"""
+Rendu des extraits vidéo piloté en Python.
+
+Les scripts bash générés encodent les extraits l'un après l'autre. Ici, plusieurs
+encodages ffmpeg tournent en parallèle (`jobs`) et les threads de la machine sont
+répartis entre eux. Chaque extrait a son propre code de retour et sa durée: un extrait
+en échec n'empêche pas les autres d'être rendus.
+
+Deux modes de découpe:
+- 'encode': réencodage libx264, avec incrustation éventuelle des sous-titres;
+- 'copy': copie des flux sans réencodage. Une copie ne peut commencer que sur une image
+  clé: les bornes des extraits sont déplacées sur l'image clé la plus proche et le
+  décalage est indiqué pour chaque extrait.
+
+En réencodage, deux moteurs:
+- 'parallel': un processus ffmpeg par extrait, plusieurs à la fois;
+- 'single-pass': un seul processus décode la source une fois, dans l'ordre, et écrit
+  plusieurs extraits à partir d'un graphe filter_complex (split/trim/atrim). Les extraits
+  sont traités par paquets de MAX_CLIPS_PER_PASS pour borner la mémoire du graphe; deux
+  extraits séparés de plus de MAX_PASS_GAP_SECONDS vont dans des paquets différents, pour
+  ne pas décoder tout l'intervalle entre eux. Utile pour les longues sources sur un
+  stockage réseau, où relire la vidéo coûte le plus.
+
+Dans tous les cas -ss est placé avant -i: ffmpeg se positionne directement près du point
+de coupe au lieu de décoder la vidéo depuis le début, et le temps de rendu d'un extrait
+dépend de sa durée, pas de sa position dans le fichier.
+
+Les sous-titres incrustés de chaque extrait sont générés en Python (clip_subtitles) à
+partir de la transcription, en un seul parcours, avant le lancement des encodages.
+
+Si la vidéo a été indexée (media_index), les images clés, les pistes et la durée sont
+lus dans son index au lieu de relancer ffprobe, et les citations qui commencent après
+la fin de la vidéo sont refusées avant tout encodage.
+
+Sur demande (on_clip_progress), ffmpeg est lancé avec `-progress pipe:1`: son avancement
+(images, vitesse, temps restant, octets écrits) est lu pendant l'encodage. Chaque
+résultat indique la vitesse d'encodage (secondes de vidéo par seconde).
+
+Utilisé par la ligne de commande (--render) et par les tâches de fond de l'application.
+"""
+import os
+import subprocess
+import textwrap
+import time
+from bisect import bisect_left
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import timedelta
+
+from clip_cache import source_hash
+from clip_subtitles import DEFAULT_FORCE_STYLE, DEFAULT_SUBTITLE_OPTIONS, subtitle_force_style, write_clip_subtitles
+from extract_srt_quotes import format_ffmpeg_time, iter_subtitles_from_srt
+from ffmpeg_caps import probe_capabilities, subtitle_method, video_encoder
+from ffmpeg_progress import ProgressParser, with_progress
+from jobs import follow_output
+from media_index import parse_keyframes
+
+CUT_MODES = ('encode', 'copy')
+RENDER_ENGINES = ('parallel', 'single-pass')
+
+# Nombre maximal d'extraits écrits par un même processus en mode 'single-pass'
+MAX_CLIPS_PER_PASS = 8
+
+# Écart maximal (secondes) entre deux extraits d'un même paquet: au-delà, décoder
+# l'intervalle coûte plus qu'un nouveau positionnement
+MAX_PASS_GAP_SECONDS = 60.0
+
+# Distance maximale (secondes) entre une borne d'extrait et l'image clé qui la remplace
+KEYFRAME_SEARCH_WINDOW = 10.0
+
+def threads_per_job(jobs):
+    """Threads ffmpeg de chaque encodage quand `jobs` encodages tournent en même temps"""
+    return max(1, (os.cpu_count() or 1) // max(1, jobs))
+
+def safe_clip_name(content):
+    """Début du texte utilisable dans un nom de fichier"""
+    return content[:30].replace(' ', '_').replace("'", "").replace('"', '').replace('?', '').replace('!', '').replace('/', '_')
+
+def plan_clips(quotes, output_dir, padding_seconds=1):
+    """
+    Extraits à rendre: fenêtre (avec marge) et fichier de sortie de chaque citation.
+    
+    Returns:
+        Liste de dictionnaires (index, start, duration, output, content)
+    """
+    padding = timedelta(seconds=padding_seconds)
+    clips = []
+    for i, quote in enumerate(quotes, 1):
+        start = max(timedelta(0), quote['start_time'] - padding)
+        end = quote['end_time'] + padding
+        clips.append({
+            'index': i,
+            'start': start,
+            'duration': end - start,
+            'output': os.path.join(output_dir, f"segment_{i:02d}_{safe_clip_name(quote['content'])}.mp4"),
+            'content': quote['content']
+        })
+    return clips
+
+def keyframe_probe_command(input_video, intervals, ffprobe='ffprobe'):
+    """Commande ffprobe qui liste les paquets vidéo des intervalles (début, fin) en secondes"""
+    read_intervals = ",".join(f"{start:.3f}%{end:.3f}" for start, end in intervals)
+    return [ffprobe, '-v', 'error', '-select_streams', 'v:0', '-read_intervals', read_intervals,
+            '-show_entries', 'packet=pts_time,flags', '-of', 'csv=p=0', input_video]
+
+def probe_keyframes(input_video, times, ffprobe='ffprobe', window=KEYFRAME_SEARCH_WINDOW):
+    """
+    Images clés de la vidéo autour des instants donnés.
+    
+    Seuls les paquets proches des bornes des extraits sont lus (-read_intervals), sans
+    décodage: la recherche ne dépend pas de la longueur de la vidéo.
+    
+    Raises:
+        RuntimeError: si ffprobe échoue
+    """
+    intervals = []
+    for time_seconds in sorted(times):
+        start, end = max(0.0, time_seconds - window), time_seconds + window
+        if intervals and start <= intervals[-1][1]:
+            intervals[-1] = (intervals[-1][0], max(intervals[-1][1], end))
+        else:
+            intervals.append((start, end))
+    if not intervals:
+        return []
+    completed = subprocess.run(keyframe_probe_command(input_video, intervals, ffprobe),
+                               stdin=subprocess.DEVNULL, capture_output=True, text=True)
+    if completed.returncode != 0:
+        raise RuntimeError(f"ffprobe a échoué: {completed.stderr.strip()}")
+    return parse_keyframes(completed.stdout)
+
+def probe_has_audio(input_video, ffprobe='ffprobe'):
+    """
+    La vidéo a-t-elle une piste audio ?
+    
+    Raises:
+        RuntimeError: si ffprobe échoue
+    """
+    completed = subprocess.run([ffprobe, '-v', 'error', '-select_streams', 'a', '-show_entries',
+                                'stream=index', '-of', 'csv=p=0', input_video],
+                               stdin=subprocess.DEVNULL, capture_output=True, text=True)
+    if completed.returncode != 0:
+        raise RuntimeError(f"ffprobe a échoué: {completed.stderr.strip()}")
+    return bool(completed.stdout.strip())
+
+def nearest_keyframe(time_seconds, keyframes, window=KEYFRAME_SEARCH_WINDOW):
+    """Image clé la plus proche de time_seconds (à moins de `window` secondes), ou None"""
+    position = bisect_left(keyframes, time_seconds)
+    candidates = keyframes[max(0, position - 1):position + 1]
+    if not candidates:
+        return None
+    nearest = min(candidates, key=lambda keyframe: abs(keyframe - time_seconds))
+    return nearest if abs(nearest - time_seconds) <= window else None
+
+def snap_clips(clips, keyframes, window=KEYFRAME_SEARCH_WINDOW):
+    """
+    Déplace les bornes des extraits sur les images clés les plus proches (mode 'copy').
+    
+    Renseigne start_shift et end_shift (secondes, positif quand la borne recule dans la
+    vidéo). Une borne sans image clé à moins de `window` secondes n'est pas déplacée.
+    """
+    for clip in clips:
+        start = clip['start'].total_seconds()
+        end = start + clip['duration'].total_seconds()
+        new_start = nearest_keyframe(start, keyframes, window)
+        if new_start is None:
+            new_start = start
+        new_end = nearest_keyframe(end, keyframes, window)
+        if new_end is None or new_end <= new_start:
+            # L'extrait ne doit pas disparaître: fin demandée, non déplacée
+            new_end = max(end, new_start + 0.001)
+        clip['start'] = timedelta(seconds=new_start)
+        clip['duration'] = timedelta(seconds=new_end - new_start)
+        clip['start_shift'] = round(new_start - start, 3)
+        clip['end_shift'] = round(new_end - end, 3)
+    return clips
+
+def limit_clips_to_duration(clips, duration, padding_seconds=1):
+    """
+    Sépare les extraits qui tiennent dans la vidéo de ceux qui commencent après sa fin.
+    
+    La fin d'un extrait gardé (marge comprise) est ramenée à la fin de la vidéo.
+    
+    Returns:
+        (extraits gardés, extraits refusés)
+    """
+    end_of_media = timedelta(seconds=duration)
+    kept, rejected = [], []
+    for clip in clips:
+        if clip['start'] + timedelta(seconds=padding_seconds) >= end_of_media:
+            rejected.append(clip)
+            continue
+        clip['duration'] = min(clip['duration'], end_of_media - clip['start'])
+        kept.append(clip)
+    return kept, rejected
+
+def filter_path(path):
+    """Chemin de fichier protégé pour une option d'un graphe de filtres"""
+    return path.replace('\\', '/').replace(':', '\\:').replace("'", "\\'")
+
+def subtitles_filter(subtitle_file, force_style=DEFAULT_FORCE_STYLE):
+    """Filtre subtitles d'un fichier de sous-titres (force_style=None: style du fichier ASS)"""
+    if force_style is None:
+        return f"subtitles='{filter_path(subtitle_file)}'"
+    return f"subtitles='{filter_path(subtitle_file)}':force_style='{force_style}'"
+
+def drawtext_text(content, max_chars=150, width=50):
+    """Texte affiché par drawtext quand libass manque: début de la citation, sur plusieurs lignes"""
+    return textwrap.fill(" ".join(content.split())[:max_chars], width)
+
+def drawtext_filter(text_file, font_file, options=None):
+    """
+    Filtre drawtext affichant le contenu d'un fichier texte en bas de l'image.
+    
+    Le texte est lu dans un fichier (textfile) pour ne pas avoir à l'échapper dans le
+    graphe de filtres.
+    """
+    options = {**DEFAULT_SUBTITLE_OPTIONS, **(options or {})}
+    return (f"drawtext=fontfile='{filter_path(font_file)}':textfile='{filter_path(text_file)}':expansion=none:"
+            f"fontsize={options['size']}:fontcolor={options['color']}@1.0:"
+            f"box=1:boxcolor={options['backgroundColor']}@{options['opacity']}:boxborderw=15:"
+            "x=(w-text_w)/2:y=h*0.75")
+
+def clip_command(input_video, clip, video_filter=None, threads=None, encoder='libx264', ffmpeg='ffmpeg'):
+    """
+    Commande ffmpeg d'encodage d'un extrait (liste d'arguments, sans shell).
+    
+    En réencodage, ffmpeg décode depuis l'image clé précédant le point d'entrée et écarte
+    les images antérieures (-accurate_seek, actif par défaut): la coupe reste exacte.
+    Les horodatages repartent de 0, comme ceux des sous-titres extraits pour l'extrait.
+    """
+    command = [ffmpeg, '-nostdin', '-y', '-ss', format_ffmpeg_time(clip['start']), '-i', input_video,
+               '-t', format_ffmpeg_time(clip['duration'])]
+    if video_filter:
+        command += ['-vf', video_filter]
+    if threads:
+        command += ['-threads', str(threads)]
+    command += ['-c:v', encoder, '-c:a', 'aac', clip['output']]
+    return command
+
+def format_keyframe_time(time):
+    """
+    Comme format_ffmpeg_time, mais arrondi à la milliseconde supérieure (calcul entier).
+    
+    Une borne placée sur une image clé ne doit pas tomber juste avant elle: en découpe
+    sans réencodage, -ss partirait de l'image clé précédente.
+    """
+    milliseconds = -(-(time // timedelta(microseconds=1)) // 1000)
+    hours, milliseconds = divmod(milliseconds, 3600 * 1000)
+    minutes, milliseconds = divmod(milliseconds, 60 * 1000)
+    seconds, milliseconds = divmod(milliseconds, 1000)
+    return f"{hours:02d}:{minutes:02d}:{seconds:02d}.{milliseconds:03d}"
+
+def copy_command(input_video, clip, ffmpeg='ffmpeg'):
+    """Commande ffmpeg de découpe sans réencodage (bornes déjà placées sur des images clés)"""
+    return [ffmpeg, '-nostdin', '-y', '-ss', format_keyframe_time(clip['start']), '-i', input_video,
+            '-t', format_keyframe_time(clip['duration']), '-c', 'copy', '-avoid_negative_ts', 'make_zero',
+            clip['output']]
+
+def chunk_clips(clips, max_clips=MAX_CLIPS_PER_PASS, max_gap=MAX_PASS_GAP_SECONDS):
+    """
+    Extraits triés par début, en paquets d'au plus max_clips (un paquet par passe).
+    
+    Un nouveau paquet commence aussi quand l'extrait suivant débute plus de max_gap
+    secondes après la fin du paquet en cours.
+    """
+    chunks = []
+    chunk_end = None
+    for clip in sorted(clips, key=lambda clip: clip['start']):
+        if (not chunks or len(chunks[-1]) >= max(1, max_clips)
+                or (clip['start'] - chunk_end).total_seconds() > max_gap):
+            chunks.append([])
+            chunk_end = clip['start']
+        chunks[-1].append(clip)
+        chunk_end = max(chunk_end, clip['start'] + clip['duration'])
+    return chunks
+
+def single_pass_graph(clips, origin, video_filters=None, has_audio=True):
+    """
+    Graphe filter_complex qui découpe plusieurs extraits dans un même décodage.
+    
+    Les images décodées sont dupliquées (split/asplit) vers une branche par extrait, qui
+    ne garde que sa fenêtre (trim/atrim, relative à `origin`) et remet ses horodatages à 0
+    avant l'incrustation éventuelle des sous-titres (video_filters). Sorties: [vK] et [aK].
+    """
+    count = len(clips)
+    video_filters = video_filters or [None] * count
+    parts = ["[0:v]split=%d%s" % (count, "".join(f"[vin{k}]" for k in range(count)))]
+    if has_audio:
+        parts.append("[0:a]asplit=%d%s" % (count, "".join(f"[ain{k}]" for k in range(count))))
+    for k, clip in enumerate(clips):
+        start = (clip['start'] - origin).total_seconds()
+        end = start + clip['duration'].total_seconds()
+        video = f"[vin{k}]trim=start={start:.3f}:end={end:.3f},setpts=PTS-STARTPTS"
+        if video_filters[k]:
+            video += "," + video_filters[k]
+        parts.append(f"{video}[v{k}]")
+        if has_audio:
+            parts.append(f"[ain{k}]atrim=start={start:.3f}:end={end:.3f},asetpts=PTS-STARTPTS[a{k}]")
+    return ";".join(parts)
+
+def single_pass_command(input_video, clips, video_filters=None, threads=None, has_audio=True,
+                        encoder='libx264', ffmpeg='ffmpeg'):
+    """
+    Commande ffmpeg qui écrit tous les extraits d'un paquet en un seul décodage.
+    
+    La lecture commence au premier extrait et s'arrête après le dernier (-ss et -t avant
+    -i: options d'entrée, qui valent pour toutes les sorties).
+    """
+    origin = min(clip['start'] for clip in clips)
+    end = max(clip['start'] + clip['duration'] for clip in clips)
+    command = [ffmpeg, '-nostdin', '-y', '-ss', format_ffmpeg_time(origin), '-t', format_ffmpeg_time(end - origin),
+               '-i', input_video, '-filter_complex', single_pass_graph(clips, origin, video_filters, has_audio)]
+    for k, clip in enumerate(clips):
+        command += ['-map', f"[v{k}]"]
+        if has_audio:
+            command += ['-map', f"[a{k}]"]
+        if threads:
+            command += ['-threads', str(threads)]
+        command += ['-c:v', encoder]
+        if has_audio:
+            command += ['-c:a', 'aac']
+        command.append(clip['output'])
+    return command
+
+def run_process(command, log_path=None, on_output=None):
+    """
+    Lance une commande et renvoie son code de retour (sortie ajoutée à log_path).
+    
+    Avec on_output, chaque ligne de la sortie standard lui est passée et seule la sortie
+    d'erreur va dans log_path.
+    """
+    if on_output:
+        log = open(log_path, 'ab') if log_path else subprocess.DEVNULL
+        try:
+            process = subprocess.Popen(command, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=log)
+        finally:
+            if log_path:
+                log.close()
+        reader = follow_output(process, on_output)
+        returncode = process.wait()
+        reader.join()
+        return returncode
+    if log_path:
+        with open(log_path, 'ab') as log:
+            return subprocess.run(command, stdin=subprocess.DEVNULL, stdout=log, stderr=subprocess.STDOUT).returncode
+    return subprocess.run(command, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL,
+                          stderr=subprocess.DEVNULL).returncode
+
+def _new_result(clip, log_path):
+    return {
+        'index': clip['index'],
+        'output': clip['output'],
+        'log': log_path,
+        'returncode': None,
+        'seconds': 0.0,
+        'media_seconds': round(clip['duration'].total_seconds(), 3),
+        'speed': None,
+        'start_shift': clip.get('start_shift', 0.0),
+        'end_shift': clip.get('end_shift', 0.0),
+        'cache': clip.get('cache'),
+        'error': None
+    }
+
+def _finish_results(results, started, log_path):
+    for result in results:
+        result['seconds'] = round(time.perf_counter() - started, 3)
+        result['ok'] = result['error'] is None
+        if result['ok'] and result['seconds']:
+            result['speed'] = round(result['media_seconds'] / result['seconds'], 3)
+    if os.path.exists(log_path) and (all(result['ok'] for result in results) or not os.path.getsize(log_path)):
+        os.remove(log_path)
+    return results
+
+def _run_ffmpeg(run, command, log_path, clips, on_progress):
+    """Lance ffmpeg; avec on_progress, son avancement est lu et rapporté pour chaque extrait"""
+    if on_progress is None:
+        return run(command, log_path)
+    # Un paquet du moteur 'single-pass' écrit ses extraits en même temps: l'avancement
+    # de la sortie la plus longue vaut pour tous
+    duration = max(clip['duration'].total_seconds() for clip in clips)
+    
+    def report(snapshot):
+        for clip in clips:
+            on_progress(clip['index'], snapshot)
+    
+    parser = ProgressParser(duration, report)
+    return run(with_progress(command), log_path, on_output=parser.feed)
+
+def _render_clip(input_video, clip, mode, video_filter, threads, encoder, ffmpeg, run, on_progress=None):
+    started = time.perf_counter()
+    log_path = os.path.splitext(clip['output'])[0] + ".log"
+    result = _new_result(clip, log_path)
+    try:
+        if os.path.exists(log_path):
+            os.remove(log_path)
+        if mode == 'copy':
+            command = copy_command(input_video, clip, ffmpeg)
+        else:
+            command = clip_command(input_video, clip, video_filter, threads, encoder, ffmpeg)
+        result['returncode'] = _run_ffmpeg(run, command, log_path, [clip], on_progress)
+        if result['returncode'] != 0:
+            result['error'] = f"ffmpeg a échoué (code {result['returncode']}, voir {log_path})"
+    except Exception as e:
+        result['error'] = str(e) or e.__class__.__name__
+    return _finish_results([result], started, log_path)
+
+def _render_pass(input_video, clips, video_filters, threads, has_audio, encoder, ffmpeg, run, on_progress=None):
+    started = time.perf_counter()
+    log_path = os.path.join(os.path.dirname(clips[0]['output']), f"passe_{clips[0]['index']:02d}.log")
+    results = [_new_result(clip, log_path) for clip in clips]
+    try:
+        if os.path.exists(log_path):
+            os.remove(log_path)
+        returncode = _run_ffmpeg(run, single_pass_command(input_video, clips, video_filters, threads, has_audio,
+                                                          encoder, ffmpeg), log_path, clips, on_progress)
+        for result in results:
+            result['returncode'] = returncode
+            if returncode != 0:
+                # Un seul processus pour tout le paquet: ses extraits échouent ensemble
+                result['error'] = f"ffmpeg a échoué (code {returncode}, voir {log_path})"
+    except Exception as e:
+        for result in results:
+            result['error'] = str(e) or e.__class__.__name__
+    return _finish_results(results, started, log_path)
+
+def ffmpeg_capabilities(ffmpeg='ffmpeg', cache_dir=None):
+    """Capacités de ffmpeg (voir ffmpeg_caps), ou None si ffmpeg ne peut pas être sondé"""
+    try:
+        return probe_capabilities(ffmpeg, cache_dir)
+    except (OSError, RuntimeError) as e:
+        print(f"Capacités de ffmpeg non lues ({e}): filtre subtitles et libx264 supposés disponibles")
+        return None
+
+def render_clips(input_video, quotes, output_dir, jobs=None, padding_seconds=1, srt_file=None,
+                 subtitles=None, subtitle_format='srt', subtitle_options=None, mode='encode',
+                 keyframes=None, engine='parallel',
+                 max_clips_per_pass=MAX_CLIPS_PER_PASS, has_audio=None, capabilities=None,
+                 media_index=None, clip_cache=None, source=None, ffmpeg='ffmpeg', ffprobe='ffprobe', run=run_process, on_clip_done=None,
+                 on_clip_progress=None):
+    """
+    Rend tous les extraits, `jobs` processus ffmpeg à la fois.
+    
+    Args:
+        input_video: Vidéo complète
+        quotes: Citations (Quote ou dictionnaires avec start_time/end_time)
+        output_dir: Dossier des extraits
+        jobs: Nombre d'encodages simultanés (par défaut: nombre de cœurs / 4, au moins 1)
+        srt_file: Sous-titres complets de la vidéo à incruster, ou None (toujours None en mode 'copy')
+        subtitles: Sous-titres déjà lus (dans l'ordre chronologique), à la place de srt_file
+        subtitle_format: Format des sous-titres de chaque extrait, 'srt' ou 'ass' (style inclus)
+        subtitle_options: Style des sous-titres (options de l'éditeur vidéo)
+        mode: 'encode' (réencodage) ou 'copy' (copie des flux, bornes sur les images clés)
+        keyframes: Instants des images clés déjà connus (mode 'copy'); sinon lus avec ffprobe
+        engine: 'parallel' (un processus par extrait) ou 'single-pass' (un décodage par paquet
+            de max_clips_per_pass extraits; réencodage uniquement)
+        has_audio: La vidéo a une piste audio (graphe du moteur 'single-pass'); None: lu avec ffprobe
+        capabilities: Capacités de ffmpeg (ffmpeg_caps); None: sondées (résultat en cache disque).
+            Elles décident une fois pour toutes de l'incrustation (subtitles, ou drawtext sans
+            libass) et de l'encodeur: chaque extrait n'est encodé qu'une fois
+        media_index: Index de la vidéo (media_index.MediaIndex), ou None. Il fournit les images
+            clés et les pistes sans relancer ffprobe; les citations qui commencent après la fin
+            de la vidéo sont refusées (résultat en échec, sans lancer ffmpeg)
+        clip_cache: Cache des extraits rendus (clip_cache.ClipCache), ou None. Les extraits dont
+            la recette n'a pas changé sont liés depuis le cache au lieu d'être réencodés
+        source: Empreinte du contenu de la vidéo pour le cache (par défaut: calculée)
+        run: Fonction (commande, fichier de log) -> code de retour; l'application y passe
+            Job.run_command pour respecter la limite globale de processus ffmpeg. Avec
+            on_clip_progress, elle reçoit aussi on_output (lignes de la sortie standard)
+        on_clip_done: Appelée avec le résultat de chaque extrait dès qu'il est terminé
+        on_clip_progress: Appelée avec (index de l'extrait, avancement) pendant l'encodage
+            (voir ffmpeg_progress.progress_snapshot), depuis le thread qui lit la sortie de ffmpeg
+    
+    Returns:
+        Liste des résultats par extrait (index, output, returncode, seconds, media_seconds,
+        speed (secondes de vidéo encodées par seconde), start_shift, end_shift, cache ('hit',
+        'miss' ou None sans cache), error, ok), dans l'ordre des extraits
+    
+    Raises:
+        ValueError: mode ou moteur inconnu, sous-titres à incruster ou moteur 'single-pass' en mode 'copy'
+    """
+    if mode not in CUT_MODES:
+        raise ValueError(f"Mode de découpe inconnu: {mode} (modes possibles: {', '.join(CUT_MODES)})")
+    if engine not in RENDER_ENGINES:
+        raise ValueError(f"Moteur de rendu inconnu: {engine} (moteurs possibles: {', '.join(RENDER_ENGINES)})")
+    if mode == 'copy' and engine == 'single-pass':
+        raise ValueError("Le moteur 'single-pass' réencode les extraits: il n'est pas compatible avec le mode 'copy'")
+    if mode == 'copy' and (srt_file or subtitles is not None):
+        raise ValueError("Les sous-titres ne peuvent pas être incrustés sans réencodage (mode 'copy')")
+    os.makedirs(output_dir, exist_ok=True)
+    clips = plan_clips(quotes, output_dir, padding_seconds)
+    rejected = []
+    if media_index is not None:
+        if media_index.duration:
+            clips, rejected = limit_clips_to_duration(clips, media_index.duration, padding_seconds)
+        if keyframes is None and media_index.keyframes_ms:
+            keyframes = media_index.keyframes
+        if has_audio is None:
+            has_audio = media_index.has_audio
+    if mode == 'copy' and clips:
+        if keyframes is None:
+            bounds = [clip['start'].total_seconds() for clip in clips]
+            bounds += [(clip['start'] + clip['duration']).total_seconds() for clip in clips]
+            try:
+                keyframes = probe_keyframes(input_video, bounds, ffprobe)
+            except (OSError, RuntimeError) as e:
+                # ffmpeg coupera alors sur l'image clé précédant chaque début
+                print(f"Images clés non lues ({e}): bornes non ajustées")
+                keyframes = []
+        snap_clips(clips, keyframes)
+    if engine == 'single-pass' and clips and has_audio is None:
+        try:
+            has_audio = probe_has_audio(input_video, ffprobe)
+        except (OSError, RuntimeError) as e:
+            print(f"Pistes de la vidéo non lues ({e}): piste audio supposée présente")
+            has_audio = True
+    
+    encoder = None
+    video_filters = {}
+    # Ce que le filtre incruste, pour la clé de cache (les chemins des fichiers changent)
+    overlays = {}
+    generated_files = []
+    if mode == 'encode' and clips:
+        if capabilities is None:
+            capabilities = ffmpeg_capabilities(ffmpeg)
+        encoder = video_encoder(capabilities)
+        method = subtitle_method(capabilities) if (srt_file or subtitles is not None) else None
+        if (srt_file or subtitles is not None) and method is None:
+            print("ffmpeg n'a ni libass ni drawtext utilisable: extraits rendus sans sous-titres")
+        clip_name = lambda clip: os.path.splitext(os.path.basename(clip['output']))[0]
+        if method == 'subtitles':
+            # Sous-titres de tous les extraits, écrits en un seul parcours de la transcription
+            if subtitles is None:
+                subtitles = iter_subtitles_from_srt(srt_file)
+            subtitle_paths = write_clip_subtitles(subtitles, clips, output_dir, subtitle_format, subtitle_options,
+                                                  name=clip_name)
+            force_style = subtitle_force_style(subtitle_options) if subtitle_format == 'srt' else None
+            video_filters = {index: subtitles_filter(path, force_style) for index, path in subtitle_paths.items()}
+            generated_files = list(subtitle_paths.values())
+            if clip_cache is not None:
+                for index, path in subtitle_paths.items():
+                    with open(path, 'r', encoding='utf-8') as f:
+                        overlays[index] = (method, force_style, f.read())
+        elif method == 'drawtext':
+            # Sans libass: texte de la citation affiché par drawtext
+            for clip in clips:
+                text_file = os.path.join(output_dir, clip_name(clip) + ".txt")
+                with open(text_file, 'w', encoding='utf-8') as f:
+                    f.write(drawtext_text(clip['content']))
+                generated_files.append(text_file)
+                overlays[clip['index']] = (method, capabilities['font_file'], subtitle_options,
+                                           drawtext_text(clip['content']))
+                video_filters[clip['index']] = drawtext_filter(text_file, capabilities['font_file'], subtitle_options)
+    
+    results = []
+    for clip in rejected:
+        result = _new_result(clip, None)
+        result['error'] = (f"Citation hors de la vidéo (début {format_ffmpeg_time(clip['start'])}, "
+                           f"durée de la vidéo {format_ffmpeg_time(timedelta(seconds=media_index.duration))})")
+        result['ok'] = False
+        results.append(result)
+        if on_clip_done:
+            on_clip_done(result)
+    
+    cache_keys = {}
+    if clip_cache is not None and clips:
+        source = source or source_hash(input_video)
+        to_render = []
+        for clip in clips:
+            key = clip_cache.make_key(source, mode, encoder, round(clip['start'].total_seconds() * 1000),
+                                      round(clip['duration'].total_seconds() * 1000), overlays.get(clip['index']))
+            if clip_cache.fetch(key, clip['output']):
+                clip['cache'] = 'hit'
+                result = _new_result(clip, None)
+                result['returncode'] = 0
+                result['ok'] = True
+                results.append(result)
+                if on_clip_done:
+                    on_clip_done(result)
+                continue
+            clip['cache'] = 'miss'
+            cache_keys[clip['index']] = key
+            # La sortie peut être un lien vers une entrée du cache: ffmpeg ne doit pas l'écraser
+            if os.path.lexists(clip['output']):
+                os.remove(clip['output'])
+            to_render.append(clip)
+        clips = to_render
+    
+    jobs = max(1, jobs or (os.cpu_count() or 1) // 4)
+    passes = chunk_clips(clips, max_clips_per_pass) if engine == 'single-pass' else [[clip] for clip in clips]
+    # Une copie de flux n'utilise pas de threads d'encodage
+    threads = threads_per_job(min(jobs, len(passes)) if passes else jobs) if mode == 'encode' else None
+    
+    try:
+        with ThreadPoolExecutor(max_workers=jobs) as executor:
+            if engine == 'single-pass':
+                futures = [executor.submit(_render_pass, input_video, chunk,
+                                           [video_filters.get(clip['index']) for clip in chunk],
+                                           threads, has_audio, encoder, ffmpeg, run, on_clip_progress)
+                           for chunk in passes]
+            else:
+                futures = [executor.submit(_render_clip, input_video, clip, mode, video_filters.get(clip['index']),
+                                           threads, encoder, ffmpeg, run, on_clip_progress) for clip in clips]
+            for future in as_completed(futures):
+                for result in future.result():
+                    if result['ok'] and result['index'] in cache_keys:
+                        try:
+                            clip_cache.store(cache_keys[result['index']], result['output'])
+                        except OSError as e:
+                            print(f"Extrait {result['index']} non mis en cache: {e}")
+                    results.append(result)
+                    if on_clip_done:
+                        on_clip_done(result)
+    finally:
+        for path in generated_files:
+            if os.path.exists(path):
+                os.remove(path)
+    results.sort(key=lambda result: result['index'])
+    return results
+
+def render_summary(results):
+    """Nombre d'extraits réussis et en échec, durée cumulée et vitesse moyenne des encodages"""
+    speeds = [result['speed'] for result in results if result.get('speed') and result.get('cache') != 'hit']
+    return {
+        'clips': len(results),
+        'succeeded': sum(result['ok'] for result in results),
+        'failed': sum(not result['ok'] for result in results),
+        'encode_seconds': round(sum(result['seconds'] for result in results), 3),
+        'mean_speed': round(sum(speeds) / len(speeds), 3) if speeds else None,
+        'cache_hits': sum(result.get('cache') == 'hit' for result in results),
+        'cache_misses': sum(result.get('cache') == 'miss' for result in results)
+    }
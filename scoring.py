@@ -0,0 +1,212 @@
+"""
+Score d'importance des citations et sélection des meilleures.
+
+Le même calcul sert à la ligne de commande et à l'application web: les critères de
+chaque citation forment une ligne d'une matrice (une colonne par critère) et le score
+est la somme pondérée des colonnes, calculée pour toutes les citations à la fois.
+"""
+import heapq
+from functools import partial
+
+# Critères, dans l'ordre des colonnes de la matrice
+FEATURES = (
+    'duration',         # Durée en dizaines de secondes, plafonnée à 5
+    'keyword',          # Contient au moins un mot-clé
+    'keyword_repeats',  # Occurrences de mots-clés au-delà de la première, plafonnées à 4
+    'intense',          # Sentiment intense
+    'intensity',        # |polarité| des passages intenses
+    'subjectivity',     # Subjectivité des passages intenses
+    'topic_change',     # Ouvre un nouveau sujet
+    'long'              # Plus long que la longueur minimale
+)
+
+# Poids par défaut de chaque critère
+DEFAULT_WEIGHTS = {
+    'duration': 1.0,
+    'keyword': 3.0,
+    'keyword_repeats': 0.5,
+    'intense': 2.0,
+    'intensity': 1.0,
+    'subjectivity': 0.0,
+    'topic_change': 2.0,
+    'long': 0.0
+}
+
+MAX_DURATION_FEATURE = 5
+MAX_KEYWORD_REPEATS = 4
+
+_NOT_A_QUOTE = object()
+
+def resolve_weights(weights=None):
+    """Poids par défaut, remplacés par ceux de `weights` (dictionnaire critère -> poids)"""
+    if not weights:
+        return DEFAULT_WEIGHTS
+    unknown = set(weights) - set(FEATURES)
+    if unknown:
+        raise ValueError(f"Critère(s) inconnu(s): {', '.join(sorted(unknown))} "
+                         f"(critères possibles: {', '.join(FEATURES)})")
+    return {**DEFAULT_WEIGHTS, **weights}
+
+def parse_weights(text):
+    """
+    Lit des poids au format "critère=poids,critère=poids" (option --weights).
+    
+    Raises:
+        ValueError: si le format, un critère ou un poids est invalide
+    """
+    weights = {}
+    for item in text.split(','):
+        if not item.strip():
+            continue
+        name, separator, value = item.partition('=')
+        if not separator:
+            raise ValueError(f"Poids invalide: '{item.strip()}' (format attendu: critère=poids)")
+        try:
+            weights[name.strip()] = float(value)
+        except ValueError:
+            raise ValueError(f"Poids invalide pour '{name.strip()}': '{value.strip()}'") from None
+    resolve_weights(weights)
+    return weights
+
+def _criteria(quote):
+    """
+    Valeurs brutes d'une citation (Quote ou dictionnaire): durée en secondes, mot-clé,
+    occurrences de mots-clés, intensité, polarité, subjectivité, changement de sujet, longueur
+    """
+    extra = getattr(quote, 'extra', _NOT_A_QUOTE)
+    if extra is not _NOT_A_QUOTE:
+        # Quote (extract_srt_quotes): lecture directe des attributs, sans passer par
+        # les clés calculées à la demande
+        criteria = extra or {}
+        duration = quote.duration_ms / 1000
+        has_keyword = quote.has_keyword
+        is_topic_change = quote.is_topic_change
+        is_long = quote.is_long
+    else:
+        criteria = quote
+        if 'duration' in quote:
+            duration = quote['duration'].total_seconds()
+        else:
+            # Citations relues depuis l'export JSON
+            duration = quote['duration_seconds']
+        has_keyword = quote.get('has_keyword', False)
+        is_topic_change = quote.get('is_topic_change', False)
+        is_long = quote.get('is_long', False)
+    return (duration, bool(has_keyword), criteria.get('keyword_hits', 1), bool(criteria.get('is_intense', False)),
+            criteria.get('sentiment_polarity', 0), criteria.get('sentiment_subjectivity', 0),
+            bool(is_topic_change), bool(is_long))
+
+def quote_features(quote):
+    """Valeurs des critères (FEATURES) d'une citation (Quote ou dictionnaire)"""
+    duration, has_keyword, keyword_hits, is_intense, polarity, subjectivity, is_topic_change, is_long = _criteria(quote)
+    return (
+        min(MAX_DURATION_FEATURE, duration / 10),
+        float(has_keyword),
+        float(min(MAX_KEYWORD_REPEATS, keyword_hits - 1)) if has_keyword else 0.0,
+        float(is_intense),
+        abs(polarity) if is_intense else 0.0,
+        subjectivity if is_intense else 0.0,
+        float(is_topic_change),
+        float(is_long)
+    )
+
+def score_quote(quote, weights=None):
+    """Score d'une seule citation (mêmes critères et poids que score_quotes)"""
+    weights = resolve_weights(weights)
+    return sum(weights[name] * value for name, value in zip(FEATURES, quote_features(quote)))
+
+def feature_matrix(quotes):
+    """
+    Matrice (citations x critères) des valeurs de quote_features, calculée colonne par
+    colonne sur des tableaux: seule la lecture des valeurs brutes parcourt les citations
+    """
+    import numpy as np
+    raw = np.array([_criteria(quote) for quote in quotes], dtype=np.float64).reshape(-1, 8)
+    duration, has_keyword, keyword_hits, is_intense, polarity, subjectivity, is_topic_change, is_long = raw.T
+    return np.column_stack((
+        np.minimum(MAX_DURATION_FEATURE, duration / 10),
+        has_keyword,
+        np.where(has_keyword > 0, np.minimum(MAX_KEYWORD_REPEATS, keyword_hits - 1), 0.0),
+        is_intense,
+        np.abs(polarity) * is_intense,
+        subjectivity * is_intense,
+        is_topic_change,
+        is_long
+    ))
+
+def score_quotes(quotes, weights=None):
+    """
+    Scores de toutes les citations: produit de la matrice des critères par le vecteur
+    des poids.
+    
+    Returns:
+        Tableau numpy des scores, ou liste sans numpy
+    """
+    weights = resolve_weights(weights)
+    try:
+        import numpy as np
+    except ImportError:
+        return [score_quote(quote, weights) for quote in quotes]
+    
+    return feature_matrix(quotes) @ np.array([weights[name] for name in FEATURES])
+
+# Précision des scores comparés pour la sélection: le produit matriciel et le calcul
+# citation par citation peuvent différer au dernier bit près, les ex aequo doivent
+# rester les mêmes dans les deux cas
+SCORE_DECIMALS = 9
+
+def _rounded_score(quote, weights):
+    return round(score_quote(quote, weights), SCORE_DECIMALS)
+
+def _start_key(quote):
+    start_ms = getattr(quote, 'start_ms', None)
+    if start_ms is not None:
+        return start_ms / 1000
+    if 'start_time' in quote:
+        return quote['start_time'].total_seconds()
+    return quote['start_time_seconds']
+
+def select_top_quotes(quotes, number, weights=None):
+    """
+    Garde les `number` meilleures citations puis les remet dans l'ordre chronologique.
+    
+    Avec une liste, les scores sont calculés en une fois et les meilleurs isolés par
+    np.partition, sans trier toutes les citations. Un itérable quelconque (générateur
+    de iter_quotes) passe par heapq.nlargest, qui ne garde que `number` citations en
+    mémoire. Dans les deux cas, à score égal, la première citation l'emporte, comme
+    avec un tri stable.
+    """
+    weights = resolve_weights(weights)
+    if number <= 0:
+        return []
+    
+    if not isinstance(quotes, (list, tuple)):
+        selected_quotes = heapq.nlargest(number, quotes, key=partial(_rounded_score, weights=weights))
+        selected_quotes.sort(key=_start_key)
+        return selected_quotes
+    
+    try:
+        import numpy as np
+    except ImportError:
+        selected_quotes = heapq.nlargest(number, quotes, key=partial(_rounded_score, weights=weights))
+        selected_quotes.sort(key=_start_key)
+        return selected_quotes
+    
+    scores = np.round(score_quotes(quotes, weights), SCORE_DECIMALS)
+    count = len(scores)
+    if number >= count:
+        selected = np.arange(count)
+    else:
+        # Score de la `number`-ième citation: tout ce qui est au-dessus est retenu, les
+        # ex aequo à ce score complètent dans l'ordre d'arrivée
+        threshold = np.partition(scores, count - number)[count - number]
+        above = np.flatnonzero(scores > threshold)
+        ties = np.flatnonzero(scores == threshold)[:number - len(above)]
+        selected = np.concatenate([above, ties])
+    
+    # Ordre de heapq.nlargest (score décroissant, puis ordre d'arrivée) avant le tri
+    # chronologique stable, pour départager les citations qui commencent au même moment
+    selected = selected[np.lexsort((selected, -scores[selected]))]
+    selected_quotes = [quotes[i] for i in selected.tolist()]
+    selected_quotes.sort(key=_start_key)
+    return selected_quotes
@@ -0,0 +1,81 @@
+"""
+Recherche dans les transcriptions de tous les projets.
+
+Les sous-titres de chaque transcription envoyée sont indexés (SQLite FTS5) dans la base
+des projets au moment de l'analyse. Ce script interroge l'index: chaque résultat donne
+l'épisode (projet), les temps de la ligne trouvée et le passage qui l'entoure, classés
+par pertinence (BM25). Il peut aussi indexer des fichiers SRT déjà traités qui ne sont
+pas encore dans la base.
+
+    python search_transcripts.py "invité économie"
+    python search_transcripts.py '"transition énergétique"' --project episode_42 --context 3
+    python search_transcripts.py --index uploads/
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+from extract_srt_quotes import expand_input_paths, iter_subtitles_from_srt
+from project_store import ProjectStore
+
+DEFAULT_DATABASE = os.environ.get(
+    'PROJECT_DATABASE', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'outputs', 'projets.sqlite3'))
+
+def index_files(store, patterns):
+    """
+    Indexe des fichiers SRT (fichiers, dossiers ou motifs glob) sous le nom de leur
+    projet (nom du fichier sans extension); une transcription déjà indexée est remplacée.
+    
+    Returns:
+        Nombre de fichiers indexés
+    """
+    files = expand_input_paths(patterns)
+    for file_path in files:
+        count = store.save_subtitles(file_path.stem, iter_subtitles_from_srt(file_path))
+        print(f"{file_path.stem}: {count} sous-titres indexés")
+    return len(files)
+
+def build_arg_parser():
+    parser = argparse.ArgumentParser(description="Recherche plein texte dans les transcriptions de tous les projets")
+    parser.add_argument("query", nargs='?', help="Mots recherchés (tous requis), \"expression exacte\", préfixe*")
+    parser.add_argument("--project", help="Ne chercher que dans ce projet (épisode)")
+    parser.add_argument("-n", "--limit", type=int, default=20, help="Nombre maximal de résultats (par défaut: 20)")
+    parser.add_argument("-c", "--context", type=int, default=2, help="Sous-titres affichés avant et après chaque résultat (par défaut: 2)")
+    parser.add_argument("--json", action="store_true", help="Résultats au format JSON")
+    parser.add_argument("--index", nargs='+', metavar="SRT", help="Indexer ces fichiers SRT (fichiers, dossiers ou motifs glob) au lieu de chercher")
+    parser.add_argument("--database", default=DEFAULT_DATABASE, help="Base des projets (par défaut: $PROJECT_DATABASE ou outputs/projets.sqlite3)")
+    return parser
+
+def main(argv=None):
+    parser = build_arg_parser()
+    args = parser.parse_args(argv)
+    if not args.index and not args.query:
+        parser.error("indiquez une recherche, ou des fichiers à indexer avec --index")
+    store = ProjectStore(args.database)
+    
+    if args.index:
+        if not index_files(store, args.index):
+            print("Aucun fichier SRT trouvé.")
+            sys.exit(1)
+        return
+    
+    started = time.perf_counter()
+    try:
+        hits = store.search(args.query, args.limit, args.context, args.project)
+    except ValueError as e:
+        parser.error(str(e))
+    elapsed = time.perf_counter() - started
+    
+    if args.json:
+        print(json.dumps(hits, ensure_ascii=False, indent=2))
+        return
+    for hit in hits:
+        print(f"[{hit['project']}] {hit['formatted_start']} - {hit['formatted_end']} (score {hit['score']:.2f})")
+        print(f"    {hit['content'].replace(chr(10), ' ')}")
+        print(f"    ... {hit['passage']['content']} ...\n")
+    print(f"{len(hits)} résultat(s) en {elapsed * 1000:.1f} ms")
+
+if __name__ == "__main__":
+    main()
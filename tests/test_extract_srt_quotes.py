@@ -3,16 +3,51 @@
 import os
 from datetime import timedelta
 import tempfile
+import time
 
 # Ajuster le chemin pour importer le module à tester
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
+import json
+import srt
+
 from extract_srt_quotes import (
     format_timecode, 
     format_ffmpeg_time, 
     analyze_sentiment,
-    group_subtitles_into_passages
+    SentimentEngine,
+    build_arg_parser,
+    expand_input_paths,
+    run_batch,
+    group_subtitles_into_passages,
+    detect_topic_changes,
+    detect_topic_changes_tfidf,
+    has_topic_change,
+    extract_quotes,
+    export_json_data,
+    generate_ffmpeg_cut_file,
+    iter_passages,
+    iter_quotes,
+    iter_subtitles_from_srt,
+    iter_topic_flags,
+    KeywordMatcher,
+    Quote,
+    select_top_quotes
 )
+from scoring import parse_weights, score_quote, score_quotes
+from analysis_cache import AnalysisCache, cached_extract_quotes
+from analysis_jobs import analyze_transcript
+from jobs import JobQueue
+from clip_subtitles import ass_colour, clip_events, write_clip_subtitles
+import ffmpeg_caps
+from ffmpeg_caps import probe_capabilities, subtitle_method
+from ffmpeg_progress import ProgressParser, RenderProgress, SpeedHistory
+from chunked_upload import ChunkedUploads
+from clip_cache import ClipCache
+from disk_lru import STALE_TEMP_SECONDS
+from project_store import ProjectStore, QuoteNotFound, VersionConflict
+from media_index import HEADER, STREAM, build_media_index, index_path, load_media_index, write_media_index
+from render import chunk_clips, parse_keyframes, render_clips, render_summary, snap_clips, plan_clips, threads_per_job
 
 # Classe factice pour simuler les sous-titres
 class MockSubtitle:
@@ -21,6 +56,20 @@ def __init__(self, content, start, end):
         self.start = start
         self.end = end
 
+def make_subtitles(count=60):
+    """Construit une transcription factice avec deux sujets bien distincts"""
+    subtitles = []
+    for i in range(count):
+        if i < count // 2:
+            content = f"Le climat et la météo changent vite, phrase {i}."
+        else:
+            content = f"Parlons musique, concerts et festivals ce soir, ligne {i}."
+        start = timedelta(seconds=i * 3)
+        # Un écart plus grand toutes les 7 répliques pour créer plusieurs passages
+        end = start + timedelta(seconds=2 if i % 7 else 0.5)
+        subtitles.append(srt.Subtitle(index=i + 1, start=start, end=end, content=content))
+    return subtitles
+
 class TestTimecodeFormatting(unittest.TestCase):
     
     def test_format_timecode(self):
@@ -62,6 +111,32 @@ def test_basic_sentiment_analysis(self):
         # Texte neutre
         result = analyze_sentiment("Aujourd'hui nous allons parler de l'actualité.")
         self.assertAlmostEqual(result['polarity'], 0, delta=0.3)
+    
+    def test_engine_batch_and_cache(self):
+        """Le moteur analyse un lot dans l'ordre et réutilise son cache"""
+        engine = SentimentEngine()
+        texts = ["Excellent podcast, vraiment fantastique !", "Terrible épisode, vraiment horrible.",
+                 "Excellent podcast, vraiment fantastique !"]
+        results = engine.analyze_batch(texts)
+        self.assertEqual([r['polarity'] for r in results],
+                         [analyze_sentiment(text)['polarity'] for text in texts])
+        self.assertEqual(engine.stats()['cache_size'], 2)
+        
+        engine.analyze_batch(texts[:2])
+        stats = engine.stats()
+        self.assertEqual((stats['calls'], stats['texts'], stats['cache_hits']), (2, 5, 2))
+        self.assertGreaterEqual(stats['seconds'], stats['last_call_seconds'])
+    
+    def test_engine_cache_is_bounded(self):
+        """Les entrées les moins récemment utilisées sont évincées"""
+        engine = SentimentEngine(cache_size=2)
+        engine.analyze("premier texte")
+        engine.analyze("deuxième texte")
+        engine.analyze("premier texte")
+        engine.analyze("troisième texte")
+        self.assertEqual(engine.stats()['cache_size'], 2)
+        engine.analyze("premier texte")
+        self.assertEqual(engine.stats()['cache_hits'], 2)
 
 class TestGroupSubtitles(unittest.TestCase):
     
@@ -121,5 +196,1074 @@ def test_group_subtitles_min_length(self):
         self.assertEqual(len(passages), 1)
         self.assertEqual(passages[0]['subtitles'][0].content, "Long passage avec beaucoup de mots")
 
+def reference_passages(subtitles, max_gap_seconds=3.0, min_passage_length=500, max_passage_length=2000):
+    """Regroupement d'origine (concaténation au fil de l'eau), pour comparaison"""
+    passages = []
+    current = None
+    for i, sub in enumerate(subtitles):
+        if current is None:
+            current = {'content': sub.content, 'start_time': sub.start, 'end_time': sub.end, 'start_index': i, 'end_index': i}
+            continue
+        gap = (sub.start - current['end_time']).total_seconds()
+        if gap > max_gap_seconds or len(current['content']) + len(sub.content) > max_passage_length:
+            if len(current['content']) >= min_passage_length:
+                passages.append(current)
+            current = {'content': sub.content, 'start_time': sub.start, 'end_time': sub.end, 'start_index': i, 'end_index': i}
+        else:
+            current['content'] += " " + sub.content
+            current['end_time'] = sub.end
+            current['end_index'] = i
+    if current is not None and len(current['content']) >= min_passage_length:
+        passages.append(current)
+    return passages
+
+def random_subtitles(count, seed=0):
+    """Transcription aléatoire: textes de longueurs variées, écarts parfois supérieurs à 3 s"""
+    import random
+    rng = random.Random(seed)
+    subtitles = []
+    t = 0
+    for i in range(count):
+        duration = rng.randint(500, 4000)
+        content = " ".join("mot" * rng.randint(1, 3) for _ in range(rng.randint(1, 40)))
+        subtitles.append(srt.Subtitle(index=i + 1, start=timedelta(milliseconds=t),
+                                      end=timedelta(milliseconds=t + duration), content=content))
+        t += duration + rng.choice([0, 200, 1000, 2999, 3000, 3001, 6000])
+    return subtitles
+
+def reference_topic_changes(subtitles, window_size=5):
+    """Implémentation d'origine (recalcul complet des fenêtres), pour comparaison"""
+    import re
+    topic_changes = []
+    for i in range(window_size, len(subtitles) - window_size):
+        before_text = " ".join(sub.content for sub in subtitles[i-window_size:i])
+        after_text = " ".join(sub.content for sub in subtitles[i:i+window_size])
+        before_words = set(re.findall(r'\b\w+\b', before_text.lower()))
+        after_words = set(re.findall(r'\b\w+\b', after_text.lower()))
+        if before_words and after_words:
+            ratio = 1 - len(before_words & after_words) / len(before_words | after_words)
+            if ratio > 0.7:
+                topic_changes.append(i)
+    return topic_changes
+
+class TestGroupingEquivalence(unittest.TestCase):
+    
+    def test_same_passages_as_reference(self):
+        """Le regroupement vectorisé et le regroupement en flux reproduisent l'algorithme d'origine"""
+        keys = ['content', 'start_time', 'end_time', 'start_index', 'end_index']
+        for seed in range(5):
+            subtitles = random_subtitles(400, seed)
+            for min_length, max_length in [(0, 50), (100, 300), (500, 2000), (0, 10 ** 6)]:
+                expected = [[p[k] for k in keys]
+                            for p in reference_passages(subtitles, 3.0, min_length, max_length)]
+                grouped = group_subtitles_into_passages(subtitles, 3.0, min_length, max_length)
+                streamed = iter_passages(iter(subtitles), 3.0, min_length, max_length)
+                self.assertEqual([[p[k] for k in keys] for p in grouped], expected)
+                self.assertEqual([[p[k] for k in keys] for p in streamed], expected)
+
+class TestTopicDetection(unittest.TestCase):
+    
+    def test_matches_reference_implementation(self):
+        """Le détecteur incrémental trouve les mêmes changements que le recalcul complet"""
+        import random
+        rng = random.Random(42)
+        vocab = [f"mot{i}" for i in range(40)]
+        for count in (0, 3, 10, 11, 60, 200):
+            subtitles = []
+            for i in range(count):
+                # Vocabulaire qui dérive par blocs pour provoquer des changements
+                base = (i // 15) * 10
+                words = [vocab[(base + rng.randrange(12)) % len(vocab)] for _ in range(rng.randrange(0, 6))]
+                subtitles.append(MockSubtitle(" ".join(words), timedelta(seconds=i), timedelta(seconds=i + 1)))
+            for window_size in (1, 3, 5):
+                self.assertEqual(detect_topic_changes(subtitles, window_size),
+                                 reference_topic_changes(subtitles, window_size))
+        self.assertTrue(reference_topic_changes(make_subtitles()))
+    
+    def test_has_topic_change(self):
+        """Recherche d'un changement dans un intervalle d'indices"""
+        changes = [4, 10, 25]
+        self.assertTrue(has_topic_change(changes, 0, 4))
+        self.assertTrue(has_topic_change(changes, 5, 12))
+        self.assertFalse(has_topic_change(changes, 11, 24))
+        self.assertFalse(has_topic_change(changes, 26, 100))
+        self.assertFalse(has_topic_change([], 0, 100))
+    
+    def test_passages_use_global_indices(self):
+        """Seul le passage qui contient le changement de sujet est marqué"""
+        # Le changement tombe au milieu de la transcription, loin des premiers indices
+        subtitles = make_subtitles(200)
+        changes = detect_topic_changes(subtitles)
+        quotes = extract_quotes(subtitles, min_length=0, topic_detection=True, max_gap_seconds=3.0)
+        marked = [q for q in quotes if q['is_topic_change']]
+        self.assertEqual(len(marked), 1)
+        self.assertLessEqual(marked[0]['start_time'], subtitles[changes[0]].start)
+        self.assertGreaterEqual(marked[0]['end_time'], subtitles[changes[0]].end)
+
+class TestQuoteRecords(unittest.TestCase):
+    
+    def test_quote_reads_like_a_dict(self):
+        """Les citations compactes exposent les clés historiques, calculées à la demande"""
+        quote = Quote("Une citation", 61500, 75250, is_long=True, extra={'is_intense': True})
+        self.assertEqual(quote['start_time'], timedelta(seconds=61.5))
+        self.assertEqual(quote['duration'], timedelta(seconds=13.75))
+        self.assertEqual(quote['formatted_start'], "00:01:01")
+        self.assertEqual(quote['ffmpeg_end'], "00:01:15.250")
+        self.assertTrue(quote.get('is_intense'))
+        self.assertNotIn('sentiment_polarity', quote)
+        self.assertEqual(quote.to_dict()['content'], "Une citation")
+    
+    def test_passages_reference_subtitles(self):
+        """Les passages gardent une plage d'indices au lieu de copier les sous-titres"""
+        subtitles = make_subtitles(40)
+        passages = group_subtitles_into_passages(subtitles, min_passage_length=0)
+        for passage in passages:
+            self.assertIs(passage.source, subtitles)
+            self.assertEqual(passage['subtitles'], subtitles[passage['start_index']:passage['end_index'] + 1])
+        streamed = list(iter_passages(iter(subtitles), min_passage_length=0))
+        self.assertEqual([p['subtitles'] for p in streamed], [p['subtitles'] for p in passages])
+
+class TestScoring(unittest.TestCase):
+    
+    def make_quotes(self, count=2000):
+        """Citations aléatoires, avec beaucoup de scores ex aequo"""
+        import random
+        rng = random.Random(3)
+        quotes = []
+        for i in range(count):
+            extra = {'keyword_hits': rng.randint(0, 6)}
+            if rng.random() < 0.5:
+                extra.update({'sentiment_polarity': rng.choice([-0.8, 0.5, 0.9]),
+                              'sentiment_subjectivity': 0.6, 'is_intense': rng.random() < 0.5})
+            quotes.append(Quote(f"citation {i}", i * 1000, i * 1000 + rng.choice([5000, 20000, 80000]),
+                                is_long=rng.random() < 0.5, has_keyword=extra['keyword_hits'] > 0,
+                                is_topic_change=rng.random() < 0.2, extra=extra))
+        return quotes
+    
+    def test_vectorised_scores_match_single_scores(self):
+        """Le calcul matriciel donne les scores du calcul citation par citation"""
+        import numpy as np
+        quotes = self.make_quotes()
+        weights = {'subjectivity': 1.5, 'long': 0.3}
+        self.assertTrue(np.allclose(score_quotes(quotes, weights), [score_quote(q, weights) for q in quotes]))
+    
+    def test_selection_matches_stable_sort(self):
+        """argpartition et heapq retiennent les mêmes citations qu'un tri stable complet"""
+        quotes = self.make_quotes()
+        for number in (1, 10, 333, 5000):
+            expected = sorted(quotes, key=score_quote, reverse=True)[:number]
+            expected.sort(key=lambda q: q['start_time'])
+            self.assertEqual(select_top_quotes(quotes, number), expected)
+            self.assertEqual(select_top_quotes(iter(quotes), number), expected)
+    
+    def test_parse_weights(self):
+        """Les poids de --weights sont validés"""
+        self.assertEqual(parse_weights("keyword=4, topic_change=0.5"), {'keyword': 4.0, 'topic_change': 0.5})
+        with self.assertRaises(ValueError):
+            parse_weights("inconnu=1")
+        with self.assertRaises(ValueError):
+            parse_weights("keyword")
+
+class TestKeywordMatcher(unittest.TestCase):
+    
+    def test_accents_case_and_positions(self):
+        """Les correspondances ignorent accents et casse et renvoient les positions d'origine"""
+        matcher = KeywordMatcher(["economie", "Éducation"])
+        text = "L'ÉCONOMIE et l'éducation, encore l'économie."
+        matches = matcher.find(text)
+        self.assertEqual([keyword for keyword, _, _ in matches], ["economie", "Éducation", "economie"])
+        self.assertEqual([text[start:end] for _, start, end in matches], ["ÉCONOMIE", "éducation", "économie"])
+    
+    def test_word_boundaries(self):
+        """Un mot-clé ne correspond pas à l'intérieur d'un autre mot"""
+        matcher = KeywordMatcher(["art"])
+        self.assertEqual(matcher.find("le départ, la partie"), [])
+        self.assertEqual(len(matcher.find("l'art moderne")), 1)
+    
+    def test_multiword_and_longest_first(self):
+        """Les mots-clés composés tolèrent les retours à la ligne et priment sur leurs préfixes"""
+        matcher = KeywordMatcher(["radio", "radio associative"])
+        matches = matcher.find("une radio\nassociative et une radio")
+        self.assertEqual([keyword for keyword, _, _ in matches], ["radio associative", "radio"])
+    
+    def test_quote_fields(self):
+        """Les citations exposent le nombre d'occurrences et les mots-clés trouvés"""
+        subtitles = [srt.Subtitle(index=1, start=timedelta(seconds=0), end=timedelta(seconds=5),
+                                  content="La culture, encore la culture et la musique")]
+        quotes = extract_quotes(subtitles, min_length=1000, keywords=["culture", "musique", "sport"],
+                                group_subtitles=False)
+        self.assertEqual(len(quotes), 1)
+        self.assertEqual(quotes[0]['keyword_hits'], 3)
+        self.assertEqual(quotes[0]['matched_keywords'], {"culture": 2, "musique": 1})
+        self.assertEqual(len(quotes[0]['keyword_spans']), 3)
+
+class TestTfidfTopicDetection(unittest.TestCase):
+    
+    def make_topics(self, topics=6, length=100):
+        """Blocs de sous-titres au vocabulaire propre, noyés dans des mots outils communs"""
+        import random
+        rng = random.Random(1)
+        common = ['le', 'la', 'de', 'et', 'un', 'une', 'est', 'que', 'pour', 'dans']
+        subtitles = []
+        for i in range(topics * length):
+            topic = [f"sujet{i // length}mot{k}" for k in range(30)]
+            words = [rng.choice(topic) for _ in range(4)] + [rng.choice(common) for _ in range(5)]
+            rng.shuffle(words)
+            subtitles.append(MockSubtitle(" ".join(words), timedelta(seconds=i), timedelta(seconds=i + 1)))
+        return subtitles
+    
+    def test_finds_topic_boundaries(self):
+        """Chaque frontière entre blocs est trouvée, à un sous-titre près, sans fausse alerte"""
+        changes = detect_topic_changes_tfidf(self.make_topics())
+        self.assertEqual(len(changes), 5)
+        for change, expected in zip(changes, (100, 200, 300, 400, 500)):
+            self.assertLessEqual(abs(change - expected), 1)
+    
+    def test_short_or_empty_transcripts(self):
+        """Pas de frontière sans assez de sous-titres"""
+        self.assertEqual(detect_topic_changes_tfidf([]), [])
+        self.assertEqual(detect_topic_changes_tfidf(make_subtitles(10)), [])
+    
+    def test_extract_quotes_with_tfidf_engine(self):
+        """extract_quotes accepte le moteur TF-IDF"""
+        quotes = extract_quotes(make_subtitles(200), min_length=0, topic_detection=True,
+                                max_gap_seconds=3.0, topic_engine='tfidf')
+        self.assertEqual(sum(q['is_topic_change'] for q in quotes), 1)
+
+class TestStreaming(unittest.TestCase):
+    
+    def setUp(self):
+        self.subtitles = make_subtitles()
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.srt_path = os.path.join(self.tmpdir.name, 'episode.srt')
+        with open(self.srt_path, 'w', encoding='utf-8') as f:
+            f.write(srt.compose(self.subtitles))
+    
+    def tearDown(self):
+        self.tmpdir.cleanup()
+    
+    def test_iter_subtitles_from_srt(self):
+        """La lecture en flux donne les mêmes sous-titres que srt.parse"""
+        with open(self.srt_path, 'r', encoding='utf-8') as f:
+            expected = list(srt.parse(f.read()))
+        self.assertEqual(list(iter_subtitles_from_srt(self.srt_path)), expected)
+    
+    def test_iter_subtitles_multiline_content(self):
+        """Les sous-titres sur plusieurs lignes sont conservés"""
+        with open(self.srt_path, 'w', encoding='utf-8') as f:
+            f.write("1\n00:00:01,000 --> 00:00:02,000\nLigne un\nLigne deux\n\n"
+                    "2\n00:00:03,000 --> 00:00:04,000\n42\n")
+        subtitles = list(iter_subtitles_from_srt(self.srt_path))
+        self.assertEqual([sub.content for sub in subtitles], ["Ligne un\nLigne deux", "42"])
+    
+    def test_iter_topic_flags_matches_detect_topic_changes(self):
+        """Les indices marqués en flux sont ceux de detect_topic_changes"""
+        flags = [flag for _, flag in iter_topic_flags(iter(self.subtitles))]
+        self.assertEqual(len(flags), len(self.subtitles))
+        self.assertEqual([i for i, flag in enumerate(flags) if flag], detect_topic_changes(self.subtitles))
+    
+    def test_iter_passages_matches_group(self):
+        """Le regroupement en flux donne les mêmes passages"""
+        expected = group_subtitles_into_passages(self.subtitles, max_gap_seconds=1.0, min_passage_length=50)
+        passages = list(iter_passages(iter(self.subtitles), max_gap_seconds=1.0, min_passage_length=50))
+        self.assertEqual(passages, expected)
+    
+    def test_iter_passages_reports_discarded(self):
+        """Chaque sous-titre appartient à un passage retenu ou signalé comme écarté"""
+        discarded = []
+        passages = list(iter_passages(iter(self.subtitles), max_gap_seconds=1.0, min_passage_length=200,
+                                      on_discard=discarded.append))
+        self.assertTrue(discarded)
+        covered = sorted(i for passage in passages + discarded for i in range(passage.start_index, passage.end_index + 1))
+        self.assertEqual(covered, list(range(len(self.subtitles))))
+    
+    def test_stream_selection_matches_full_sort(self):
+        """La sélection bornée donne le même résultat qu'un tri complet"""
+        quotes = extract_quotes(self.subtitles, min_length=10, group_subtitles=False)
+        expected = sorted(quotes, key=score_quote, reverse=True)[:5]
+        expected.sort(key=lambda q: q['start_time'])
+        
+        candidates = iter_quotes(iter_subtitles_from_srt(self.srt_path), min_length=10, group_subtitles=False)
+        self.assertEqual(select_top_quotes(candidates, 5), expected)
+    
+    def test_export_json_data_from_generator(self):
+        """L'export JSON accepte un générateur et reste un JSON identique"""
+        quotes = extract_quotes(self.subtitles, min_length=10, group_subtitles=False)[:3]
+        output_file = os.path.join(self.tmpdir.name, 'quotes.json')
+        export_json_data(iter(quotes), output_file)
+        with open(output_file, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        self.assertEqual([q['content'] for q in data], [q['content'] for q in quotes])
+        
+        export_json_data(iter([]), output_file)
+        with open(output_file, 'r', encoding='utf-8') as f:
+            self.assertEqual(json.load(f), [])
+
+class TestBatch(unittest.TestCase):
+    
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.input_dir = os.path.join(self.tmpdir.name, 'episodes')
+        os.makedirs(os.path.join(self.input_dir, 'saison2'))
+        for name in ('ep1.srt', os.path.join('saison2', 'ep1.srt')):
+            with open(os.path.join(self.input_dir, name), 'w', encoding='utf-8') as f:
+                f.write(srt.compose(make_subtitles()))
+        with open(os.path.join(self.input_dir, 'casse.srt'), 'w', encoding='utf-8') as f:
+            f.write("ceci n'est pas un fichier SRT\n")
+        with open(os.path.join(self.input_dir, 'notes.txt'), 'w', encoding='utf-8') as f:
+            f.write("ignoré\n")
+    
+    def tearDown(self):
+        self.tmpdir.cleanup()
+    
+    def test_expand_input_paths(self):
+        """Les dossiers et motifs glob sont développés sans doublons"""
+        files = expand_input_paths([self.input_dir, os.path.join(self.input_dir, '*.srt')])
+        self.assertEqual(sorted(p.name for p in files), ['casse.srt', 'ep1.srt', 'ep1.srt'])
+    
+    def test_run_batch_reports_failures(self):
+        """Un fichier invalide est signalé sans interrompre le lot"""
+        output_dir = os.path.join(self.tmpdir.name, 'sorties')
+        args = build_arg_parser().parse_args([self.input_dir, '--jobs', '2', '-j', '-l', '10',
+                                              '--output-dir', output_dir])
+        results = run_batch(expand_input_paths(args.file), args)
+        
+        self.assertEqual([r['status'] for r in results], ['error', 'ok', 'ok'])
+        self.assertIn('SRTParseError', results[0]['error'])
+        for name in ('ep1_quotes.txt', 'ep1_quotes.json', 'ep1_2_quotes.txt', 'batch_summary.json'):
+            self.assertTrue(os.path.exists(os.path.join(output_dir, name)), name)
+        with open(os.path.join(output_dir, 'batch_summary.json'), 'r', encoding='utf-8') as f:
+            summary = json.load(f)
+        self.assertEqual((summary['succeeded'], summary['failed']), (2, 1))
+
+class TestAnalysisCache(unittest.TestCase):
+    
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.srt_data = srt.compose(make_subtitles(200)).encode('utf-8')
+    
+    def tearDown(self):
+        self.tmpdir.cleanup()
+    
+    def test_only_changed_stages_are_recomputed(self):
+        """Changer les mots-clés réutilise tout; changer l'écart refait le regroupement"""
+        cache = AnalysisCache(self.tmpdir.name)
+        options = dict(min_length=100, topic_detection=True, group_subtitles=True, max_gap_seconds=3.0)
+        quotes, report = cached_extract_quotes(cache, self.srt_data, keywords=['climat'], **options)
+        self.assertEqual(set(report.values()), {'miss'})
+        
+        quotes, report = cached_extract_quotes(cache, self.srt_data, keywords=['musique'], **options)
+        self.assertEqual(report, {'candidates': 'hit', 'topics': 'hit'})
+        expected = extract_quotes(list(srt.parse(self.srt_data.decode('utf-8'))), keywords=['musique'], **options)
+        self.assertEqual(quotes, expected)
+        
+        options['max_gap_seconds'] = 1.0
+        _, report = cached_extract_quotes(cache, self.srt_data, keywords=['musique'], **options)
+        self.assertEqual(report, {'candidates': 'miss', 'subtitles': 'hit', 'topics': 'hit'})
+    
+    def test_analysis_reports_each_stage(self):
+        """L'analyse d'un envoi publie le début et la fin de chaque étape, puis écrit les exports"""
+        srt_path = os.path.join(self.tmpdir.name, "episode.srt")
+        with open(srt_path, 'wb') as f:
+            f.write(self.srt_data)
+        events = []
+        result = analyze_transcript(srt_path, os.path.join(self.tmpdir.name, "episode"),
+                                    {'min_length': 100, 'num_quotes': 3, 'export_json': True},
+                                    AnalysisCache(os.path.join(self.tmpdir.name, 'cache')),
+                                    report=lambda stage, state: events.append((stage, state)))
+        
+        self.assertEqual(events[:2], [('group', 'start'), ('parse', 'start')])
+        self.assertEqual(result['stages'], {'parse': 'miss', 'group': 'miss', 'sentiment': 'skipped',
+                                            'topics': 'skipped', 'score': 'done', 'export': 'done'})
+        self.assertEqual([stage for stage, state in events if state == 'start'], ['group', 'parse', 'score', 'export'])
+        self.assertTrue(os.path.exists(result['files']['json']))
+        self.assertEqual(result['quotes'], 3)
+    
+    def test_size_bound_evicts_least_recently_used(self):
+        """La taille du cache reste bornée, les entrées les plus anciennes partent en premier"""
+        import pickle
+        value = list(range(100))
+        max_bytes = 3 * len(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+        cache = AnalysisCache(self.tmpdir.name, max_bytes=max_bytes)
+        for i in range(5):
+            cache.put('topics', f"topics-{i}.pkl", value)
+            cache.get('topics', "topics-0.pkl")
+        self.assertEqual(cache.stats()['entries'], 3)
+        self.assertIsNotNone(cache.get('topics', "topics-0.pkl"))
+        self.assertIsNone(cache.get('topics', "topics-1.pkl"))
+        self.assertGreater(cache.stats()['evictions'], 0)
+        # L'index est reconstruit depuis le disque au redémarrage
+        self.assertEqual(AnalysisCache(self.tmpdir.name, max_bytes=max_bytes).stats()['entries'], 3)
+    
+    def test_entries_written_by_another_process_are_hits(self):
+        """Une étape enregistrée par un autre processus (autre instance) est trouvée sans relecture du dossier"""
+        worker, other = AnalysisCache(self.tmpdir.name), AnalysisCache(self.tmpdir.name)
+        worker.put('topics', "topics-0.pkl", [1, 2])
+        self.assertEqual(other.get('topics', "topics-0.pkl"), [1, 2])
+        self.assertEqual(other.stats()['entries'], 1)
+
+class TestJobQueue(unittest.TestCase):
+    
+    def setUp(self):
+        self.queue = JobQueue(workers=3, max_ffmpeg=1)
+    
+    def tearDown(self):
+        self.queue.shutdown()
+    
+    def wait(self, job, timeout=10):
+        import time
+        deadline = time.time() + timeout
+        while job.status not in ('succeeded', 'failed', 'cancelled') and time.time() < deadline:
+            time.sleep(0.05)
+        return job.status
+    
+    def test_global_process_limit(self):
+        """Les processus de tâches différentes ne dépassent jamais la limite globale"""
+        import time
+        started = time.time()
+        jobs = [self.queue.submit('clips', f"episode{i}", lambda job: job.run_command(
+            [sys.executable, '-c', 'import time; time.sleep(0.3)'])) for i in range(3)]
+        time.sleep(0.1)
+        # Les trois tâches ont démarré, mais une seule a pu lancer son processus
+        self.assertEqual(sum(job.status == 'running' for job in jobs), 3)
+        self.assertEqual(sum("en attente d'un processus" in job.message for job in jobs), 2)
+        for job in jobs:
+            self.assertEqual(self.wait(job), 'succeeded')
+            self.assertEqual(job.result, 0)
+        self.assertGreaterEqual(time.time() - started, 0.9)
+    
+    def test_cancel_and_failure(self):
+        """Une tâche annulée arrête son processus; une exception marque la tâche en échec"""
+        slow = self.queue.submit('clips', 'a', lambda job: job.run_command(
+            [sys.executable, '-c', 'import time; time.sleep(30)']))
+        import time
+        time.sleep(0.3)
+        self.assertTrue(self.queue.cancel(slow.id))
+        self.assertEqual(self.wait(slow), 'cancelled')
+        self.assertLess(slow.finished_at - slow.started_at, 10)
+        
+        def broken(job):
+            raise RuntimeError("vidéo illisible")
+        failed = self.queue.submit('clips', 'b', broken)
+        self.assertEqual(self.wait(failed), 'failed')
+        self.assertEqual(failed.to_dict()['error'], "vidéo illisible")
+        self.assertEqual([job.id for job in self.queue.list('b')], [failed.id])
+        self.assertFalse(self.queue.cancel(failed.id))
+    
+    def test_command_output_lines(self):
+        """Avec on_output, chaque ligne de la sortie standard est transmise pendant l'exécution"""
+        lines = []
+        job = self.queue.submit('clips', 'c', lambda job: job.run_command(
+            [sys.executable, '-c', 'print("frame=1"); print("progress=end")'], on_output=lines.append))
+        self.assertEqual(self.wait(job), 'succeeded')
+        self.assertEqual([line.strip() for line in lines], [b"frame=1", b"progress=end"])
+
+def timed_subtitles(items):
+    """Sous-titres (début, fin, texte) en secondes"""
+    return [srt.Subtitle(index=i, start=timedelta(seconds=start), end=timedelta(seconds=end), content=text)
+            for i, (start, end, text) in enumerate(items, 1)]
+
+class TestClipSubtitles(unittest.TestCase):
+    
+    def test_events_are_clipped_and_rebased(self):
+        """Les sous-titres de chaque extrait sont coupés à ses bornes et ramenés à son début"""
+        subtitles = timed_subtitles([(0, 4, "Un"), (5, 9, "Deux"), (10, 14, "Trois"), (30, 34, "Quatre")])
+        clips = [{'index': 1, 'start': timedelta(seconds=7), 'duration': timedelta(seconds=5)},
+                 {'index': 2, 'start': timedelta(seconds=3), 'duration': timedelta(seconds=3)},
+                 {'index': 3, 'start': timedelta(seconds=20), 'duration': timedelta(seconds=5)}]
+        events = clip_events(iter(subtitles), clips)
+        self.assertEqual(events[1], [(timedelta(0), timedelta(seconds=2), "Deux"),
+                                     (timedelta(seconds=3), timedelta(seconds=5), "Trois")])
+        self.assertEqual(events[2], [(timedelta(0), timedelta(seconds=1), "Un"),
+                                     (timedelta(seconds=2), timedelta(seconds=3), "Deux")])
+        self.assertEqual(events[3], [])
+        
+        with tempfile.TemporaryDirectory() as directory:
+            paths = write_clip_subtitles(subtitles, clips, directory, 'ass', {'color': '0xff8000', 'opacity': '1'})
+            self.assertEqual(sorted(paths), [1, 2])
+            with open(paths[1], encoding='utf-8') as f:
+                content = f.read()
+        self.assertIn("Dialogue: 0,0:00:03.00,0:00:05.00,Default,,0,0,0,,Trois", content)
+        self.assertIn("Style: Default,Arial,36,&H000080FF,", content)
+    
+    def test_ass_colour(self):
+        """Les couleurs RGB de l'éditeur deviennent des couleurs ASS (alpha = transparence)"""
+        self.assertEqual(ass_colour('0x112233'), "&H00332211")
+        self.assertEqual(ass_colour("#000000", 0.7), "&H4D000000")
+    
+    def test_script_uses_pregenerated_subtitles(self):
+        """Le script bash utilise les sous-titres générés, sans ffmpeg pour les découper"""
+        subtitles = timed_subtitles([(0, 4, "Bonjour"), (5, 9, "Au revoir")])
+        quotes = [{'content': "Bonjour", 'start_time': timedelta(seconds=0), 'end_time': timedelta(seconds=4),
+                   'formatted_start': "00:00:00", 'formatted_end': "00:00:04"}]
+        with tempfile.TemporaryDirectory() as directory:
+            script = generate_ffmpeg_cut_file(quotes, os.path.join(directory, "decoupe.txt"), 1, True, subtitles=subtitles)
+            with open(script, encoding='utf-8') as f:
+                content = f.read()
+            with open(os.path.join(directory, "decoupe_sous_titres", "segment_01.srt"), encoding='utf-8') as f:
+                clip_srt = f.read()
+        self.assertIn("$SUBTITLE_DIR/segment_01.srt", content)
+        self.assertNotIn('-f srt', content)
+        self.assertIn("00:00:00,000 --> 00:00:04,000\nBonjour", clip_srt)
+
+class TestRender(unittest.TestCase):
+    
+    def test_parallel_render_isolates_failures(self):
+        """Les extraits sont encodés en parallèle et seul l'extrait en échec est signalé"""
+        import threading
+        import time
+        quotes = [{'content': f"Citation {i}", 'start_time': timedelta(seconds=10 * i),
+                   'end_time': timedelta(seconds=10 * i + 5)} for i in range(3)]
+        commands = []
+        lock = threading.Lock()
+        
+        def fake_run(command, log_path=None):
+            with lock:
+                commands.append(command)
+            time.sleep(0.3)
+            return 1 if command[-1].endswith('segment_02_Citation_1.mp4') else 0
+        
+        with tempfile.TemporaryDirectory() as output_dir:
+            started = time.perf_counter()
+            results = render_clips('video.mp4', quotes, output_dir, jobs=3, run=fake_run)
+            elapsed = time.perf_counter() - started
+        
+        self.assertLess(elapsed, 0.8)
+        self.assertEqual([result['ok'] for result in results], [True, False, True])
+        self.assertEqual(results[1]['returncode'], 1)
+        self.assertIn("code 1", results[1]['error'])
+        self.assertGreaterEqual(results[0]['seconds'], 0.25)
+        # Première citation: la marge ne fait pas commencer l'extrait avant 0
+        first = next(command for command in commands if command[-1].endswith('segment_01_Citation_0.mp4'))
+        self.assertEqual(first[first.index('-ss') + 1], "00:00:00.000")
+        self.assertEqual(first[first.index('-threads') + 1], str(threads_per_job(3)))
+        # -ss avant -i: positionnement direct sur le point de coupe
+        self.assertLess(first.index('-ss'), first.index('-i'))
+    
+    def test_copy_mode_snaps_to_keyframes(self):
+        """En mode copie, les bornes vont sur l'image clé la plus proche et le décalage est indiqué"""
+        keyframes = parse_keyframes("0.000000,K_\n2.000000,__\n8.000000,K_\nN/A,K_\n16.000000,K__\n24.000000,K_\n")
+        self.assertEqual(keyframes, [0.0, 8.0, 16.0, 24.0])
+        
+        quote = {'content': "Citation", 'start_time': timedelta(seconds=10), 'end_time': timedelta(seconds=20)}
+        clip, = snap_clips(plan_clips([quote], "sorties", padding_seconds=1), keyframes)
+        self.assertEqual(clip['start'], timedelta(seconds=8))
+        self.assertEqual(clip['duration'], timedelta(seconds=16))
+        self.assertEqual((clip['start_shift'], clip['end_shift']), (-1.0, 3.0))
+        
+        commands = []
+        with tempfile.TemporaryDirectory() as output_dir:
+            results = render_clips('video.mp4', [quote], output_dir, mode='copy', keyframes=keyframes,
+                                   run=lambda command, log_path=None: commands.append(command) or 0)
+            with self.assertRaises(ValueError):
+                render_clips('video.mp4', [quote], output_dir, mode='copy', srt_file='video.srt')
+        self.assertEqual((results[0]['start_shift'], results[0]['end_shift']), (-1.0, 3.0))
+        command, = commands
+        self.assertEqual(command[command.index('-c') + 1], 'copy')
+        self.assertEqual(command[command.index('-ss') + 1], "00:00:08.000")
+        self.assertNotIn('-threads', command)
+    
+    def test_copy_mode_keeps_millisecond_keyframes(self):
+        """Une image clé à 4,004 s n'est pas arrondie en dessous (sinon -ss part de l'image clé précédente)"""
+        quote = {'content': "Citation", 'start_time': timedelta(seconds=5), 'end_time': timedelta(seconds=9)}
+        commands = []
+        with tempfile.TemporaryDirectory() as output_dir:
+            results = render_clips('video.mp4', [quote], output_dir, mode='copy', keyframes=[0.0, 4.004, 10.01],
+                                   run=lambda command, log_path=None: commands.append(command) or 0)
+        command, = commands
+        self.assertEqual(command[command.index('-ss') + 1], "00:00:04.004")
+        self.assertEqual(command[command.index('-t') + 1], "00:00:06.006")
+        self.assertEqual((results[0]['start_shift'], results[0]['end_shift']), (0.004, 0.01))
+    
+    def test_single_pass_engine(self):
+        """Le moteur single-pass décode chaque paquet d'extraits une seule fois"""
+        quotes = [{'content': f"Citation {i}", 'start_time': timedelta(seconds=100 + 30 * i),
+                   'end_time': timedelta(seconds=110 + 30 * i)} for i in range(3)]
+        commands = []
+        
+        def fake_run(command, log_path=None):
+            commands.append(command)
+            # Le second paquet échoue
+            return 1 if len(commands) == 2 else 0
+        
+        with tempfile.TemporaryDirectory() as output_dir:
+            results = render_clips('video.mp4', quotes, output_dir, jobs=1, engine='single-pass',
+                                   max_clips_per_pass=2, has_audio=True, run=fake_run)
+        
+        self.assertEqual(len(commands), 2)
+        first = commands[0]
+        self.assertEqual(first[first.index('-ss') + 1], "00:01:39.000")
+        self.assertEqual(first[first.index('-t') + 1], "00:00:42.000")
+        # -t avant -i: limite la lecture, pas seulement la première sortie
+        self.assertLess(first.index('-t'), first.index('-i'))
+        graph = first[first.index('-filter_complex') + 1]
+        self.assertIn("[0:v]split=2[vin0][vin1]", graph)
+        self.assertIn("[vin1]trim=start=30.000:end=42.000,setpts=PTS-STARTPTS[v1]", graph)
+        self.assertIn("[ain0]atrim=start=0.000:end=12.000,asetpts=PTS-STARTPTS[a0]", graph)
+        self.assertEqual(sum('segment_' in argument for argument in first), 2)
+        self.assertEqual([result['ok'] for result in results], [True, True, False])
+    
+    def test_single_pass_splits_distant_clips(self):
+        """Deux extraits éloignés ne sont pas décodés dans la même passe"""
+        clips = [{'start': timedelta(seconds=start), 'duration': timedelta(seconds=10)}
+                 for start in (5, 20, 5400, 5410)]
+        chunks = chunk_clips(clips, max_clips=8)
+        self.assertEqual([[clip['start'].total_seconds() for clip in chunk] for chunk in chunks],
+                         [[5, 20], [5400, 5410]])
+
+class TestFfmpegProgress(unittest.TestCase):
+    
+    PROGRESS = b"""frame=120
+fps=48.00
+total_size=262144
+out_time_us=5000000
+out_time=00:00:05.000000
+speed=2.50x
+progress=continue
+frame=240
+fps=N/A
+total_size=524288
+out_time_us=10000000
+speed=N/A
+progress=end
+"""
+    
+    def test_parse_progress_blocks(self):
+        """Chaque bloc de -progress donne les images, la vitesse, le temps restant et les octets"""
+        snapshots = []
+        parser = ProgressParser(20.0, snapshots.append)
+        for line in self.PROGRESS.splitlines(keepends=True):
+            parser.feed(line)
+        
+        self.assertEqual(len(snapshots), 2)
+        first, last = snapshots
+        self.assertEqual(first['frames'], 120)
+        self.assertEqual(first['bytes'], 262144)
+        self.assertEqual(first['speed'], 2.5)
+        self.assertEqual(first['fraction'], 0.25)
+        self.assertEqual(first['eta_seconds'], 6.0)
+        self.assertFalse(first['ended'])
+        self.assertIsNone(last['fps'])
+        self.assertEqual(last['fraction'], 1.0)
+        self.assertTrue(last['ended'])
+    
+    def test_render_reports_clip_progress(self):
+        """render_clips lance ffmpeg avec -progress et rapporte l'avancement de chaque extrait"""
+        quotes = [{'content': f"Citation {i}", 'start_time': timedelta(seconds=10 + 30 * i),
+                   'end_time': timedelta(seconds=18 + 30 * i)} for i in range(2)]
+        commands = []
+        reports = []
+        
+        def fake_run(command, log_path=None, on_output=None):
+            commands.append(command)
+            for line in self.PROGRESS.splitlines():
+                on_output(line)
+            return 0
+        
+        with tempfile.TemporaryDirectory() as output_dir:
+            results = render_clips('video.mp4', quotes, output_dir, jobs=1, run=fake_run,
+                                   on_clip_progress=lambda index, snapshot: reports.append((index, snapshot)))
+        
+        self.assertEqual(commands[0][1:4], ['-progress', 'pipe:1', '-nostats'])
+        self.assertEqual(sorted({index for index, _ in reports}), [1, 2])
+        self.assertEqual(reports[0][1]['fraction'], 0.5)
+        progress = RenderProgress({clip['index']: clip['duration'].total_seconds() for clip in plan_clips(quotes, '.')})
+        progress.update(1, reports[0][1])
+        state = progress.to_dict()
+        self.assertEqual(state['fraction'], 0.25)
+        self.assertEqual(state['running'], 1)
+        for result in results:
+            self.assertEqual(result['media_seconds'], 10.0)
+            progress.finish(result)
+        self.assertEqual(progress.to_dict()['fraction'], 1.0)
+        self.assertEqual(progress.to_dict()['clips']['2']['state'], 'done')
+    
+    def test_speed_history(self):
+        """L'historique garde la vitesse des extraits encodés, relue au redémarrage"""
+        results = [
+            {'index': 1, 'ok': True, 'cache': 'miss', 'media_seconds': 10.0, 'seconds': 4.0, 'speed': 2.5},
+            {'index': 2, 'ok': True, 'cache': 'hit', 'media_seconds': 10.0, 'seconds': 0.0, 'speed': None},
+            {'index': 3, 'ok': True, 'cache': None, 'media_seconds': 12.0, 'seconds': 8.0, 'speed': 1.5}
+        ]
+        with tempfile.TemporaryDirectory() as cache_dir:
+            path = os.path.join(cache_dir, 'vitesses.jsonl')
+            SpeedHistory(path, max_entries=3).record(results, encoder='libx264', mode='encode', engine='parallel')
+            history = SpeedHistory(path, max_entries=3)
+            self.assertEqual([entry['clip'] for entry in history.entries()], [3, 1])
+            summary = history.summary()
+            self.assertEqual(len(summary), 1)
+            self.assertEqual(summary[0]['mean_speed'], 2.0)
+            self.assertEqual(summary[0]['clips'], 2)
+            # Historique borné: les plus anciennes entrées sont oubliées, aussi dans le fichier
+            history.record(results, encoder='libx264', mode='encode', engine='parallel')
+            self.assertEqual(len(SpeedHistory(path, max_entries=3).entries()), 3)
+            # Le fichier est complété, puis compacté quand il dépasse le double de la limite
+            with open(path, 'r', encoding='utf-8') as f:
+                self.assertEqual(len(f.readlines()), 4)
+            for _ in range(2):
+                history.record(results, encoder='libx264', mode='encode', engine='parallel')
+            with open(path, 'r', encoding='utf-8') as f:
+                self.assertEqual(len(f.readlines()), 3)
+
+class TestFfmpegCaps(unittest.TestCase):
+    
+    FILTERS = """Filters:
+  T.. = Timeline support
+  ... = Source or sink filter
+ TSC drawtext          V->V       Draw text on top of video frames using libfreetype library.
+ ... split             V->N       Pass on the input to N video outputs.
+ T.. trim              V->V       Pick one continuous section from the input, drop the rest.
+"""
+    ENCODERS = """Encoders:
+ V..... = Video
+ A..... = Audio
+ ------
+ V....D libopenh264          OpenH264 H.264 / AVC / MPEG-4 AVC / MPEG-4 part 10 (codec h264)
+ A....D aac                  AAC (Advanced Audio Coding)
+"""
+    
+    def fake_ffmpeg(self, calls):
+        def run(arguments):
+            calls.append(arguments[-1])
+            return {'-version': "ffmpeg version 6.1 Copyright (c) 2000-2023\n",
+                    '-filters': self.FILTERS, '-encoders': self.ENCODERS}[arguments[-1]]
+        return run
+    
+    def test_probe_is_cached_on_disk(self):
+        """Les filtres et encodeurs ne sont listés qu'une fois par version de ffmpeg"""
+        calls = []
+        with tempfile.TemporaryDirectory() as cache_dir:
+            caps = probe_capabilities('ffmpeg-test', cache_dir=cache_dir, run=self.fake_ffmpeg(calls))
+            self.assertEqual(caps['filters'], ['drawtext', 'split', 'trim'])
+            self.assertEqual(caps['encoders'], ['aac', 'libopenh264'])
+            self.assertFalse(caps['subtitles'])
+            self.assertEqual(caps['video_encoder'], 'libopenh264')
+            
+            # Nouveau processus: seul le cache disque reste
+            ffmpeg_caps._memory.clear()
+            again = probe_capabilities('ffmpeg-test', cache_dir=cache_dir, run=self.fake_ffmpeg(calls))
+            self.assertEqual(again['filters'], caps['filters'])
+        self.assertEqual(calls, ['-version', '-filters', '-encoders', '-version'])
+    
+    def test_drawtext_chosen_without_libass(self):
+        """Sans libass, chaque extrait est encodé une seule fois avec drawtext"""
+        caps = {'subtitles': False, 'drawtext': True, 'font_file': '/fonts/DejaVuSans.ttf',
+                'video_encoder': 'libopenh264'}
+        self.assertEqual(subtitle_method(caps), 'drawtext')
+        self.assertIsNone(subtitle_method({**caps, 'font_file': None}))
+        quotes = [{'content': f"Citation {i}", 'start_time': timedelta(seconds=10 * i),
+                   'end_time': timedelta(seconds=10 * i + 5)} for i in range(2)]
+        commands = []
+        
+        def fake_run(command, log_path=None):
+            commands.append(command)
+            return 0
+        
+        with tempfile.TemporaryDirectory() as output_dir:
+            results = render_clips('video.mp4', quotes, output_dir, jobs=1, subtitles=[], capabilities=caps,
+                                   run=fake_run)
+        
+        self.assertEqual(len(commands), 2)
+        self.assertTrue(all(result['ok'] for result in results))
+        for command in commands:
+            self.assertIn("drawtext=fontfile='/fonts/DejaVuSans.ttf'", command[command.index('-vf') + 1])
+            self.assertEqual(command[command.index('-c:v') + 1], 'libopenh264')
+
+class TestMediaIndex(unittest.TestCase):
+    
+    STREAMS = json.dumps({
+        'streams': [
+            {'index': 0, 'codec_type': 'video', 'codec_name': 'h264', 'pix_fmt': 'yuv420p',
+             'width': 1920, 'height': 1080, 'r_frame_rate': '30000/1001', 'bit_rate': '4000000'},
+            {'index': 1, 'codec_type': 'audio', 'codec_name': 'aac', 'sample_fmt': 'fltp',
+             'r_frame_rate': '0/0', 'sample_rate': '48000', 'channels': 2, 'bit_rate': 'N/A'}
+        ],
+        'format': {'duration': '60.060000'}
+    })
+    PACKETS = "0.000000,K_\n0.033367,__\n2.002000,K_\nN/A,K_\n4.004000,K_\n"
+    
+    def fake_ffprobe(self, calls):
+        def run(arguments):
+            calls.append(arguments)
+            return self.STREAMS if '-of' in arguments and arguments[arguments.index('-of') + 1] == 'json' else self.PACKETS
+        return run
+    
+    def test_binary_index_round_trip(self):
+        """L'index est écrit en binaire à côté de la vidéo et relu tant que la vidéo ne change pas"""
+        calls = []
+        with tempfile.TemporaryDirectory() as tmp:
+            video = os.path.join(tmp, "projet_video.mp4")
+            with open(video, 'wb') as f:
+                f.write(b'\0' * 1000)
+            index = build_media_index(video, run=self.fake_ffprobe(calls))
+            write_media_index(index, index_path(video))
+            self.assertEqual(len(calls), 2)
+            self.assertEqual(os.path.getsize(index_path(video)), HEADER.size + 2 * STREAM.size + 3 * 4)
+            
+            loaded = load_media_index(video)
+            self.assertEqual(loaded.keyframes, [0.0, 2.002, 4.004])
+            self.assertAlmostEqual(loaded.duration, 60.06)
+            self.assertTrue(loaded.has_audio)
+            self.assertEqual(loaded.video_stream['frame_rate'], [30000, 1001])
+            self.assertEqual(loaded.streams[1]['codec'], 'aac')
+            self.assertEqual(loaded.streams[1]['bit_rate'], 0)
+            
+            # Vidéo remplacée: l'index est périmé
+            with open(video, 'ab') as f:
+                f.write(b'\0')
+            self.assertIsNone(load_media_index(video))
+    
+    def test_render_uses_index(self):
+        """Le rendu prend les images clés dans l'index et refuse les citations après la fin de la vidéo"""
+        with tempfile.TemporaryDirectory() as tmp:
+            video = os.path.join(tmp, "projet_video.mp4")
+            with open(video, 'wb') as f:
+                f.write(b'\0' * 1000)
+            index = build_media_index(video, run=self.fake_ffprobe([]))
+        quotes = [{'content': "Dans la vidéo", 'start_time': timedelta(seconds=3), 'end_time': timedelta(seconds=61)},
+                  {'content': "Trop tard", 'start_time': timedelta(seconds=75), 'end_time': timedelta(seconds=80)}]
+        commands = []
+        
+        def fake_run(command, log_path=None):
+            commands.append(command)
+            return 0
+        
+        with tempfile.TemporaryDirectory() as output_dir:
+            results = render_clips('video.mp4', quotes, output_dir, jobs=1, mode='copy', media_index=index,
+                                   ffprobe='ffprobe-absent', run=fake_run)
+        
+        self.assertEqual(len(commands), 1)
+        self.assertEqual(results[0]['start_shift'], 0.002)
+        # Fin (marge comprise) ramenée à la fin de la vidéo
+        duration = commands[0][commands[0].index('-t') + 1]
+        self.assertTrue(duration.startswith("00:00:58.05"), duration)
+        self.assertFalse(results[1]['ok'])
+        self.assertIn("hors de la vidéo", results[1]['error'])
+
+class TestClipCache(unittest.TestCase):
+    
+    def test_only_changed_clips_are_encoded(self):
+        """Un nouveau rendu lie les extraits inchangés depuis le cache et n'encode que les autres"""
+        quotes = [{'content': f"Citation {i}", 'start_time': timedelta(seconds=10 * i + 1),
+                   'end_time': timedelta(seconds=10 * i + 5)} for i in range(3)]
+        caps = {'subtitles': True, 'video_encoder': 'libx264'}
+        subtitles = [srt.Subtitle(i, timedelta(seconds=10 * i + 1), timedelta(seconds=10 * i + 5), f"Citation {i}")
+                     for i in range(3)]
+        commands = []
+        
+        def fake_run(command, log_path=None):
+            commands.append(command)
+            with open(command[-1], 'w') as f:
+                f.write(command[command.index('-ss') + 1])
+            return 0
+        
+        with tempfile.TemporaryDirectory() as tmp:
+            video = os.path.join(tmp, "video.mp4")
+            with open(video, 'wb') as f:
+                f.write(b'video')
+            cache = ClipCache(os.path.join(tmp, 'cache'), max_bytes=1024)
+            output_dir = os.path.join(tmp, 'clips')
+            
+            first = render_clips(video, quotes, output_dir, jobs=1, subtitles=subtitles, capabilities=caps,
+                                 clip_cache=cache, run=fake_run)
+            self.assertEqual([result['cache'] for result in first], ['miss'] * 3)
+            self.assertEqual(len(commands), 3)
+            
+            # Seul le texte du deuxième sous-titre change
+            subtitles[1] = srt.Subtitle(1, subtitles[1].start, subtitles[1].end, "Citation modifiée")
+            second = render_clips(video, quotes, output_dir, jobs=1, subtitles=subtitles, capabilities=caps,
+                                  clip_cache=cache, run=fake_run)
+            self.assertEqual([result['cache'] for result in second], ['hit', 'miss', 'hit'])
+            self.assertEqual(len(commands), 4)
+            self.assertTrue(all(result['ok'] for result in second))
+            self.assertEqual(cache.stats()['hits'], 2)
+            # Extrait repris: lien physique vers l'entrée du cache
+            self.assertGreaterEqual(os.stat(second[0]['output']).st_nlink, 2)
+            self.assertEqual(render_summary(second)['cache_hits'], 2)
+    
+    def test_recent_temp_files_survive_startup(self):
+        """Au démarrage, seuls les fichiers temporaires abandonnés sont supprimés"""
+        with tempfile.TemporaryDirectory() as tmp:
+            recent = os.path.join(tmp, "a.mp4.1.1.tmp")
+            stale = os.path.join(tmp, "b.mp4.2.2.tmp")
+            for path in (recent, stale):
+                with open(path, 'wb') as f:
+                    f.write(b'clip')
+            old = time.time() - STALE_TEMP_SECONDS - 60
+            os.utime(stale, (old, old))
+            
+            ClipCache(tmp)
+            self.assertTrue(os.path.exists(recent))
+            self.assertFalse(os.path.exists(stale))
+
+class TestChunkedUpload(unittest.TestCase):
+    
+    def test_resume_and_deduplicate(self):
+        """Un envoi coupé reprend au dernier décalage confirmé; une vidéo identique est liée"""
+        import hashlib
+        import io
+        data = bytes(range(256)) * 5000
+        
+        class DroppedConnection(io.BytesIO):
+            def read(self, size=-1):
+                if self.tell() >= 300000:
+                    raise OSError("connexion coupée")
+                return super().read(min(size, 100000))
+        
+        with tempfile.TemporaryDirectory() as tmp:
+            uploads = ChunkedUploads(os.path.join(tmp, 'envois'), os.path.join(tmp, 'empreintes'))
+            session = uploads.create('projet', len(data), 'video.mp4:1')
+            with self.assertRaises(OSError):
+                uploads.write(session, 0, DroppedConnection(data))
+            self.assertEqual(session.offset, 300000)
+            with self.assertRaises(ValueError):
+                uploads.write(session, 0, io.BytesIO(data))
+            
+            # Redémarrage: l'envoi est retrouvé et son empreinte recalculée
+            uploads = ChunkedUploads(os.path.join(tmp, 'envois'), os.path.join(tmp, 'empreintes'))
+            session = uploads.create('projet', len(data), 'video.mp4:1')
+            self.assertEqual(session.offset, 300000)
+            # Autre fichier de même taille: nouvel envoi, l'envoi partiel est abandonné
+            replaced = uploads.create('projet', len(data), 'autre.mp4:2')
+            self.assertEqual(replaced.offset, 0)
+            self.assertIsNone(uploads.get(session.id))
+            session = replaced
+            uploads.write(session, 0, io.BytesIO(data[:300000]))
+            uploads.write(session, 300000, io.BytesIO(data[300000:]))
+            first = os.path.join(tmp, 'projet_video.mp4')
+            digest, deduplicated = uploads.finalize(session, first, hashlib.sha256(data).hexdigest())
+            self.assertEqual(digest, hashlib.sha256(data).hexdigest())
+            self.assertFalse(deduplicated)
+            with open(first, 'rb') as f:
+                self.assertEqual(f.read(), data)
+            
+            other = uploads.create('autre', len(data))
+            uploads.write(other, 0, io.BytesIO(data))
+            second = os.path.join(tmp, 'autre_video.mp4')
+            self.assertTrue(uploads.finalize(other, second)[1])
+            self.assertTrue(os.path.samefile(first, second))
+            self.assertEqual(os.listdir(os.path.join(tmp, 'envois')), [])
+
+class TestProjectStore(unittest.TestCase):
+    
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.store = ProjectStore(os.path.join(self.tmpdir.name, 'projets.sqlite3'))
+        self.quotes = [Quote(f"Citation {i}", 10000 * i, 10000 * i + 5000, is_long=True,
+                             extra={'sentiment_polarity': 0.5}) for i in range(3)]
+    
+    def tearDown(self):
+        self.store.close()
+        self.tmpdir.cleanup()
+    
+    def test_analysis_round_trip(self):
+        """Citations, sous-titres et paramètres d'une analyse sont relus tels quels"""
+        subtitles = timed_subtitles([(0, 2, "Bonjour"), (2, 4, "à tous")])
+        self.store.save_analysis('episode', self.quotes, iter(subtitles), {'generate_ffmpeg': True})
+        
+        project = self.store.get_project('episode')
+        self.assertEqual(project['quotes'], 3)
+        self.assertEqual(project['options'], {'generate_ffmpeg': True})
+        self.assertIsNone(project['subtitle_options'])
+        quotes = self.store.quotes('episode')
+        self.assertEqual([quote.to_dict() for quote in quotes], [quote.to_dict() for quote in self.quotes])
+        self.assertEqual(list(self.store.iter_subtitles('episode')), subtitles)
+        self.assertIsNone(self.store.get_project('inconnu'))
+    
+    def test_editor_updates_only_changed_rows(self):
+        """Une sauvegarde de l'éditeur ne réécrit que les citations modifiées"""
+        self.store.save_analysis('episode', self.quotes)
+        edited = self.store.quotes('episode')
+        edited[1] = Quote("Citation modifiée", 12000, 16000, is_long=True, extra={'sentiment_polarity': 0.5})
+        self.assertEqual(self.store.update_quotes('episode', edited), 1)
+        self.assertEqual(self.store.update_quotes('episode', edited), 0)
+        self.assertEqual(self.store.update_quotes('episode', edited[:2]), 1)
+        self.assertEqual(self.store.add_quote('episode', Quote("Combinée", 0, 30000)), 2)
+        self.assertEqual([quote.content for quote in self.store.quotes('episode')],
+                         ["Citation 0", "Citation modifiée", "Combinée"])
+    
+    def test_quote_edits_with_versions(self):
+        """Modification, insertion, déplacement et suppression d'une citation par identifiant et version"""
+        self.store.save_analysis('episode', self.quotes)
+        first, second, third = self.store.quote_entries('episode')
+        version = self.store.get_project('episode')['version']
+        
+        edited = self.store.patch_quote('episode', second['id'], second['version'], {'content': "Modifiée"})
+        self.assertEqual((edited['content'], edited['version'], edited['start_time_seconds']), ("Modifiée", 2, 10.0))
+        with self.assertRaises(VersionConflict) as conflict:
+            self.store.patch_quote('episode', second['id'], second['version'], {'content': "Écrasée"})
+        self.assertEqual(conflict.exception.current['content'], "Modifiée")
+        
+        inserted = self.store.insert_quote('episode', Quote("Insérée", 0, 1000), position=0)
+        self.store.move_quote('episode', third['id'], third['version'], 1)
+        self.store.delete_quote('episode', first['id'], first['version'])
+        with self.assertRaises(QuoteNotFound):
+            self.store.delete_quote('episode', first['id'], first['version'])
+        entries = self.store.quote_entries('episode')
+        self.assertEqual([(entry['id'], entry['position']) for entry in entries],
+                         [(inserted['id'], 0), (third['id'], 1), (second['id'], 2)])
+        # Chaque modification donne une nouvelle version au projet (exports dépassés)
+        self.assertEqual(self.store.get_project('episode')['version'], version + 4)
+    
+    def test_artifact_modified_only_when_content_changes(self):
+        """Un export régénéré au même contenu garde son empreinte et sa date de modification"""
+        self.store.save_analysis('episode', self.quotes)
+        self.assertIsNone(self.store.artifact('episode', 'json'))
+        first = self.store.mark_artifact('episode', 'json', 1, 'aaa')
+        same = self.store.mark_artifact('episode', 'json', 2, 'aaa')
+        self.assertEqual((same['version'], same['modified_at']), (2, first['modified_at']))
+        changed = self.store.mark_artifact('episode', 'json', 3, 'bbb')
+        self.assertEqual(changed['sha256'], 'bbb')
+        self.assertGreaterEqual(changed['modified_at'], first['modified_at'])
+    
+    def test_full_text_search(self):
+        """Recherche dans les sous-titres de tous les projets, index mis à jour à chaque envoi"""
+        self.store.save_analysis('episode_1', [], iter(timed_subtitles(
+            [(0, 2, "Bonjour à tous"), (2, 4, "Parlons d'économie"), (4, 6, "et de climat")])))
+        self.store.save_analysis('episode_2', [], iter(timed_subtitles([(0, 3, "L'économie, encore l'économie")])))
+        
+        hits = self.store.search("economie", context=1)
+        self.assertEqual([(hit['project'], hit['position']) for hit in hits], [('episode_2', 0), ('episode_1', 1)])
+        self.assertEqual(hits[1]['passage']['content'], "Bonjour à tous Parlons d'économie et de climat")
+        self.assertEqual((hits[1]['formatted_start'], hits[1]['passage']['end_time_seconds']), ('00:00:02', 6.0))
+        self.assertEqual(len(self.store.search('economie', project='episode_1')), 1)
+        self.assertEqual(self.store.passage_quote('episode_1', 1, 1).to_dict()['end_time'], timedelta(seconds=6))
+        
+        # Nouvel envoi: les anciennes lignes quittent l'index
+        self.store.save_subtitles('episode_1', iter(timed_subtitles([(0, 2, "Autre sujet")])))
+        self.assertEqual([hit['project'] for hit in self.store.search("économie")], ['episode_2'])
+        with self.assertRaises(ValueError):
+            self.store.search('  ""  ')
+    
+    def test_concurrent_writers(self):
+        """Plusieurs threads écrivent en même temps sans erreur de verrou ni perte"""
+        from concurrent.futures import ThreadPoolExecutor
+        self.store.save_analysis('episode', [])
+        
+        def add(i):
+            try:
+                return self.store.add_quote('episode', Quote(f"Ajout {i}", i * 1000, i * 1000 + 500))
+            finally:
+                self.store.close()
+        
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            positions = list(executor.map(add, range(40)))
+        self.assertEqual(sorted(positions), list(range(40)))
+        self.assertEqual(self.store.get_project('episode')['quotes'], 40)
+    
+    def test_job_history(self):
+        """Les états successifs d'une tâche sont enregistrés dans l'historique du projet"""
+        queue = JobQueue(workers=1, on_state_change=self.store.record_job)
+        try:
+            job = queue.submit('clips', 'episode', lambda job: {'clips': 2})
+            job.future.result(timeout=10)
+        finally:
+            queue.shutdown()
+        history = self.store.jobs('episode')
+        self.assertEqual(len(history), 1)
+        self.assertEqual(history[0]['id'], job.id)
+        self.assertEqual(history[0]['status'], 'succeeded')
+        self.assertEqual(history[0]['result'], {'clips': 2})
+
 if __name__ == '__main__':
     unittest.main() 
\ No newline at end of file